@@ -0,0 +1,41 @@
+import math
+import time
+
+from processing.utils import get_video_properties
+
+# Cost-aware admission control for uploaded videos.
+# Cost unit: megapixel-frames (frame count x width x height / 1e6), which tracks
+# inference time far better than file size or duration alone.
+
+
+def estimate_job_cost(video_path):
+    """Probes container metadata (no decoding) and returns (cost, properties), or (None, None)."""
+    properties = get_video_properties(video_path)
+    if properties is None or properties["total_frames"] <= 0 or properties["width"] <= 0 or properties["height"] <= 0:
+        return None, None
+    cost = properties["total_frames"] * properties["width"] * properties["height"] / 1e6
+    return cost, properties
+
+
+# `config` is any mapping with the Config keys (e.g. Flask's app.config)
+def choose_queue(cost, config):
+    return config['LONG_QUEUE'] if cost >= config['LONG_JOB_COST_THRESHOLD'] else config['SHORT_QUEUE']
+
+
+def job_priority(cost):
+    """RabbitMQ priority (0-9): cheaper jobs jump ahead of expensive ones within a queue."""
+    return max(0, min(9, 9 - int(math.log10(max(cost, 1.0)))))
+
+
+def estimate_queue_wait(job_store, queue, config):
+    """Seconds until a newly queued job in `queue` is likely to start."""
+    throughput = max(config['WORKER_MPIX_PER_SECOND'], 1e-6)
+    workers = config['LONG_QUEUE_WORKERS'] if queue == config['LONG_QUEUE'] else config['SHORT_QUEUE_WORKERS']
+    now = time.time()
+    outstanding = 0.0
+    for state, cost, started_at in job_store.active_jobs_in_queue(queue, config['JOB_STALE_SECONDS']):
+        if state == 'STARTED' and started_at is not None:
+            # Subtract the work a running job has (probably) already done
+            cost = max(0.0, cost - (now - started_at) * throughput)
+        outstanding += cost
+    return round(outstanding / (throughput * max(workers, 1)), 1)
@@ -1,12 +1,23 @@
+import glob
+import hashlib
+import json
+import math
 import os
+import threading
+import time
 import uuid
-from flask import Flask, request, jsonify, render_template, send_from_directory, url_for
+from flask import Flask, request, jsonify, render_template, send_from_directory, url_for, Response
 from werkzeug.utils import secure_filename
-from celery.result import AsyncResult
 
 # Import Celery task and app instance
-from celery_worker import celery, process_video_task
+from celery_worker import celery, process_video_task, extract_clips_task
 from config import Config
+from job_store import JobStore, FINISHED_STATES
+from admission import estimate_job_cost, choose_queue, job_priority, estimate_queue_wait
+from processing.instrumentation import render_prometheus
+from processing.timeline import query_timeline
+from processing.clips import existing_clips, normalize_ranges
+from processing.model_catalog import ModelCatalog
 
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
 
@@ -14,6 +25,13 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def parse_number(value, positive=False):
+    """float() of a request parameter; ValueError for inf/nan, and for values <= 0 with `positive`."""
+    number = float(value)
+    if not math.isfinite(number) or (positive and number <= 0):
+        raise ValueError(f"Invalid number {value!r}")
+    return number
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -24,11 +42,85 @@ def create_app(config_class=Config):
     except OSError:
         pass
 
+    job_store = JobStore(app.config['JOB_DB_PATH'])
+    model_catalog = ModelCatalog(app.config['MODEL_CATALOG_PATH'])
+    # job_id -> (expires_at, response dict); absorbs bursts of polls for the same job
+    status_cache = {}
+    status_cache_lock = threading.Lock()
+
+    def job_response(job):
+        """Public view of a job store row, with result files turned into URLs."""
+        info = job['meta']
+        state = job['state']
+        if state == 'QUEUED':
+            state = 'PENDING' # Celery's name, which clients already handle
+        elif state == 'STARTED' and job['progress_current']:
+            state = 'PROGRESS'
+        response = {
+            'job_id': job['job_id'],
+            'state': state,
+            'status': job['status'] or ('Pending...' if state == 'PENDING' else ''),
+            'queue': job['queue'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+        }
+        if state == 'PROGRESS':
+            # Numbers only (frames, frames/s, seconds); the client formats them
+            response['info'] = {key: info.get(key) for key in ('current', 'total', 'status', 'rate', 'eta_seconds')}
+        if state in ('STARTED', 'PROGRESS') and info.get('estimate'):
+            # Preliminary possession estimate with its 95% interval, see processing.preview
+            response['estimate'] = info['estimate']
+        if state == 'FAILURE':
+            response['error'] = info.get('exc_message')
+            return response
+        if info.get('hls_playlist'):
+            # Available from the first finished segment onward, while processing continues
+            hls_folder, playlist = os.path.split(info['hls_playlist'])
+            response['hls_playlist'] = url_for('get_hls_file', job_id=hls_folder[:-len('_hls')], filename=playlist, _external=True)
+        if info.get('result_clips'):
+            response['clips'] = [url_for('get_result_file', filename=os.path.basename(path), _external=True)
+                                 for path in info['result_clips']]
+        if info.get('result_video'):
+            response['result_video'] = url_for('get_result_file', filename=os.path.basename(info['result_video']), _external=True)
+            response['result_stats'] = url_for('get_result_file', filename=os.path.basename(info['result_stats']), _external=True)
+            if info.get('result_tracks'):
+                # Per-frame tracking data (.npy) and its index (.json), see processing.tracking_export
+                tracks_filename = os.path.basename(info['result_tracks'])
+                response['result_tracks'] = url_for('get_result_file', filename=tracks_filename, _external=True)
+                response['result_tracks_meta'] = url_for('get_result_file', filename=f"{os.path.splitext(tracks_filename)[0]}.json", _external=True)
+                response['result_tracks_frames'] = url_for('get_result_file', filename=f"{os.path.splitext(tracks_filename)[0]}.frames.npy", _external=True)
+            if info.get('result_timeline'):
+                job_id = os.path.basename(info['result_timeline'])[:-len('_timeline.npz')]
+                response['stats_query'] = url_for('query_stats', job_id=job_id, _external=True)
+            if info.get('result_events'):
+                response['result_events'] = url_for('get_result_file', filename=os.path.basename(info['result_events']), _external=True)
+            if info.get('result_profile'):
+                response['result_profile'] = url_for('get_result_file', filename=os.path.basename(info['result_profile']), _external=True)
+                response['result_profile_stacks'] = url_for('get_result_file', filename=os.path.basename(info['result_profile_stacks']), _external=True)
+            response['frames_processed'] = info.get('frames_processed')
+            response['processing_time_seconds'] = info.get('processing_time_seconds')
+            response['model_selection'] = info.get('model_selection')
+            # POST highlight ranges here, see create_clips
+            response['clips_url'] = url_for('create_clips', task_id=job['job_id'], _external=True)
+        return response
+
+    def fail_undispatched_job(task_id, error):
+        """Marks a registered job failed when its task never reached the broker."""
+        print(f"Error: Could not queue job {task_id}: {error}")
+        job_store.mark_finished(task_id, 'FAILURE', {
+            'exc_type': type(error).__name__,
+            'exc_message': str(error),
+            'status': 'Could not queue the job'
+        })
+
     # --- Routes --- 
     @app.route('/')
     def index():
         """Serves the main HTML page."""
-        return render_template('index.html')
+        # Option checkboxes start at the server's defaults (HLS_OUTPUT_DEFAULT, PREVIEW_DEFAULT)
+        return render_template('index.html', hls_default=app.config['HLS_OUTPUT_DEFAULT'],
+                               preview_default=app.config['PREVIEW_DEFAULT'])
 
     @app.route('/upload', methods=['POST'])
     def upload_video():
@@ -40,6 +132,34 @@ def create_app(config_class=Config):
             return jsonify({"error": "No selected file"}), 400
 
         if file and allowed_file(file.filename):
+            # No auth yet: identify users by an explicit header, falling back to client address
+            user_id = request.headers.get('X-User-Id') or request.remote_addr
+            # Cheap early rejection before saving the upload; enforced atomically when registering below
+            if job_store.count_active_jobs(user_id, app.config['JOB_STALE_SECONDS']) >= app.config['MAX_ACTIVE_JOBS_PER_USER']:
+                return jsonify({"error": "Too many active jobs. Wait for a previous video to finish."}), 429
+
+            # Optional processing SLA: a target processing rate or a deadline in seconds
+            try:
+                target_fps = parse_number(request.form['target_fps'], positive=True) if request.form.get('target_fps') else None
+                deadline_seconds = parse_number(request.form['deadline_seconds'], positive=True) if request.form.get('deadline_seconds') else None
+            except ValueError:
+                return jsonify({"error": "target_fps and deadline_seconds must be positive numbers"}), 400
+            hls_output = app.config['HLS_OUTPUT_DEFAULT']
+            if request.form.get('hls'):
+                hls_output = request.form['hls'].lower() in ('true', '1', 'on')
+            # Sampling profile of the job, saved next to the results
+            profile = request.form.get('profile', '').lower() in ('true', '1', 'on')
+            # Allocation sites too (tracemalloc; slows the job down, so its timings are less representative)
+            profile_allocations = request.form.get('profile_allocations', '').lower() in ('true', '1', 'on')
+            preview = app.config['PREVIEW_DEFAULT']
+            if request.form.get('preview'):
+                preview = request.form['preview'].lower() in ('true', '1', 'on')
+            # A catalog model by name; empty lets the worker choose (by deadline, else the default)
+            model_name = request.form.get('model') or None
+            available_models = [entry['name'] for entry in model_catalog.available()]
+            if model_name and model_name not in available_models:
+                return jsonify({"error": f"Unknown or unavailable model. Available: {available_models}"}), 400
+
             original_filename = secure_filename(file.filename)
             # Generate unique names for stored/processed files
             unique_id = uuid.uuid4().hex
@@ -51,43 +171,217 @@ def create_app(config_class=Config):
             input_path = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
             file.save(input_path)
 
+            # Cheap metadata probe to cost the job and pick a queue
+            cost, _ = estimate_job_cost(input_path)
+            if cost is None:
+                os.remove(input_path)
+                return jsonify({"error": "Could not read video properties"}), 400
+            queue = choose_queue(cost, app.config)
+            # Estimate before registering, so the job doesn't wait behind itself
+            estimated_wait = estimate_queue_wait(job_store, queue, app.config)
+
+            # Register the job before dispatch so the worker always finds its ledger row
+            task_id = uuid.uuid4().hex
+            if not job_store.create_job_within_limit(task_id, user_id, queue, cost, app.config['MAX_ACTIVE_JOBS_PER_USER'],
+                                                     app.config['JOB_STALE_SECONDS']):
+                os.remove(input_path)
+                return jsonify({"error": "Too many active jobs. Wait for a previous video to finish."}), 429
+
             # Start Celery task
-            task = process_video_task.delay(
-                input_path=input_path,
-                output_video_filename=output_video_filename,
-                output_stats_filename=output_stats_filename,
-                model_path=app.config['MODEL_PATH']
-            )
-
-            return jsonify({"task_id": task.id}), 202 # Accepted
+            try:
+                task = process_video_task.apply_async(
+                    kwargs={
+                        'input_path': input_path,
+                        'output_video_filename': output_video_filename,
+                        'output_stats_filename': output_stats_filename,
+                        'target_fps': target_fps,
+                        'deadline_seconds': deadline_seconds,
+                        'hls_output': hls_output,
+                        'preview': preview,
+                        'profile': profile,
+                        'profile_allocations': profile_allocations,
+                        'model_name': model_name
+                    },
+                    task_id=task_id,
+                    queue=queue,
+                    priority=job_priority(cost)
+                )
+            except Exception as e:
+                # Not queued: fail the ledger row so it doesn't count as active forever
+                fail_undispatched_job(task_id, e)
+                os.remove(input_path)
+                return jsonify({"error": "Could not queue the job, try again later"}), 503
+
+            return jsonify({
+                "task_id": task.id,
+                "queue": queue,
+                "estimated_cost": round(cost, 1),
+                "estimated_wait_seconds": estimated_wait
+            }), 202 # Accepted
         else:
             return jsonify({"error": "Invalid file type"}), 400
 
+    @app.route('/models')
+    def list_models():
+        """Catalog models a job can ask for (those whose file is deployed), with their measured speed and accuracy."""
+        models = [{key: entry.get(key) for key in ('name', 'backend', 'devices', 'description', 'map50', 'fps')}
+                  for entry in model_catalog.available()]
+        return jsonify({"default": model_catalog.default, "models": models})
+
     @app.route('/status/<task_id>')
     def task_status(task_id):
-        """Checks the status of a Celery task."""
-        task = process_video_task.AsyncResult(task_id)
-        if task.state == 'PENDING':
-            response = {
-                'state': task.state,
-                'status': 'Pending...'
-            }
-        elif task.state != 'FAILURE':
-            response = {
-                'state': task.state,
-                'status': task.info.get('status', ''),
-            }
-            if 'result_video' in task.info:
-                response['result_video'] = url_for('get_result_file', filename=os.path.basename(task.info['result_video']), _external=True)
-                response['result_stats'] = url_for('get_result_file', filename=os.path.basename(task.info['result_stats']), _external=True)
+        """Checks the status of a job (one indexed read of the job store, briefly cached)."""
+        now = time.monotonic()
+        cached = status_cache.get(task_id)
+        if cached is not None and cached[0] > now:
+            return jsonify(cached[1])
+        job = job_store.get_job(task_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        response = job_response(job)
+        # Finished jobs don't change any more
+        ttl = app.config['FINISHED_STATUS_CACHE_SECONDS'] if job['state'] in FINISHED_STATES else app.config['STATUS_CACHE_SECONDS']
+        with status_cache_lock:
+            if len(status_cache) >= 4096:
+                for key in [key for key, (expires, _) in status_cache.items() if expires <= now] or list(status_cache):
+                    del status_cache[key]
+            status_cache[task_id] = (now + ttl, response)
+        return jsonify(response)
+
+    @app.route('/jobs')
+    def list_jobs():
+        """The caller's jobs, newest first: ?page=<n>&per_page=<n>&state=<QUEUED|STARTED|SUCCESS|FAILURE>."""
+        user_id = request.headers.get('X-User-Id') or request.remote_addr
+        try:
+            page = max(int(request.args.get('page', 1)), 1)
+            per_page = min(max(int(request.args.get('per_page', 20)), 1), 100)
+        except ValueError:
+            return jsonify({"error": "page and per_page must be integers"}), 400
+        state = request.args.get('state') or None
+        if state == 'PENDING':
+            state = 'QUEUED'
+        jobs, total = job_store.list_jobs(user_id=user_id, state=state, limit=per_page, offset=(page - 1) * per_page)
+        return jsonify({
+            "jobs": [dict(job_response(job), status_url=url_for('task_status', task_id=job['job_id'], _external=True))
+                     for job in jobs],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+        })
 
+    @app.route('/stats/<job_id>/query')
+    def query_stats(job_id):
+        """
+        Counter totals (possession, ball visibility, passes, turnovers) for a time window,
+        optionally bucketed: ?from=<s>&to=<s>&bucket=<s>. Answered from prefix sums and cached.
+        """
+        timeline_path = os.path.join(app.config['RESULT_FOLDER'], f"{secure_filename(job_id)}_timeline.npz")
+        if not os.path.exists(timeline_path):
+            return jsonify({"error": "No timeline for this job"}), 404
+        try:
+            window = [parse_number(request.args[name], positive=name == 'bucket') if request.args.get(name) else None
+                      for name in ('from', 'to', 'bucket')]
+        except ValueError:
+            return jsonify({"error": "from, to and bucket must be finite numbers (seconds), bucket positive"}), 400
+        try:
+            result = query_timeline(timeline_path, *window)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify(dict(result, job_id=job_id))
+        # A finished job's timeline never changes
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    @app.route('/clips/<task_id>', methods=['POST'])
+    def create_clips(task_id):
+        """
+        Cuts clips out of a finished job's video (the task id /upload returned). JSON body:
+            {"ranges": [[start_s, end_s], ...], "source": "annotated" | "original", "reel": false, "exact": false}
+        Clips are stream copies widened to whole GOPs unless "exact" asks for frame-accurate cuts
+        (re-encoded, slower). Returns one clip URL per range, or a single highlight reel URL when
+        "reel" is true, if these clips were cut before; otherwise 202 with a task id whose /status
+        lists the clips when done.
+        """
+        body = request.get_json(silent=True) or {}
+        job = job_store.get_job(task_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        if not job['meta'].get('result_video'):
+            return jsonify({"error": "The job has no results yet"}), 409
+        # Result and upload files are named after the upload's id, not the task id
+        job_id = secure_filename(os.path.basename(job['meta']['result_video']).rsplit('_processed', 1)[0])
+        source = body.get('source', 'annotated')
+        if source == 'annotated':
+            candidates = glob.glob(os.path.join(app.config['RESULT_FOLDER'], f"{job_id}_processed.*"))
+        elif source == 'original':
+            candidates = glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}.*"))
         else:
-            # Task failed
-            response = {
-                'state': task.state,
-                'status': str(task.info), # Exception info
-            }
-        return jsonify(response)
+            return jsonify({"error": "source must be 'annotated' or 'original'"}), 400
+        if not job_id or not candidates:
+            return jsonify({"error": f"No {source} video for this job"}), 404
+
+        ranges = body.get('ranges')
+        if not isinstance(ranges, list) or not ranges:
+            return jsonify({"error": "ranges must be a non-empty list of [start_seconds, end_seconds]"}), 400
+        reel = bool(body.get('reel', False))
+        exact = bool(body.get('exact', False))
+        # Same request -> same file names, so repeated requests reuse existing clips
+        request_key = hashlib.blake2b(json.dumps([source, ranges, reel, exact]).encode(), digest_size=6).hexdigest()
+        if reel:
+            output_paths = [os.path.join(app.config['RESULT_FOLDER'], f"{job_id}_reel_{request_key}.mp4")]
+        else:
+            output_paths = [os.path.join(app.config['RESULT_FOLDER'], f"{job_id}_clip_{request_key}_{i:02d}.mp4")
+                            for i in range(len(ranges))]
+
+        clip_paths = existing_clips(output_paths)
+        if clip_paths is not None:
+            return jsonify({
+                "clips": [url_for('get_result_file', filename=os.path.basename(path), _external=True) for path in clip_paths]
+            })
+        try:
+            normalize_ranges(ranges, None) # Reject malformed ranges now; the worker clips them to the video
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Cutting is done by a worker, tracked like any job on /status and counted against the user's limit
+        clips_task_id = uuid.uuid4().hex
+        if not job_store.create_job_within_limit(clips_task_id, request.headers.get('X-User-Id') or request.remote_addr,
+                                                 app.config['SHORT_QUEUE'], 0.0, app.config['MAX_ACTIVE_JOBS_PER_USER'],
+                                                 app.config['JOB_STALE_SECONDS']):
+            return jsonify({"error": "Too many active jobs. Wait for a previous one to finish."}), 429
+        try:
+            extract_clips_task.apply_async(
+                kwargs={'source_path': candidates[0], 'ranges': ranges, 'output_paths': output_paths, 'reel': reel,
+                        'exact': exact},
+                task_id=clips_task_id, queue=app.config['SHORT_QUEUE'], priority=9)
+        except Exception as e:
+            fail_undispatched_job(clips_task_id, e)
+            return jsonify({"error": "Could not queue the job, try again later"}), 503
+        return jsonify({"task_id": clips_task_id,
+                        "status_url": url_for('task_status', task_id=clips_task_id, _external=True)}), 202
+
+    @app.route('/hls/<job_id>/<filename>')
+    def get_hls_file(job_id, filename):
+        """Serves a job's HLS playlist and fMP4 segments (see processing.hls)."""
+        hls_folder = os.path.join(app.config['RESULT_FOLDER'], f"{secure_filename(job_id)}_hls")
+        safe_filename = secure_filename(filename)
+        if safe_filename.endswith('.m3u8'):
+            mime_type = 'application/vnd.apple.mpegurl'
+        elif safe_filename.endswith('.m4s'):
+            mime_type = 'video/iso.segment'
+        else:
+            mime_type = 'video/mp4'
+        response = send_from_directory(hls_folder, safe_filename, mimetype=mime_type)
+        if safe_filename.endswith('.m3u8'):
+            # The playlist grows while the job runs
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Prometheus metrics: per-worker counters plus job ledger counts."""
+        body = render_prometheus(app.config['METRICS_DIR'], job_state_counts=job_store.count_by_state())
+        return Response(body, mimetype='text/plain; version=0.0.4')
 
     @app.route('/results/<filename>')
     def get_result_file(filename):
@@ -107,6 +401,10 @@ def create_app(config_class=Config):
             mime_type = 'video/webm'
         elif filename.lower().endswith('.json'):
             mime_type = 'application/json'
+        elif filename.lower().endswith('.npy'):
+            mime_type = 'application/octet-stream'
+        elif filename.lower().endswith('.txt'):
+            mime_type = 'text/plain'
         
         # Add Cache-Control header to prevent caching issues with videos
         response = send_from_directory(app.config['RESULT_FOLDER'], safe_filename, mimetype=mime_type)
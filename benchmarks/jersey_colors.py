@@ -0,0 +1,136 @@
+"""
+Speed and agreement of the jersey colour modes (processing.utils.get_player_color).
+
+Usage:
+    python -m benchmarks.jersey_colors [--video match.mp4 --detector yolo] [--frames 50]
+                                       [--modes fast,kmeans,rembg] [--reference rembg]
+
+Player boxes come from the detector (the stub on a synthetic clip by default,
+or YOLO on a real video). For each mode the benchmark reports the time per
+frame and per box, and, against the reference mode:
+  - team agreement: share of boxes put in the same team, with each mode's team
+    model fitted on the first frame the way FrameAnalyzer does (labels are
+    matched up to a swap, since cluster ids are arbitrary)
+  - colour distance: median distance between the HSV colours of the same box
+Modes whose dependencies are missing (rembg) are skipped.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.run_benchmarks import CACHE_DIR, DEFAULT_MODEL_PATH, REPO_ROOT, environment_info, make_detector
+
+
+def hsv_distance(a, b):
+    """Euclidean HSV distance with hue on its 0-179 circle."""
+    hue = np.abs(a[:, 0] - b[:, 0])
+    hue = np.minimum(hue, 180 - hue)
+    return np.sqrt(hue ** 2 + (a[:, 1] - b[:, 1]) ** 2 + (a[:, 2] - b[:, 2]) ** 2)
+
+
+def collect_boxes(video_path, detector, max_frames):
+    from processing.config import MODEL_CLASSES
+    from processing.utils import get_frames
+    samples = []
+    for frame in get_frames(video_path):
+        detections = detector.predict(frame)
+        players = detections[detections.class_id == MODEL_CLASSES["player"]].with_nms(threshold=0.5)
+        if len(players) > 0:
+            samples.append((frame, players))
+        if len(samples) >= max_frames:
+            break
+    return samples
+
+
+def run_mode(mode, samples):
+    from processing.team_assigner import Assigner
+    assigner = Assigner(color_mode=mode)
+    kmeans = assigner.assign_team_color(samples[0][0], samples[0][1])
+    colors, teams, valid = [], [], []
+    start = time.perf_counter()
+    for frame, players in samples:
+        frame_colors, frame_valid = assigner.get_player_colors(frame, players.xyxy)
+        colors.append(frame_colors)
+        valid.append(frame_valid)
+    seconds = time.perf_counter() - start
+    for frame_colors, frame_valid in zip(colors, valid):
+        frame_teams = np.full(len(frame_colors), -1)
+        if frame_valid.any():
+            frame_teams[frame_valid] = kmeans.predict(frame_colors[frame_valid])
+        teams.append(frame_teams)
+    boxes = sum(len(players) for _, players in samples)
+    return {
+        "seconds": seconds,
+        "ms_per_frame": round(seconds / len(samples) * 1000, 3),
+        "ms_per_box": round(seconds / boxes * 1000, 4),
+        "colors": np.concatenate(colors),
+        "teams": np.concatenate(teams),
+        "valid": np.concatenate(valid),
+    }
+
+
+def main(argv=None):
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic import generate_synthetic_video
+
+    parser = argparse.ArgumentParser(description="Compare jersey colour extraction modes.")
+    parser.add_argument("--video", default=None, help="Video to sample (default: synthetic clip)")
+    parser.add_argument("--detector", choices=("stub", "yolo"), default="stub")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model for --detector yolo")
+    parser.add_argument("--frames", type=int, default=50, help="Frames with players to sample")
+    parser.add_argument("--modes", default="fast,kmeans,rembg")
+    parser.add_argument("--reference", default="rembg", help="Mode the others are compared with")
+    parser.add_argument("--output", default="jersey_colors.json")
+    args = parser.parse_args(argv)
+
+    video_path = args.video or generate_synthetic_video(
+        os.path.join(CACHE_DIR, "synthetic_1280x720_5s.mp4"), 1280, 720, 5)
+    samples = collect_boxes(video_path, make_detector(args.detector, args.model), args.frames)
+    if not samples:
+        print("No players detected in the sampled frames")
+        return 1
+    boxes = sum(len(players) for _, players in samples)
+    print(f"{len(samples)} frames, {boxes} player boxes from {video_path}")
+
+    runs = {}
+    for mode in args.modes.split(","):
+        try:
+            runs[mode] = run_mode(mode, samples)
+        except ImportError as e:
+            print(f"Skipping {mode}: {e}")
+            continue
+        print(f"  {mode}: {runs[mode]['ms_per_frame']} ms/frame, {runs[mode]['ms_per_box']} ms/box")
+    reference = args.reference if args.reference in runs else next(iter(runs))
+
+    results = {"meta": dict(environment_info(), video=os.path.basename(video_path), detector=args.detector,
+                            frames=len(samples), boxes=boxes, reference=reference), "modes": {}}
+    ref = runs[reference]
+    for mode, run in runs.items():
+        both = run["valid"] & ref["valid"]
+        same = float(np.mean(run["teams"][both] == ref["teams"][both])) if both.any() else None
+        results["modes"][mode] = {
+            "ms_per_frame": run["ms_per_frame"],
+            "ms_per_box": run["ms_per_box"],
+            "speedup_vs_reference": round(ref["seconds"] / max(run["seconds"], 1e-9), 1),
+            "team_agreement_percent": round(max(same, 1 - same) * 100, 1) if same is not None else None, # Up to a label swap
+            "median_hsv_distance": round(float(np.median(hsv_distance(run["colors"][both], ref["colors"][both]))), 2)
+                                   if both.any() else None,
+            "boxes_without_color": int((~run["valid"]).sum()),
+        }
+
+    print(f"\nvs {reference}: {'mode':>8} {'ms/box':>9} {'speedup':>8} {'teams agree':>12} {'HSV dist':>9}")
+    for mode, summary in results["modes"].items():
+        print(f"{'':>{len(reference) + 4}} {mode:>8} {summary['ms_per_box']:>9} {summary['speedup_vs_reference']:>8} "
+              f"{str(summary['team_agreement_percent']):>11}% {str(summary['median_hsv_distance']):>9}")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,142 @@
+"""
+Measures the end-to-end fps of each catalog model (models/catalog.json) on this machine.
+
+Usage:
+    python -m benchmarks.model_catalog [--video match.mp4] [--seconds 20] [--update]
+
+Every available catalog model runs analyze_video on the same clip (a synthetic
+clip at the catalog's reference resolution by default, ideally one of our real
+benchmark matches). The fps on this machine's device ("cpu" or "cuda") is
+reported, together with how many of the default model's boxes each model also
+finds (IoU >= 0.5), a quick check next to the catalog's "map50", which comes
+from each model's validation run. With --update the measured fps are written
+to the catalog, where processing.model_catalog uses them to pick a model for a
+job's deadline. Measure on the worker machine type: the catalog holds one fps
+per device, and WORKER_SPEED_FACTOR corrects for other machines.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.run_benchmarks import CACHE_DIR, REPO_ROOT, environment_info
+
+MATCH_IOU = 0.5
+AGREEMENT_FRAMES = 50
+
+
+def box_recall(reference, candidate, iou_threshold=MATCH_IOU):
+    """Share of `reference` boxes with a candidate box of the same class at IoU >= threshold."""
+    if len(reference) == 0:
+        return None
+    if len(candidate) == 0:
+        return 0.0
+    a, b = reference.xyxy[:, None, :], candidate.xyxy[None, :, :]
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    iou = intersection / np.maximum(area_a + area_b - intersection, 1e-9)
+    same_class = reference.class_id[:, None] == candidate.class_id[None, :]
+    return float(((iou >= iou_threshold) & same_class).any(axis=1).mean())
+
+
+def measure(entry, device, video_path):
+    from processing.model_catalog import load_detector
+    from processing.video_analyzer import analyze_video
+
+    detector = load_detector(entry, device)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        result = analyze_video(
+            input_path=video_path,
+            output_video_path=os.path.join(tmp_dir, "bench_processed.mp4"),
+            output_stats_path=os.path.join(tmp_dir, "bench_stats.json"),
+            model_path=entry["path"],
+            detector=detector
+        )
+        wall_seconds = time.perf_counter() - start
+    return detector, round(result["frames_processed"] / max(wall_seconds, 1e-9), 2)
+
+
+def agreement(detectors, default_name, video_path):
+    """Mean box recall of each model against the default model's detections."""
+    from processing.utils import get_frames
+    recalls = {name: [] for name in detectors}
+    for index, frame in enumerate(get_frames(video_path)):
+        if index >= AGREEMENT_FRAMES:
+            break
+        reference = detectors[default_name].predict(frame)
+        for name, detector in detectors.items():
+            recall = box_recall(reference, detector.predict(frame))
+            if recall is not None:
+                recalls[name].append(recall)
+    return {name: round(float(np.mean(values)) * 100, 1) if values else None for name, values in recalls.items()}
+
+
+def main(argv=None):
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic import generate_synthetic_video
+    from processing.detector import get_device
+    from processing.model_catalog import CATALOG_PATH, ModelCatalog
+
+    parser = argparse.ArgumentParser(description="Measure the fps of the catalog models on this machine.")
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--video", default=None, help="Benchmark clip (default: synthetic clip at the reference resolution)")
+    parser.add_argument("--seconds", type=int, default=20, help="Length of the synthetic clip")
+    parser.add_argument("--update", action="store_true", help="Write the measured fps to the catalog")
+    parser.add_argument("--output", default="model_catalog.json")
+    args = parser.parse_args(argv)
+
+    catalog = ModelCatalog(args.catalog)
+    device = get_device()
+    if args.video:
+        video_path = args.video
+    else:
+        # 16:9 frame with the catalog's reference megapixels
+        height = int(round(math.sqrt(catalog.reference_megapixels * 1e6 * 9 / 16) / 2) * 2)
+        width = int(round(height * 16 / 9 / 2) * 2)
+        video_path = generate_synthetic_video(
+            os.path.join(CACHE_DIR, f"synthetic_{width}x{height}_{args.seconds}s.mp4"), width, height, args.seconds)
+
+    entries = catalog.available(device.type)
+    if not entries:
+        print(f"No catalog model is available on {device.type}")
+        return 1
+    detectors, fps = {}, {}
+    for entry in entries:
+        detectors[entry["name"]], fps[entry["name"]] = measure(entry, device, video_path)
+        print(f"  {entry['name']}: {fps[entry['name']]} fps on {device.type}")
+    recalls = agreement(detectors, catalog.default, video_path) if catalog.default in detectors else {}
+
+    results = {"meta": dict(environment_info(), device=device.type, video=os.path.basename(video_path)),
+               "models": {name: {"fps": fps[name], "recall_vs_default_percent": recalls.get(name),
+                                 "map50": catalog.entries[name].get("map50")} for name in fps}}
+    print(f"\n{'model':>12} {'fps':>8} {'recall vs ' + catalog.default:>18} {'map50':>6}")
+    for name, summary in results["models"].items():
+        print(f"{name:>12} {summary['fps']:>8} {str(summary['recall_vs_default_percent']):>17}% {str(summary['map50']):>6}")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.update:
+        with open(args.catalog) as f:
+            raw = json.load(f)
+        for model in raw["models"]:
+            if model["name"] in fps:
+                model.setdefault("fps", {})[device.type] = fps[model["name"]]
+        with open(args.catalog, 'w') as f:
+            json.dump(raw, f, indent=4)
+            f.write("\n")
+        print(f"Catalog updated: {args.catalog}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
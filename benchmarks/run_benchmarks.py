@@ -0,0 +1,196 @@
+"""
+Reproducible throughput benchmarks for the analysis pipeline.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--detector stub|yolo] [--output bench_results.json]
+    python -m benchmarks.run_benchmarks --compare bench_baseline.json --tolerance 0.10
+
+Synthetic pitch videos (benchmarks.synthetic) are generated at several
+resolutions and lengths and cached. Each case runs analyze_video end-to-end and
+then each stage on its own, in a fresh process so peak memory is per case.
+With --compare, cases whose fps dropped or whose stage times grew by more than
+the tolerance are reported and the exit code is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODEL_PATH = os.path.join(REPO_ROOT, 'models', 'best.pt')
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+
+DEFAULT_RESOLUTIONS = "640x360,1280x720,1920x1080"
+DEFAULT_DURATIONS = "5,20"
+# Stage times below this are too noisy to flag as regressions
+MIN_STAGE_MS_FOR_REGRESSION = 0.5
+
+
+def make_detector(kind, model_path):
+    if kind == "stub":
+        from benchmarks.stub_detector import StubDetector
+        return StubDetector()
+    from processing.detector import YoloDetector
+    return YoloDetector(model_path)
+
+
+def isolated_stages(video_path, detector, max_frames=200):
+    """Runs decode, inference, frame analysis and encode separately. Returns fps per stage."""
+    from processing.frame_analyzer import FrameAnalyzer
+    from processing.utils import get_frames, create_video_writer
+
+    results = {}
+    start = time.perf_counter()
+    frames = []
+    for frame in get_frames(video_path):
+        frames.append(frame)
+        if len(frames) >= max_frames:
+            break
+    results["decode"] = len(frames) / max(time.perf_counter() - start, 1e-9)
+
+    start = time.perf_counter()
+    detections = [detector.predict(frame) for frame in frames]
+    results["inference"] = len(frames) / max(time.perf_counter() - start, 1e-9)
+
+    analyzer = FrameAnalyzer()
+    start = time.perf_counter()
+    annotated = [analyzer.process_frame(frame, frame_detections) for frame, frame_detections in zip(frames, detections)]
+    results["frame_analysis"] = len(frames) / max(time.perf_counter() - start, 1e-9)
+
+    height, width = frames[0].shape[:2]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out, _ = create_video_writer(os.path.join(tmp_dir, "encode.mp4"), 25, (width, height))
+        start = time.perf_counter()
+        for frame in annotated:
+            out.write(frame)
+        out.release()
+        results["encode"] = len(frames) / max(time.perf_counter() - start, 1e-9)
+    return {stage: round(fps, 2) for stage, fps in results.items()}
+
+
+def run_case(case):
+    """Runs one benchmark case. Executed in a fresh process (see run_benchmarks)."""
+    sys.path.insert(0, REPO_ROOT)
+    from processing.video_analyzer import analyze_video
+    from processing.instrumentation import peak_rss_bytes
+    from benchmarks.synthetic import generate_synthetic_video
+
+    width, height, seconds = case["width"], case["height"], case["seconds"]
+    video_path = generate_synthetic_video(
+        os.path.join(CACHE_DIR, f"synthetic_{width}x{height}_{seconds}s.mp4"), width, height, seconds)
+    detector = make_detector(case["detector"], case["model_path"])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        result = analyze_video(
+            input_path=video_path,
+            output_video_path=os.path.join(tmp_dir, "bench_processed.mp4"),
+            output_stats_path=os.path.join(tmp_dir, "bench_stats.json"),
+            model_path=case["model_path"] if case["detector"] == "yolo" else "stub",
+            detector=detector
+        )
+        wall_seconds = time.perf_counter() - start
+        with open(os.path.join(tmp_dir, "bench_stats.json")) as f:
+            stats = json.load(f)
+
+    rss = peak_rss_bytes()
+    return {
+        "frames": result["frames_processed"],
+        "wall_seconds": round(wall_seconds, 3),
+        "fps": round(result["frames_processed"] / max(wall_seconds, 1e-9), 2),
+        "stages_ms": {stage: summary["mean_ms"] for stage, summary in stats["stage_timings"].items()},
+        "stages_p90_ms": {stage: summary["p90_ms"] for stage, summary in stats["stage_timings"].items()},
+        "isolated_stage_fps": isolated_stages(video_path, detector),
+        "peak_rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+    }
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(resolutions, durations, detector_kind, model_path):
+    cases = []
+    for resolution in resolutions:
+        width, height = (int(v) for v in resolution.lower().split("x"))
+        for seconds in durations:
+            cases.append({"id": f"{width}x{height}_{seconds}s", "width": width, "height": height,
+                          "seconds": seconds, "detector": detector_kind, "model_path": model_path})
+
+    results = {"meta": dict(environment_info(), detector=detector_kind), "cases": {}}
+    # One fresh process per case (maxtasksperchild=1) so peak RSS and warm caches don't leak between cases
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for case in cases:
+            print(f"Running {case['id']} ({detector_kind})...")
+            results["cases"][case["id"]] = pool.apply(run_case, (case,))
+            print(f"  {results['cases'][case['id']]['fps']} fps")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of human-readable regressions versus the baseline."""
+    regressions = []
+    for case_id, current in results["cases"].items():
+        previous = baseline.get("cases", {}).get(case_id)
+        if previous is None:
+            continue
+        if current["fps"] < previous["fps"] * (1 - tolerance):
+            regressions.append(f"{case_id}: fps {previous['fps']} -> {current['fps']}")
+        for stage, mean_ms in current["stages_ms"].items():
+            before = previous.get("stages_ms", {}).get(stage)
+            if before is None or max(before, mean_ms) < MIN_STAGE_MS_FOR_REGRESSION:
+                continue
+            if mean_ms > before * (1 + tolerance):
+                regressions.append(f"{case_id}: {stage} {before:.2f}ms -> {mean_ms:.2f}ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic videos.")
+    parser.add_argument("--detector", choices=("stub", "yolo"), default="stub")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model for --detector yolo")
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="Comma separated WxH list")
+    parser.add_argument("--durations", default=DEFAULT_DURATIONS, help="Comma separated clip lengths in seconds")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="Baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.resolutions.split(","), [int(d) for d in args.durations.split(",")],
+                             args.detector, args.model)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"REGRESSIONS (> {args.tolerance:.0%} vs {args.compare}):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"No regressions vs {args.compare}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+import supervision as sv
+
+from processing.config import MODEL_CLASSES
+
+# Stand-in for YoloDetector on synthetic videos: finds the coloured shapes drawn
+# by benchmarks.synthetic with HSV thresholds. Same interface as YoloDetector,
+# so analyze_video can run end-to-end without best.pt.
+
+# HSV ranges (OpenCV hue is 0-179)
+PLAYER_RANGES = (((100, 150, 100), (130, 255, 255)), # Blue shirts
+                 ((0, 150, 100), (10, 255, 255)),    # Red shirts
+                 ((170, 150, 100), (179, 255, 255)))
+REFEREE_RANGE = ((20, 150, 150), (35, 255, 255))
+BALL_RANGE = ((0, 0, 245), (179, 20, 255))
+
+
+class StubDetector:
+    def __init__(self, conf=0.9, min_player_area=20) -> None:
+        self.conf = conf
+        self.min_player_area = min_player_area
+        self.model_path = "stub"
+
+    def _boxes(self, mask, min_area, max_area=None):
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        boxes = []
+        for x, y, w, h, area in stats[1:count]:
+            if area < min_area or (max_area is not None and area > max_area):
+                continue
+            boxes.append((x, y, x + w, y + h))
+        return boxes
+
+    def predict(self, frame, imgsz=None):
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        # Shirts are found by colour; extend each box down over the white shorts
+        player_mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        for lower, upper in PLAYER_RANGES:
+            player_mask |= cv2.inRange(hsv, lower, upper)
+        player_boxes = [(x1, y1, x2, y2 + (y2 - y1) * 2 // 3)
+                        for x1, y1, x2, y2 in self._boxes(player_mask, self.min_player_area)]
+        referee_boxes = [(x1, y1, x2, y2 + (y2 - y1) * 2 // 3)
+                         for x1, y1, x2, y2 in self._boxes(cv2.inRange(hsv, *REFEREE_RANGE), self.min_player_area)]
+
+        # The ball is a small white blob; shorts are white too but much larger and attached to a shirt
+        ball_boxes = self._boxes(cv2.inRange(hsv, *BALL_RANGE), 3, max_area=max(frame.shape[0] // 10, 40))
+        ball_boxes = [box for box in ball_boxes if (box[2] - box[0]) < 3 * max(box[3] - box[1], 1)
+                      and not any(px1 <= box[0] and box[2] <= px2 and py1 <= box[1] and box[3] <= py2
+                                  for px1, py1, px2, py2 in player_boxes + referee_boxes)]
+
+        boxes = player_boxes + referee_boxes + ball_boxes[:1]
+        class_ids = ([MODEL_CLASSES["player"]] * len(player_boxes) + [MODEL_CLASSES["referee"]] * len(referee_boxes)
+                     + [MODEL_CLASSES["ball"]] * len(ball_boxes[:1]))
+        if not boxes:
+            return sv.Detections.empty()
+        return sv.Detections(
+            xyxy=np.array(boxes, dtype=np.float32),
+            confidence=np.full(len(boxes), self.conf, dtype=np.float32),
+            class_id=np.array(class_ids, dtype=int),
+        )
@@ -0,0 +1,80 @@
+import os
+
+import cv2
+import numpy as np
+
+# Synthetic pitch videos for reproducible benchmarks: striped grass, two teams of
+# coloured "players", a referee and a ball, all moving smoothly and deterministically.
+
+# BGR colours, chosen to be easy to segment in HSV (see StubDetector)
+GRASS_COLORS = ((40, 140, 40), (50, 160, 50))
+TEAM_COLORS = ((200, 80, 20), (30, 30, 210)) # Blue, red shirts
+SHORTS_COLOR = (240, 240, 240)
+REFEREE_COLOR = (0, 220, 240) # Yellow
+BALL_COLOR = (255, 255, 255)
+
+
+def _scene(width, height, n_players, seed):
+    rng = np.random.default_rng(seed)
+    # Each player orbits an anchor point: position(t) = anchor + radius * (cos, sin)(w t + phase)
+    anchors = rng.uniform([0.1, 0.2], [0.9, 0.9], size=(n_players + 1, 2)) * [width, height]
+    radii = rng.uniform(0.02, 0.08, size=(n_players + 1, 1)) * width
+    speeds = rng.uniform(0.2, 0.8, size=n_players + 1)
+    phases = rng.uniform(0, 2 * np.pi, size=n_players + 1)
+    return anchors, radii, speeds, phases
+
+
+def scene_positions(t, width, height, n_players=22, seed=0):
+    """Feet positions of all players (+ referee last) and the ball at time t seconds."""
+    anchors, radii, speeds, phases = _scene(width, height, n_players, seed)
+    angles = speeds * t + phases
+    positions = anchors + radii * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    # The ball is passed between players: it glides from one player to the next every 2 s
+    leg = int(t // 2.0)
+    progress = (t % 2.0) / 2.0
+    start = positions[leg % n_players]
+    end = positions[(leg * 7 + 3) % n_players]
+    ball = start + (end - start) * progress
+    return positions, ball
+
+
+def render_frame(t, width, height, n_players=22, seed=0):
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    stripe = max(width // 12, 1)
+    for i, x in enumerate(range(0, width, stripe)):
+        frame[:, x:x + stripe] = GRASS_COLORS[i % 2]
+
+    positions, ball = scene_positions(t, width, height, n_players, seed)
+    player_h = max(int(height * 0.09), 12)
+    player_w = max(int(player_h * 0.45), 6)
+    for index, (x, y) in enumerate(positions):
+        if index == n_players:
+            shirt = REFEREE_COLOR
+        else:
+            shirt = TEAM_COLORS[index % 2]
+        x1, y1 = int(x - player_w / 2), int(y - player_h)
+        x2, y2 = int(x + player_w / 2), int(y)
+        cv2.rectangle(frame, (x1, y1), (x2, y1 + player_h * 6 // 10), shirt, -1)
+        cv2.rectangle(frame, (x1, y1 + player_h * 6 // 10), (x2, y2), SHORTS_COLOR, -1)
+
+    ball_radius = max(height // 180, 2)
+    cv2.circle(frame, (int(ball[0]), int(ball[1])), ball_radius, BALL_COLOR, -1)
+    return frame
+
+
+def generate_synthetic_video(path, width=1280, height=720, seconds=10, fps=25, n_players=22, seed=0):
+    """Writes the synthetic clip to `path` (skipped if it already exists) and returns the path."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{os.path.splitext(path)[0]}.tmp{os.path.splitext(path)[1]}"
+    out = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not out.isOpened():
+        raise IOError(f"Cannot write synthetic video to {path}")
+    try:
+        for index in range(int(seconds * fps)):
+            out.write(render_frame(index / fps, width, height, n_players, seed))
+    finally:
+        out.release()
+    os.replace(tmp_path, path)
+    return path
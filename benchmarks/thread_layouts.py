@@ -0,0 +1,129 @@
+"""
+Total throughput of concurrent worker processes at different process x thread splits.
+
+Usage:
+    python -m benchmarks.thread_layouts [--detector yolo|stub] [--layouts 1x8,2x4,4x2,8x1,4x-]
+                                        [--resolution 1280x720] [--seconds 10] [--output layouts.json]
+
+Each layout "PxT" starts P processes that apply a thread budget of T
+(processing.resources.apply_thread_budget), load the detector, wait on a
+barrier and then all analyze the same synthetic clip, like P Celery prefork
+children with WORKER_THREADS=T. "Px-" runs P processes without a budget
+(every library sizes its pools to all cores) to show the cost of
+oversubscription. The default layouts split the machine's cores in powers of
+two. Pick the layout with the highest total fps for a machine type and set the
+worker's --concurrency and WORKER_THREADS accordingly.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import CACHE_DIR, DEFAULT_MODEL_PATH, REPO_ROOT, environment_info, make_detector
+
+
+def default_layouts(cores):
+    layouts = []
+    processes = 1
+    while processes <= cores:
+        layouts.append(f"{processes}x{cores // processes}")
+        processes *= 2
+    # Same process count as the middle split, without a budget
+    layouts.append(f"{int(layouts[len(layouts) // 2].split('x')[0])}x-")
+    return layouts
+
+
+def parse_layout(layout):
+    processes, threads = layout.lower().split("x")
+    return int(processes), None if threads == "-" else int(threads)
+
+
+def _layout_process(video_path, detector_kind, model_path, threads, barrier, results):
+    sys.path.insert(0, REPO_ROOT)
+    from processing.resources import apply_thread_budget
+    from processing.video_analyzer import analyze_video
+    if threads is not None:
+        apply_thread_budget(threads, label="benchmark")
+    detector = make_detector(detector_kind, model_path)
+    barrier.wait() # Everyone starts together, after model loading
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        result = analyze_video(
+            input_path=video_path,
+            output_video_path=os.path.join(tmp_dir, "bench_processed.mp4"),
+            output_stats_path=os.path.join(tmp_dir, "bench_stats.json"),
+            model_path=model_path if detector_kind == "yolo" else "stub",
+            detector=detector
+        )
+        results.put((result["frames_processed"], time.perf_counter() - start))
+
+
+def run_layout(layout, video_path, detector_kind, model_path):
+    processes, threads = parse_layout(layout)
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(processes)
+    results = context.Queue()
+    workers = [context.Process(target=_layout_process,
+                               args=(video_path, detector_kind, model_path, threads, barrier, results))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    runs = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    frames = sum(frames for frames, _ in runs)
+    wall_seconds = max(seconds for _, seconds in runs) # All started at the barrier
+    return {
+        "processes": processes,
+        "threads_per_process": threads,
+        "frames": frames,
+        "wall_seconds": round(wall_seconds, 3),
+        "total_fps": round(frames / max(wall_seconds, 1e-9), 2),
+        "per_process_fps": round(frames / processes / max(wall_seconds, 1e-9), 2),
+    }
+
+
+def main(argv=None):
+    sys.path.insert(0, REPO_ROOT)
+    from processing.resources import available_cores
+    from benchmarks.synthetic import generate_synthetic_video
+
+    parser = argparse.ArgumentParser(description="Compare worker concurrency / thread splits.")
+    parser.add_argument("--detector", choices=("stub", "yolo"), default="yolo")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Model for --detector yolo")
+    parser.add_argument("--layouts", default=None, help="Comma separated PxT list (T = '-' for no budget)")
+    parser.add_argument("--resolution", default="1280x720")
+    parser.add_argument("--seconds", type=int, default=10, help="Length of the synthetic clip")
+    parser.add_argument("--output", default="thread_layouts.json")
+    args = parser.parse_args(argv)
+
+    cores = available_cores()
+    layouts = args.layouts.split(",") if args.layouts else default_layouts(cores)
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    video_path = generate_synthetic_video(
+        os.path.join(CACHE_DIR, f"synthetic_{width}x{height}_{args.seconds}s.mp4"), width, height, args.seconds)
+
+    results = {"meta": dict(environment_info(), detector=args.detector, cores=cores,
+                            resolution=args.resolution, seconds=args.seconds), "layouts": {}}
+    for layout in layouts:
+        print(f"Running layout {layout}...")
+        results["layouts"][layout] = run_layout(layout, video_path, args.detector, args.model)
+        print(f"  {results['layouts'][layout]['total_fps']} fps total")
+
+    print(f"\n{'layout':>8} {'total fps':>10} {'per process':>12}")
+    best = max(results["layouts"], key=lambda layout: results["layouts"][layout]["total_fps"])
+    for layout, summary in results["layouts"].items():
+        marker = "  <- best" if layout == best else ""
+        print(f"{layout:>8} {summary['total_fps']:>10} {summary['per_process_fps']:>12}{marker}")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
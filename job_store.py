@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import time
+
+# SQLite-backed job ledger shared by the Flask app (admission control, /status,
+# /jobs) and the Celery workers (state transitions, progress, result paths).
+# Each call opens its own short-lived connection so it is safe to use from
+# gunicorn threads and prefork workers.
+#
+# `state` only ever holds QUEUED / STARTED / SUCCESS / FAILURE; progress lives in
+# its own columns so admission control can keep counting active jobs by state.
+
+ACTIVE_STATES = ('QUEUED', 'STARTED')
+FINISHED_STATES = ('SUCCESS', 'FAILURE')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    user_id     TEXT,
+    queue       TEXT,
+    cost        REAL NOT NULL DEFAULT 0,
+    state       TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_user_state ON jobs(user_id, state);
+CREATE INDEX IF NOT EXISTS idx_jobs_queue_state ON jobs(queue, state);
+"""
+
+# Columns added after the first release; missing ones are added on startup
+PROGRESS_COLUMNS = {
+    'status': 'TEXT',
+    'progress_current': 'INTEGER',
+    'progress_total': 'INTEGER',
+    'meta': 'TEXT',        # JSON: ETA/rate while running, result paths and timings or error once finished
+    'updated_at': 'REAL',
+    'deliveries': 'INTEGER', # Times a worker picked the job up; redeliveries follow killed workers
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_user_created ON jobs(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at);
+"""
+
+
+class JobStore:
+    def __init__(self, db_path) -> None:
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in PROGRESS_COLUMNS.items():
+                if column not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+                    except sqlite3.OperationalError as e:
+                        # Another process starting at the same time got there first
+                        if 'duplicate column' not in str(e):
+                            raise
+            conn.executescript(INDEXES)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create_job(self, job_id, user_id, queue, cost):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, user_id, queue, cost, state, created_at) VALUES (?, ?, ?, ?, 'QUEUED', ?)",
+                (job_id, user_id, queue, cost, time.time())
+            )
+
+    def create_job_within_limit(self, job_id, user_id, queue, cost, max_active, max_age_seconds):
+        """
+        Registers a job unless the user already has `max_active` active jobs.
+
+        The count and the insert run in one write transaction (BEGIN IMMEDIATE), so
+        concurrent uploads of the same user can't both pass the limit.
+
+        Returns:
+            bool: True if the job was registered, False if the user is at the limit.
+        """
+        cutoff = time.time() - max_age_seconds
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                active = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE user_id=? AND state IN (?, ?) AND created_at>=?",
+                    (user_id, *ACTIVE_STATES, cutoff)
+                ).fetchone()[0]
+                if active >= max_active:
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    "INSERT INTO jobs (job_id, user_id, queue, cost, state, created_at) VALUES (?, ?, ?, ?, 'QUEUED', ?)",
+                    (job_id, user_id, queue, cost, time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return True
+
+    def record_delivery(self, job_id):
+        """Counts one more delivery of the job to a worker; returns the count (None for an unknown job)."""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET deliveries=COALESCE(deliveries, 0) + 1 WHERE job_id=?", (job_id,))
+            row = conn.execute("SELECT deliveries FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def mark_started(self, job_id, meta=None):
+        # Only the first start counts; redelivered tasks keep the original start time
+        now = time.time()
+        meta = meta or {}
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state='STARTED', started_at=COALESCE(started_at, ?), finished_at=NULL, "
+                "status=?, progress_current=?, progress_total=?, meta=?, updated_at=? WHERE job_id=?",
+                (now, meta.get('status'), meta.get('current'), meta.get('total'), json.dumps(meta), now, job_id)
+            )
+
+    def update_progress(self, job_id, meta):
+        """Stores a progress update ({'current', 'total', 'status', ...}) without changing the state."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status=?, progress_current=?, progress_total=?, meta=?, updated_at=? WHERE job_id=?",
+                (meta.get('status'), meta.get('current'), meta.get('total'), json.dumps(meta), time.time(), job_id)
+            )
+
+    def mark_finished(self, job_id, state, meta=None):
+        """Final state plus its meta: result paths and timings on success, error details on failure."""
+        now = time.time()
+        meta = meta or {}
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state=?, finished_at=?, status=?, progress_current=COALESCE(?, progress_current), "
+                "progress_total=COALESCE(?, progress_total), meta=?, updated_at=? WHERE job_id=?",
+                (state, now, meta.get('status'), meta.get('current'), meta.get('total'), json.dumps(meta), now, job_id)
+            )
+
+    def get_job(self, job_id):
+        """The job's row as a dict (meta decoded), or None if unknown."""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return _job_dict(row) if row else None
+
+    def list_jobs(self, user_id=None, state=None, limit=20, offset=0):
+        """(jobs, total): one page of jobs, newest first, optionally filtered by user and state."""
+        where, params = [], []
+        if user_id is not None:
+            where.append("user_id=?")
+            params.append(user_id)
+        if state is not None:
+            where.append("state=?")
+            params.append(state)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            total = conn.execute(f"SELECT COUNT(*) FROM jobs{clause}", params).fetchone()[0]
+            rows = conn.execute(f"SELECT * FROM jobs{clause} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                                (*params, limit, offset)).fetchall()
+        return [_job_dict(row) for row in rows], total
+
+    def queue_wait_seconds(self, job_id):
+        """Seconds between enqueue and (first) start, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT started_at - created_at FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def count_by_state(self):
+        """{(queue, state): count} over the whole ledger."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT queue, state, COUNT(*) FROM jobs GROUP BY queue, state").fetchall()
+        return {(queue, state): count for queue, state, count in rows}
+
+    def count_active_jobs(self, user_id, max_age_seconds):
+        """Number of queued or running jobs for a user, ignoring stale entries."""
+        cutoff = time.time() - max_age_seconds
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id=? AND state IN (?, ?) AND created_at>=?",
+                (user_id, *ACTIVE_STATES, cutoff)
+            ).fetchone()
+        return row[0]
+
+    def active_jobs_in_queue(self, queue, max_age_seconds):
+        """(state, cost, started_at) of every queued or running job in a queue."""
+        cutoff = time.time() - max_age_seconds
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT state, cost, started_at FROM jobs WHERE queue=? AND state IN (?, ?) AND created_at>=?",
+                (queue, *ACTIVE_STATES, cutoff)
+            ).fetchall()
+
+
+def _job_dict(row):
+    job = dict(row)
+    job['meta'] = json.loads(job['meta']) if job.get('meta') else {}
+    return job
@@ -0,0 +1,131 @@
+import collections
+
+import numpy as np
+import supervision as sv
+
+from .config import MODEL_CLASSES
+
+# Ball-focused sub-pipeline. The ball is only a few pixels wide in wide shots, so
+# the full-frame pass often misses it. When that happens we predict where the
+# ball should be from its recent trajectory and run the detector on a small crop
+# around that point (plus the nearest player) at full inference resolution,
+# which magnifies the ball several times for a fraction of the cost of tiling
+# the whole frame. Only after the ball has been lost for a while do we fall
+# back to a tiled full-frame search, and even then only every few frames: the
+# gap doubles after every fruitless search (up to max_full_search_interval), so
+# a ball that stays off-screen costs a few tiled searches, not one every few
+# frames for as long as it is gone. Any ball found resets the schedule.
+
+
+class BallTracker:
+    def __init__(self, crop_size=320, inference_size=640, history=8, max_roi_frames=15,
+                 full_search_interval=5, max_full_search_interval=160, tiles=2, tile_overlap=0.1) -> None:
+        self.crop_size = crop_size
+        self.inference_size = inference_size
+        self.max_roi_frames = max_roi_frames
+        self.full_search_interval = full_search_interval
+        self.max_full_search_interval = max_full_search_interval
+        self.search_interval = full_search_interval # Current gap between tiled searches (backs off)
+        self.next_full_search = max_roi_frames # frames_lost value of the next tiled search
+        self.tiles = tiles
+        self.tile_overlap = tile_overlap
+        self.positions = collections.deque(maxlen=history) # (video frame index, x, y)
+        self.frame_index = 0 # Video frame of the last update
+        self.frames_lost = 0
+        self.stats = {"frames_with_ball": 0, "roi_searches": 0, "roi_hits": 0,
+                      "full_searches": 0, "full_hits": 0}
+
+    def predict_position(self):
+        """Constant-velocity extrapolation of the ball centre to the current frame."""
+        if not self.positions:
+            return None
+        history = np.array(self.positions, dtype=np.float64)
+        if len(history) < 2:
+            return history[-1, 1:]
+        t = history[:, 0]
+        # Least-squares line through the recent track, separately for x and y
+        slope_x, intercept_x = np.polyfit(t, history[:, 1], 1)
+        slope_y, intercept_y = np.polyfit(t, history[:, 2], 1)
+        return np.array([slope_x * self.frame_index + intercept_x, slope_y * self.frame_index + intercept_y])
+
+    def _roi(self, frame_shape, center, players_xyxy):
+        height, width = frame_shape[:2]
+        half = self.crop_size / 2
+        x1, y1, x2, y2 = center[0] - half, center[1] - half, center[0] + half, center[1] + half
+        if len(players_xyxy) > 0:
+            # The ball is usually at someone's feet: include the nearest player
+            feet = np.stack([(players_xyxy[:, 0] + players_xyxy[:, 2]) / 2, players_xyxy[:, 3]], axis=1)
+            nearest = players_xyxy[np.argmin(np.linalg.norm(feet - center, axis=1))]
+            if np.linalg.norm(np.array([(nearest[0] + nearest[2]) / 2, nearest[3]]) - center) < self.crop_size:
+                x1, y1 = min(x1, nearest[0]), min(y1, nearest[1])
+                x2, y2 = max(x2, nearest[2]), max(y2, nearest[3])
+        x1, y1 = int(max(0, x1)), int(max(0, y1))
+        x2, y2 = int(min(width, x2)), int(min(height, y2))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return x1, y1, x2, y2
+
+    def _search(self, frame, detector, box):
+        x1, y1, x2, y2 = box
+        detections = detector.predict(frame[y1:y2, x1:x2], imgsz=self.inference_size)
+        balls = detections[detections.class_id == MODEL_CLASSES["ball"]]
+        if len(balls) == 0:
+            return balls
+        balls.xyxy = balls.xyxy + np.array([x1, y1, x1, y1], dtype=balls.xyxy.dtype)
+        return balls
+
+    def _tiles(self, frame_shape):
+        height, width = frame_shape[:2]
+        tile_w, tile_h = width / self.tiles, height / self.tiles
+        pad_w, pad_h = tile_w * self.tile_overlap, tile_h * self.tile_overlap
+        for row in range(self.tiles):
+            for col in range(self.tiles):
+                yield (int(max(0, col * tile_w - pad_w)), int(max(0, row * tile_h - pad_h)),
+                       int(min(width, (col + 1) * tile_w + pad_w)), int(min(height, (row + 1) * tile_h + pad_h)))
+
+    def update(self, frame, detections, detector, frame_index):
+        """
+        Returns `detections`, with a ball added from the ROI/tiled search if the
+        full-frame pass did not find one. `frame_index` is the frame's position in
+        the video, so the trajectory stays in video time when frames are skipped,
+        reused or the job resumes.
+        """
+        self.frame_index = frame_index
+        balls = detections[detections.class_id == MODEL_CLASSES["ball"]]
+
+        if len(balls) == 0:
+            players = detections[detections.class_id == MODEL_CLASSES["player"]]
+            predicted = self.predict_position()
+            found = sv.Detections.empty()
+            if predicted is not None and self.frames_lost < self.max_roi_frames:
+                box = self._roi(frame.shape, predicted, players.xyxy)
+                if box is not None:
+                    self.stats["roi_searches"] += 1
+                    found = self._search(frame, detector, box)
+                    self.stats["roi_hits"] += int(len(found) > 0)
+            elif self.frames_lost >= max(self.max_roi_frames, self.next_full_search):
+                self.stats["full_searches"] += 1
+                for tile in self._tiles(frame.shape):
+                    found = self._search(frame, detector, tile)
+                    if len(found) > 0:
+                        break
+                self.stats["full_hits"] += int(len(found) > 0)
+                if len(found) == 0:
+                    self.search_interval = min(self.search_interval * 2, self.max_full_search_interval)
+                    self.next_full_search = self.frames_lost + self.search_interval
+
+            if len(found) > 0:
+                balls = found[[int(np.argmax(found.confidence))]] if found.confidence is not None else found[[0]]
+                detections = sv.Detections.merge([detections, balls])
+
+        if len(balls) > 0:
+            best = balls[[int(np.argmax(balls.confidence))]] if balls.confidence is not None else balls[[0]]
+            x1, y1, x2, y2 = best.xyxy[0]
+            self.positions.append((self.frame_index, (x1 + x2) / 2, (y1 + y2) / 2))
+            self.frames_lost = 0
+            self.search_interval = self.full_search_interval
+            self.next_full_search = self.max_roi_frames
+            self.stats["frames_with_ball"] += 1
+        else:
+            self.frames_lost += 1
+        return detections
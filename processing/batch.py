@@ -0,0 +1,229 @@
+"""
+Offline batch analysis of many videos (season backfills) without Flask/Celery.
+
+Usage:
+    python -m processing.batch <directory-or-manifest> [--output-dir results] [--workers N]
+
+A manifest is a .txt file (one path per line), a .csv file with a `path` column
+(and optional `id` column) or a .json list of paths / {"path", "id"} objects.
+Results use the same layout as process_video_task: <id>_processed.mp4 and
+<id>_stats.json in the output directory, so finished videos are skipped on rerun.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .resources import available_cores, apply_thread_budget
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv'}
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'best.pt')
+
+# Per-process detector, loaded once by the pool initializer
+_detector = None
+
+
+def safe_job_id(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', stem)
+
+
+def collect_jobs(source):
+    """Returns a list of (job_id, video_path) from a directory or a manifest file."""
+    entries = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                entries.append((None, os.path.join(source, name)))
+    elif source.lower().endswith('.csv'):
+        with open(source, newline='') as f:
+            for row in csv.DictReader(f):
+                entries.append((row.get('id') or None, row['path']))
+    elif source.lower().endswith('.json'):
+        with open(source) as f:
+            for item in json.load(f):
+                if isinstance(item, dict):
+                    entries.append((item.get('id'), item['path']))
+                else:
+                    entries.append((None, item))
+    else:
+        with open(source) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    entries.append((None, line))
+
+    # Relative manifest paths are relative to the manifest itself
+    base_dir = source if os.path.isdir(source) else os.path.dirname(os.path.abspath(source))
+    jobs = []
+    seen = set()
+    for job_id, path in entries:
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        job_id = safe_job_id(job_id or path)
+        if job_id in seen:
+            print(f"Warning: Duplicate job id '{job_id}', skipping {path}")
+            continue
+        seen.add(job_id)
+        jobs.append((job_id, path))
+    return jobs
+
+
+def output_paths(output_dir, job_id):
+    # Same naming as the /upload route + process_video_task
+    return (os.path.join(output_dir, f"{job_id}_processed.mp4"),
+            os.path.join(output_dir, f"{job_id}_stats.json"))
+
+
+def load_completed_stats(stats_path):
+    # analyze_video writes the stats file last, so a readable one marks a finished job
+    try:
+        with open(stats_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def summarize(job_id, video_path, status, stats=None, error=None):
+    row = {
+        "id": job_id,
+        "video": video_path,
+        "status": status,
+        "frames_processed": None,
+        "duration_seconds": None,
+        "processing_time_seconds": None,
+        "processing_fps": None,
+        "possession_team1_percent": None,
+        "possession_team2_percent": None,
+        "error": error,
+    }
+    if stats:
+        processing_time = stats.get("processing_time_seconds") or 0
+        row.update({
+            "frames_processed": stats.get("frames_processed"),
+            "duration_seconds": round(stats.get("duration_seconds", 0), 2),
+            "processing_time_seconds": round(processing_time, 2),
+            "processing_fps": round(stats.get("frames_processed", 0) / processing_time, 2) if processing_time > 0 else None,
+            "possession_team1_percent": stats.get("ball_possession_percent", {}).get("team1"),
+            "possession_team2_percent": stats.get("ball_possession_percent", {}).get("team2"),
+        })
+    return row
+
+
+def _init_worker(model_path, threads_per_worker):
+    global _detector
+    from .detector import YoloDetector
+    # Split the cores between pool processes instead of every process using all of them
+    apply_thread_budget(threads_per_worker, label="batch worker")
+    _detector = YoloDetector(model_path)
+
+
+def _run_job(job_id, video_path, output_dir, model_path, detection_cache_dir):
+    from .video_analyzer import analyze_video
+    output_video_path, output_stats_path = output_paths(output_dir, job_id)
+    try:
+        analyze_video(
+            input_path=video_path,
+            output_video_path=output_video_path,
+            output_stats_path=output_stats_path,
+            model_path=model_path,
+            detector=_detector,
+            # Interrupted backfills resume where they stopped on the next run
+            checkpoint_path=os.path.join(output_dir, 'checkpoints', f"{job_id}.checkpoint"),
+            detection_cache_dir=detection_cache_dir,
+            output_tracks_path=os.path.join(output_dir, f"{job_id}_tracks.npy")
+        )
+    except Exception as e:
+        return summarize(job_id, video_path, 'failed', error=f"{type(e).__name__}: {e}")
+    return summarize(job_id, video_path, 'completed', stats=load_completed_stats(output_stats_path))
+
+
+def write_summary(rows, summary_prefix):
+    with open(f"{summary_prefix}.json", 'w') as f:
+        json.dump(rows, f, indent=4)
+    with open(f"{summary_prefix}.csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["id"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def run_batch(source, output_dir, model_path=DEFAULT_MODEL_PATH, workers=None, threads_per_worker=2, force=False,
+              use_detection_cache=True):
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = collect_jobs(source)
+    cores = available_cores()
+    threads_per_worker = max(1, min(threads_per_worker, cores))
+    if workers is None:
+        workers = max(1, cores // threads_per_worker)
+    print(f"Found {len(jobs)} videos. Using {workers} worker process(es) x {threads_per_worker} thread(s).")
+
+    rows = []
+    pending = []
+    for job_id, video_path in jobs:
+        _, stats_path = output_paths(output_dir, job_id)
+        stats = None if force else load_completed_stats(stats_path)
+        if stats is not None:
+            rows.append(summarize(job_id, video_path, 'skipped', stats=stats))
+        elif not os.path.exists(video_path):
+            rows.append(summarize(job_id, video_path, 'failed', error="Input video not found"))
+        else:
+            pending.append((job_id, video_path))
+    print(f"{len(rows)} already handled, {len(pending)} to process.")
+
+    # With --force and a warm cache, reruns only replay tracking/possession/rendering
+    detection_cache_dir = os.path.join(output_dir, 'detection_cache') if use_detection_cache else None
+    start_time = time.time()
+    if pending:
+        # spawn: CUDA and torch thread pools don't survive fork reliably
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), mp_context=context,
+                                 initializer=_init_worker, initargs=(model_path, threads_per_worker)) as pool:
+            futures = {pool.submit(_run_job, job_id, video_path, output_dir, model_path, detection_cache_dir): (job_id, video_path)
+                       for job_id, video_path in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    row = future.result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. OOM-killed); the pool fails every unfinished job,
+                    # which the next run picks up again
+                    job_id, video_path = futures[future]
+                    row = summarize(job_id, video_path, 'failed', error="Worker process terminated abruptly")
+                rows.append(row)
+                print(f"[{done}/{len(pending)}] {row['id']}: {row['status']}"
+                      + (f" ({row['processing_fps']} fps)" if row['processing_fps'] else "")
+                      + (f" - {row['error']}" if row['error'] else ""))
+
+    rows.sort(key=lambda r: r["id"])
+    summary_prefix = os.path.join(output_dir, "batch_summary")
+    write_summary(rows, summary_prefix)
+    print(f"Batch finished in {time.time() - start_time:.1f}s. Summary: {summary_prefix}.csv / .json")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a directory or manifest of match videos.")
+    parser.add_argument("source", help="Directory of videos or manifest file (.txt, .csv, .json)")
+    parser.add_argument("--output-dir", default=os.environ.get('RESULT_FOLDER', 'results'))
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the YOLO model file (.pt)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores / threads-per-worker)")
+    parser.add_argument("--threads-per-worker", type=int, default=2, help="CPU threads per worker process (torch, OpenCV, OpenMP/BLAS)")
+    parser.add_argument("--force", action="store_true", help="Reprocess videos that already have results")
+    parser.add_argument("--no-detection-cache", action="store_true",
+                        help="Always run the model instead of replaying/writing cached detections")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        parser.error(f"Model file not found: {args.model}")
+    rows = run_batch(args.source, args.output_dir, model_path=args.model, workers=args.workers,
+                     threads_per_worker=args.threads_per_worker, force=args.force,
+                     use_detection_cache=not args.no_detection_cache)
+    return 1 if any(row["status"] == 'failed' for row in rows) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
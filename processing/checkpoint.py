@@ -0,0 +1,56 @@
+import os
+import pickle
+import time
+
+# Checkpoints let a killed or redelivered analysis resume instead of starting
+# again from frame 0. A checkpoint is a pickle of the FrameAnalyzer (trackers,
+# team model, possession counters) plus the frame index and the list of fully
+# written output segments. Checkpoints are only ever read back by this code on
+# the same worker filesystem.
+
+CHECKPOINT_VERSION = 6
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 300
+
+
+def input_signature(input_path, model_path):
+    """Identifies the input so a checkpoint is never applied to a different video or model."""
+    stat = os.stat(input_path)
+    return {"input": os.path.abspath(input_path), "size": stat.st_size,
+            "mtime": int(stat.st_mtime), "model": os.path.basename(model_path)}
+
+
+def save_checkpoint(checkpoint_path, state):
+    state = dict(state, version=CHECKPOINT_VERSION, saved_at=time.time())
+    os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    # Atomic swap: a crash mid-write never leaves a corrupt checkpoint behind
+    os.replace(tmp_path, checkpoint_path)
+
+
+def load_checkpoint(checkpoint_path, signature):
+    """Returns the saved state dict, or None if there is no usable checkpoint."""
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception as e:
+        print(f"Warning: Could not read checkpoint {checkpoint_path} ({type(e).__name__}: {e}). Starting from scratch.")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION or state.get("signature") != signature:
+        print(f"Warning: Checkpoint {checkpoint_path} does not match this input/model. Starting from scratch.")
+        return None
+    # Every referenced segment must still be on disk, otherwise the output would have holes
+    if not all(os.path.exists(path) for path in state.get("segments", [])):
+        print(f"Warning: Checkpoint {checkpoint_path} references missing segments. Starting from scratch.")
+        return None
+    return state
+
+
+def remove_checkpoint(checkpoint_path):
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
@@ -0,0 +1,190 @@
+import os
+import shutil
+import subprocess
+
+import numpy as np
+
+from .utils import get_video_properties, get_frames, create_video_writer
+
+# Highlight clips cut from the original upload or the annotated result without
+# re-decoding the match. By default a clip is a stream copy (no decoding or
+# encoding at all) widened to whole GOPs: its start moves back to the keyframe
+# at or before it and its end on to the next keyframe, so a clip may run up to
+# one GOP longer on each side. Keyframe positions come from one ffprobe packet
+# scan that only reads around the requested ranges. A highlight reel joins the
+# copied ranges with the concat demuxer (inpoint/outpoint), also in one pass;
+# all parts come from the same stream, so their SPS/PPS match.
+#
+# With `exact` the ranges are cut frame accurately instead: each range is read
+# with a fast input seek (-ss before -i decodes at most one GOP ahead of it) and
+# re-encoded to H.264, a reel in one encode with the concat filter. Sources
+# that can't be copied into MP4 are re-encoded the same way. Clips are video
+# only. Without ffmpeg the ranges are decoded and re-encoded with OpenCV, which
+# may write .avi instead of .mp4.
+
+MAX_RANGES = 50
+KEYFRAME_EPSILON = 0.01 # Seconds; a boundary this close to a keyframe counts as on it
+KEYFRAME_SEARCH_SECONDS = 20.0 # How far past a range's end to look for the next keyframe
+CLIP_ENCODER = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p"]
+CLIP_EXTENSIONS = (".mp4", ".avi") # See create_video_writer
+
+
+def normalize_ranges(ranges, duration):
+    """Validates [[start, end], ...] in seconds and clips them to the video. Raises ValueError."""
+    if not ranges:
+        raise ValueError("No time ranges given")
+    if len(ranges) > MAX_RANGES:
+        raise ValueError(f"Too many ranges (max {MAX_RANGES})")
+    normalized = []
+    for item in ranges:
+        try:
+            start, end = (float(value) for value in item)
+        except (TypeError, ValueError):
+            raise ValueError("Each range must be [start_seconds, end_seconds]")
+        start, end = max(start, 0.0), min(end, duration) if duration else end
+        if end <= start:
+            raise ValueError(f"Empty range [{start}, {end}]")
+        normalized.append((start, end))
+    return normalized
+
+
+def probe_keyframes(source_path, ranges):
+    """Keyframe timestamps of the first video stream around `ranges` (packet scan, no decoding)."""
+    # Reading an interval starts at the keyframe before it, which is the one a clip start snaps to
+    intervals = ",".join(f"{start:.3f}%{end + KEYFRAME_SEARCH_SECONDS:.3f}" for start, end in ranges)
+    packets = subprocess.run(
+        [shutil.which('ffprobe'), '-v', 'error', '-select_streams', 'v:0', '-read_intervals', intervals,
+         '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', source_path],
+        check=True, capture_output=True, text=True).stdout
+    keyframes = [float(pts) for pts, _, flags in (line.partition(',') for line in packets.splitlines())
+                 if 'K' in flags and pts not in ('', 'N/A')]
+    return np.unique(keyframes)
+
+
+def snap_ranges(keyframes, ranges):
+    """Widens each range to whole GOPs: back to the keyframe at or before its start, on to the next one after its end."""
+    snapped = []
+    for start, end in ranges:
+        before = keyframes[keyframes <= start + KEYFRAME_EPSILON]
+        after = keyframes[keyframes >= end - KEYFRAME_EPSILON]
+        # No keyframe after the end within the search window (e.g. the last GOP): copy up to the end
+        snapped.append((float(before[-1]) if len(before) else start, float(after[0]) if len(after) else end))
+    return snapped
+
+
+def _finish(command, output_path):
+    tmp_path = f"{os.path.splitext(output_path)[0]}.part.mp4"
+    try:
+        subprocess.run(command + ['-movflags', '+faststart', tmp_path], check=True)
+        os.replace(tmp_path, output_path) # Never leave a half-written clip under the final name
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _copy(ffmpeg, source_path, ranges, output_path):
+    list_path = f"{os.path.splitext(output_path)[0]}.parts.txt"
+    quoted_path = os.path.abspath(source_path).replace("'", "'\\''")
+    with open(list_path, 'w') as f:
+        for start, end in ranges:
+            f.write(f"file '{quoted_path}'\ninpoint {start:.6f}\noutpoint {end:.6f}\n")
+    try:
+        _finish([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                 '-map', '0:v:0', '-an', '-c', 'copy'], output_path)
+    finally:
+        os.remove(list_path)
+
+
+def _encode(ffmpeg, source_path, ranges, output_path):
+    command = [ffmpeg, '-y', '-loglevel', 'error']
+    for start, end in ranges:
+        command += ['-ss', f"{start:.3f}", '-t', f"{end - start:.3f}", '-i', source_path]
+    if len(ranges) == 1:
+        command += ['-map', '0:v:0']
+    else:
+        inputs = "".join(f"[{index}:v:0]" for index in range(len(ranges)))
+        command += ['-filter_complex', f"{inputs}concat=n={len(ranges)}:v=1:a=0[v]", '-map', '[v]']
+    _finish(command + ['-an'] + CLIP_ENCODER, output_path)
+
+
+def _cut(cut, ffmpeg, source_path, ranges, output_paths, reel):
+    if reel:
+        cut(ffmpeg, source_path, ranges, output_paths[0])
+    else:
+        for clip_range, output_path in zip(ranges, output_paths):
+            cut(ffmpeg, source_path, [clip_range], output_path)
+    return output_paths
+
+
+def _extract_ffmpeg(source_path, ranges, output_paths, reel, exact):
+    ffmpeg = shutil.which('ffmpeg')
+    if not exact and shutil.which('ffprobe'):
+        try:
+            snapped = snap_ranges(probe_keyframes(source_path, ranges), ranges)
+            return _cut(_copy, ffmpeg, source_path, snapped, output_paths, reel)
+        except subprocess.CalledProcessError as e:
+            print(f"Stream copy failed ({e}), re-encoding the clips")
+    return _cut(_encode, ffmpeg, source_path, ranges, output_paths, reel)
+
+
+def _extract_opencv(source_path, ranges, output_paths, reel, properties):
+    fps = properties["fps"]
+    frame_size = (properties["width"], properties["height"])
+    written = []
+    out = None
+    for index, (start, end) in enumerate(ranges):
+        if out is None:
+            out, actual_path = create_video_writer(output_paths[0 if reel else index], fps, frame_size)
+            written.append(actual_path)
+        for frame in get_frames(source_path, start=int(start * fps), end=int(np.ceil(end * fps))):
+            out.write(frame)
+        if not reel:
+            out.release()
+            out = None
+    if out is not None:
+        out.release()
+    return written
+
+
+def extract_clips(source_path, ranges, output_paths, reel=False, exact=False):
+    """
+    Cuts time ranges out of a video.
+
+    Args:
+        source_path (str): Original upload or annotated result.
+        ranges (list): [[start_seconds, end_seconds], ...].
+        output_paths (list): One output path per range, or a single path when `reel` is True.
+        reel (bool, optional): Join all ranges, in order, into one highlight reel. Defaults to False.
+        exact (bool, optional): Cut frame accurately (re-encode) instead of copying whole GOPs.
+            Defaults to False.
+
+    Returns:
+        list: The written file paths (with OpenCV the extension may differ, see create_video_writer).
+
+    Raises:
+        ValueError: For invalid ranges or an unreadable source.
+    """
+    properties = get_video_properties(source_path)
+    if properties is None or properties["fps"] <= 0:
+        raise ValueError(f"Cannot read video properties from {source_path}")
+    duration = properties["total_frames"] / properties["fps"]
+    ranges = normalize_ranges(ranges, duration)
+
+    if shutil.which('ffmpeg'):
+        try:
+            return _extract_ffmpeg(source_path, ranges, output_paths, reel, exact)
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg clip extraction failed ({e}), falling back to OpenCV re-encode")
+    return _extract_opencv(source_path, ranges, output_paths, reel, properties)
+
+
+def existing_clips(output_paths):
+    """Paths of clips already cut for these outputs (in either extension), or None if any is missing."""
+    found = []
+    for path in output_paths:
+        base = os.path.splitext(path)[0]
+        matches = [f"{base}{ext}" for ext in CLIP_EXTENSIONS if os.path.exists(f"{base}{ext}")]
+        if not matches:
+            return None
+        found.append(matches[0])
+    return found
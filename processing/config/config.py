@@ -1,3 +1,5 @@
+import os
+
 # This file defines constants used by the processing logic, 
 # primarily the mapping of class names to model output indices.
 # Paths for input/output/model are handled by the main Flask app config 
@@ -13,4 +15,9 @@ MODEL_CLASSES = {
      "active_player":6 # Used temporarily to highlight player with ball
 }
 
+# Jersey colour extraction for team assignment: "fast" (vectorized torso/grass mask),
+# "kmeans" (per-crop clustering) or "rembg" (neural background removal, slow, opt-in).
+# See processing.utils.get_player_color.
+JERSEY_COLOR_MODE = os.environ.get("JERSEY_COLOR_MODE", "fast")
+
 # You can add other non-path related configuration constants here if needed. 
\ No newline at end of file
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import supervision as sv
+
+# Persistent per-frame detection cache. Detections are stored once per (video,
+# model, confidence) so anything downstream of YOLO can be re-run without
+# inference. They are the model output plus any ball found by the ball search
+# (processing.ball_tracker), which needs the model and so can't be redone on
+# replay; otherwise they are unprocessed (before NMS, team assignment or tracking).
+#
+# Files are keyed by a content signature of the video and the model: their size
+# plus SIGNATURE_SAMPLES chunks spread over the file, so keying a full match
+# reads a few MB instead of hashing gigabytes before its first frame. mtime is
+# left out on purpose, so the same video uploaded again finds its cache.
+#
+# Layout (compressed .npz, columnar / CSR style):
+#   frame_offsets  int64 [n_frames + 1]  rows of frame i are offsets[i]:offsets[i+1]
+#   xyxy           float32 [n, 4]
+#   confidence     float32 [n]
+#   class_id       uint8   [n]
+#   meta           JSON string (video, model, conf, frame count)
+
+CACHE_FORMAT_VERSION = 1
+SIGNATURE_SAMPLES = 32
+SIGNATURE_CHUNK_SIZE = 64 * 1024
+
+
+def file_signature(path, samples=SIGNATURE_SAMPLES, chunk_size=SIGNATURE_CHUNK_SIZE):
+    """Hash of a file's size and `samples` evenly spread chunks (the whole file if it is small)."""
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        if size <= samples * chunk_size:
+            digest.update(f.read())
+        else:
+            for offset in np.linspace(0, size - chunk_size, samples).astype(np.int64):
+                f.seek(int(offset))
+                digest.update(f.read(chunk_size))
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir, video_path, model_path, conf):
+    """Cache file for this video + model + confidence threshold."""
+    key = f"s{file_signature(video_path)}_{file_signature(model_path)}_c{int(round(conf * 100)):03d}"
+    return os.path.join(cache_dir, f"{key}.detections.npz")
+
+
+class DetectionRecorder:
+    """Accumulates per-frame detections (after the ball search) and writes the cache file."""
+
+    def __init__(self) -> None:
+        self.counts = []
+        self.xyxy = []
+        self.confidence = []
+        self.class_id = []
+
+    def append(self, detections):
+        self.counts.append(len(detections))
+        if len(detections) > 0:
+            self.xyxy.append(detections.xyxy.astype(np.float32))
+            confidence = detections.confidence if detections.confidence is not None else np.ones(len(detections))
+            self.confidence.append(confidence.astype(np.float32))
+            self.class_id.append(detections.class_id.astype(np.uint8))
+
+    def save(self, path, meta):
+        offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=offsets[1:])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # np.savez appends .npz unless the name already ends with it; write to a temp name then swap
+        tmp_path = f"{path[:-len('.npz')]}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            frame_offsets=offsets,
+            xyxy=np.concatenate(self.xyxy) if self.xyxy else np.empty((0, 4), dtype=np.float32),
+            confidence=np.concatenate(self.confidence) if self.confidence else np.empty(0, dtype=np.float32),
+            class_id=np.concatenate(self.class_id) if self.class_id else np.empty(0, dtype=np.uint8),
+            meta=np.array(json.dumps(dict(meta, version=CACHE_FORMAT_VERSION, frames=len(self.counts)))),
+        )
+        os.replace(tmp_path, path)
+        print(f"Detection cache written: {path} ({len(self.counts)} frames, {int(offsets[-1])} detections)")
+
+
+class CachedDetector:
+    """
+    Replays cached detections with the YoloDetector interface: each predict() call
+    returns the next frame's detections. `min_conf` can raise (never lower) the
+    confidence threshold the cache was recorded with.
+    """
+
+    # predict() ignores its frame argument, so crop searches (see BallTracker) can't be replayed
+    supports_crops = False
+
+    def __init__(self, path, min_conf=None) -> None:
+        with np.load(path) as data:
+            self.frame_offsets = data["frame_offsets"]
+            self.xyxy = data["xyxy"]
+            self.confidence = data["confidence"]
+            self.class_id = data["class_id"].astype(int)
+            self.meta = json.loads(str(data["meta"]))
+        self.path = path
+        self.model_path = self.meta.get("model")
+        self.conf = max(self.meta.get("conf", 0.0), min_conf or 0.0)
+        self.frame_index = 0
+
+    @property
+    def frame_count(self):
+        return len(self.frame_offsets) - 1
+
+    def seek(self, frame_index):
+        self.frame_index = frame_index
+
+    def predict(self, frame=None, imgsz=None):
+        if self.frame_index >= self.frame_count:
+            raise IndexError(f"Detection cache {self.path} has only {self.frame_count} frames")
+        start, end = self.frame_offsets[self.frame_index], self.frame_offsets[self.frame_index + 1]
+        self.frame_index += 1
+        if end == start:
+            return sv.Detections.empty()
+        keep = self.confidence[start:end] >= self.conf
+        return sv.Detections(
+            xyxy=self.xyxy[start:end][keep],
+            confidence=self.confidence[start:end][keep],
+            class_id=self.class_id[start:end][keep],
+        )
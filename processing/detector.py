@@ -0,0 +1,26 @@
+import supervision as sv
+import torch
+from ultralytics import YOLO
+
+# Thin wrapper around the YOLO model so callers that process many videos
+# (batch CLI, benchmarks) can load the model once and pass it to analyze_video.
+
+DEFAULT_CONFIDENCE = 0.3
+
+
+def get_device():
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+class YoloDetector:
+    def __init__(self, model_path, device=None, conf=DEFAULT_CONFIDENCE) -> None:
+        self.model_path = model_path
+        self.device = device if device is not None else get_device()
+        self.conf = conf
+        self.model = YOLO(model_path).to(self.device)
+
+    def predict(self, frame, imgsz=None):
+        """Runs the model on one BGR frame and returns sv.Detections. `imgsz` overrides the inference size."""
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        result = self.model.predict(frame, conf=self.conf, verbose=False, device=self.device, **kwargs)[0]
+        return sv.Detections.from_ultralytics(result)
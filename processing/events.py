@@ -0,0 +1,131 @@
+import json
+import os
+
+import numpy as np
+
+from .utils import result_sibling_path
+
+# Possession events (spells, passes, turnovers) derived from the exported
+# tracking rows (tracking_export.TRACK_DTYPE, `has_ball` flag). The per-frame
+# ball holder is turned into runs with vectorized run-length encoding:
+#
+#   1. holder key per frame: team * 2**32 + tracker_id, or -1 when the ball is loose
+#   2. runs shorter than MIN_CONTROL_SECONDS are dropped (ball passing close by)
+#   3. loose frames are forward-filled with the previous holder
+#   4. each remaining run is one player's possession; consecutive runs of the same
+#      team are a pass, of different teams a turnover; runs of one team are a spell
+
+EVENTS_FORMAT_VERSION = 1
+MIN_CONTROL_SECONDS = 0.2
+EVENT_COLUMNS = ["type", "frame", "time", "team", "from_tracker_id", "to_tracker_id", "duration"]
+SPELL_COLUMNS = ["team", "start_frame", "end_frame", "start_time", "duration", "passes"]
+
+
+def _runs(values):
+    """(starts, lengths) of runs of equal consecutive values."""
+    starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    lengths = np.diff(np.concatenate([starts, [len(values)]]))
+    return starts, lengths
+
+
+def detect_events(rows, fps, total_frames):
+    """
+    Possession spells, passes and turnovers from tracking rows.
+
+    Args:
+        rows (np.ndarray): TRACK_DTYPE rows (memory-mapped is fine).
+        fps (float): Frame rate of the source video.
+        total_frames (int): Number of frames analyzed.
+
+    Returns:
+        dict: The event log ({"events": {...}, "spells": {...}} in column/row form) and a
+              "summary" with per-team counts for the stats JSON.
+    """
+    log = {"version": EVENTS_FORMAT_VERSION, "fps": fps,
+           "events": {"columns": EVENT_COLUMNS, "rows": []},
+           "spells": {"columns": SPELL_COLUMNS, "rows": []},
+           "summary": {}}
+    holders = rows[rows["has_ball"] & (rows["team"] >= 0)]
+    if len(holders) == 0 or fps <= 0 or total_frames <= 0:
+        return log
+
+    # 1. Holder key per frame
+    key = np.full(total_frames, -1, dtype=np.int64)
+    in_range = holders["frame"] < total_frames
+    holders = holders[in_range]
+    key[holders["frame"]] = holders["team"].astype(np.int64) * (1 << 32) + holders["tracker_id"]
+
+    # 2. Drop controls too short to be a touch
+    starts, lengths = _runs(key)
+    too_short = (key[starts] >= 0) & (lengths < max(int(round(MIN_CONTROL_SECONDS * fps)), 1))
+    key[np.repeat(too_short, lengths)] = -1
+    frame_index = np.arange(total_frames)
+    touched = np.where(key >= 0, frame_index, -1)
+
+    # 3. Forward-fill loose frames with the last holder
+    last_touch = np.maximum.accumulate(touched)
+    filled = np.where(last_touch >= 0, key[np.maximum(last_touch, 0)], -1)
+
+    # 4. One run per player possession
+    starts, lengths = _runs(filled)
+    held = filled[starts] >= 0
+    starts, lengths = starts[held], lengths[held]
+    if len(starts) == 0:
+        return log
+    run_key = filled[starts]
+    run_team = (run_key >> 32).astype(int)
+    run_tracker = (run_key & 0xFFFFFFFF).astype(int)
+    run_last_touch = np.maximum.reduceat(touched, starts)
+
+    # Transitions between consecutive possessions
+    same_team = run_team[1:] == run_team[:-1]
+    event_frames = starts[1:]
+    event_durations = (event_frames - run_last_touch[:-1]) / fps # Ball travel time
+    for i in range(len(event_frames)):
+        log["events"]["rows"].append([
+            "pass" if same_team[i] else "turnover",
+            int(event_frames[i]),
+            round(event_frames[i] / fps, 2),
+            int(run_team[i + 1]) + 1, # Team that has the ball after the event
+            int(run_tracker[i]),
+            int(run_tracker[i + 1]),
+            round(float(event_durations[i]), 2),
+        ])
+
+    # Team spells: runs of possessions by the same team
+    spell_starts, spell_lengths = _runs(run_team)
+    spell_last = spell_starts + spell_lengths - 1
+    spell_start_frames = starts[spell_starts]
+    spell_end_frames = run_last_touch[spell_last]
+    for team, start, end, passes in zip(run_team[spell_starts], spell_start_frames, spell_end_frames, spell_lengths - 1):
+        log["spells"]["rows"].append([int(team) + 1, int(start), int(end), round(start / fps, 2),
+                                      round((end - start + 1) / fps, 2), int(passes)])
+
+    # Per-team summary for the stats JSON
+    passes = np.bincount(run_team[1:][same_team], minlength=2)
+    turnovers_won = np.bincount(run_team[1:][~same_team], minlength=2)
+    spell_team = run_team[spell_starts]
+    spell_seconds = (spell_end_frames - spell_start_frames + 1) / fps
+    for team in (0, 1):
+        mine = spell_team == team
+        log["summary"][f"team{team + 1}"] = {
+            "passes": int(passes[team]),
+            "turnovers_won": int(turnovers_won[team]),
+            "spells": int(mine.sum()),
+            "mean_spell_seconds": round(float(spell_seconds[mine].mean()), 2) if mine.any() else 0.0,
+            "longest_spell_seconds": round(float(spell_seconds[mine].max()), 2) if mine.any() else 0.0,
+        }
+    return log
+
+
+def events_path_for(stats_path):
+    """<id>_events.json next to <id>_stats.json."""
+    return result_sibling_path(stats_path, "events", ".json")
+
+
+def write_event_log(path, log):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(log, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    print(f"Event log written: {path} ({len(log['events']['rows'])} events, {len(log['spells']['rows'])} spells)")
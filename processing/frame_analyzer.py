@@ -0,0 +1,258 @@
+import time
+from array import array
+
+import numpy as np
+import supervision as sv
+
+from .utils import annotate_frames, assign_ball_to_player, draw_team_ball_control
+from .team_assigner import Assigner
+from .config import MODEL_CLASSES
+from .tracking_export import object_rows
+
+
+class FrameAnalyzer:
+    """
+    Holds all per-match state (trackers, team model, possession counters) and
+    turns one frame plus its raw detections into an annotated frame.
+
+    Everything stored here is picklable so the whole object can be checkpointed
+    and restored to resume an interrupted analysis.
+    """
+
+    def __init__(self) -> None:
+        # Initialize tracker and team assigner
+        self.tracker_team1 = sv.ByteTrack()
+        self.tracker_team2 = sv.ByteTrack() # Separate tracker for each team
+        self.team_assigner = Assigner()
+
+        # --- State Variables ---
+        self.is_first_frame = True
+        self.kmeans_teams = None # KMeans model for team assignment
+        self.team_colors = {} # Store average team colors (used by Assigner)
+        self.ball_possession_frames = {MODEL_CLASSES["team1"]: 0, MODEL_CLASSES["team2"]: 0} # Frame counts
+        self.last_player_with_ball_team = None
+        self.frames_processed = 0
+        # Per-frame timelines (see processing.timeline): team credited with possession (0/1, -1 for
+        # none) and whether the ball was detected. Compact arrays so checkpoints stay small.
+        self.possession_timeline = array('b')
+        self.ball_timeline = array('B')
+
+        # --- Quality knobs (adjusted at runtime by the LatencyGovernor) ---
+        # Re-run colour-based team assignment for a player only every N frames;
+        # in between, a player matched by box overlap keeps its previous team.
+        self.team_recheck_interval = 1
+        self.annotate = True
+        self.show_heatmap = False
+        self._previous_player_boxes = np.empty((0, 4))
+        self._previous_player_teams = np.empty(0, dtype=int)
+        self._previous_team_checked_at = np.empty(0, dtype=int)
+
+        # Seconds spent in each stage for the last frame
+        self.last_timings = {}
+        # Every object of the last frame as tracking_export.TRACK_DTYPE rows
+        self.last_objects = None
+
+    def _assign_teams(self, frame, players_detections):
+        """Team id (0/1, or -1 if unknown) for each player, reusing recent assignments where allowed."""
+        count = len(players_detections)
+        team_ids = np.full(count, -1, dtype=int)
+        checked_at = np.full(count, self.frames_processed, dtype=int)
+        if self.kmeans_teams is None or count == 0:
+            return team_ids
+
+        reuse = np.zeros(count, dtype=bool)
+        if self.team_recheck_interval > 1 and len(self._previous_player_boxes) > 0:
+            iou = sv.box_iou_batch(players_detections.xyxy, self._previous_player_boxes)
+            best = iou.argmax(axis=1)
+            has_match = iou[np.arange(count), best] > 0.5
+            reuse = has_match & (self.frames_processed - self._previous_team_checked_at[best] < self.team_recheck_interval)
+            team_ids[reuse] = self._previous_player_teams[best[reuse]]
+            checked_at[reuse] = self._previous_team_checked_at[best[reuse]]
+
+        # Everyone else in one batch (one colour extraction and one KMeans predict per frame)
+        if not reuse.all():
+            team_ids[~reuse] = self.team_assigner.get_player_teams(frame, players_detections.xyxy[~reuse], self.kmeans_teams)
+
+        self._previous_player_boxes = players_detections.xyxy.copy()
+        self._previous_player_teams = team_ids
+        self._previous_team_checked_at = checked_at
+        return team_ids
+
+    def process_frame(self, frame, detections, duplicate=False):
+        """
+        Runs team assignment, tracking, possession and annotation for one frame.
+
+        Args:
+            frame (np.ndarray): The BGR frame.
+            detections (sv.Detections): Raw model detections for this frame.
+            duplicate (bool, optional): The frame repeats the previous one and `detections` are the
+                previous frame's. Trackers and possession still advance, but team assignment is reused
+                and annotation is skipped. Defaults to False.
+
+        Returns:
+            np.ndarray: The annotated frame, or None for a duplicate (reuse the previous output).
+        """
+        self.frames_processed += 1
+        stage_start = time.perf_counter()
+
+        # Separate detections by initial class (Player, Ball, Referee, Goalkeeper)
+        # Use .get() with default 0 to handle cases where a class might not be in MODEL_CLASSES
+        ball_detections = detections[detections.class_id == MODEL_CLASSES.get("ball", -1)]
+        players_detections = detections[detections.class_id == MODEL_CLASSES.get("player", -1)]
+        referee_detections = detections[detections.class_id == MODEL_CLASSES.get("referee", -1)]
+        # Initial goalkeeper detections (if model distinguishes them)
+        goalkeepers_detections = detections[detections.class_id == MODEL_CLASSES.get("goalkepper", -1)] # Watch for typo
+
+        # Apply NMS specifically to players to avoid overlapping boxes
+        players_detections = players_detections.with_nms(threshold=0.5)
+        self.last_timings["nms_class_split"] = time.perf_counter() - stage_start
+
+        # 2. Team Assignment (on first frame or if needed)
+        stage_start = time.perf_counter()
+        if self.is_first_frame and len(players_detections) > 0:
+            print("Assigning team colors...")
+            self.kmeans_teams = self.team_assigner.assign_team_color(frame, players_detections)
+            if self.kmeans_teams is None:
+                 print("Warning: Failed to assign team colors, proceeding with defaults.")
+                 # Handle case where assigner failed (e.g., assign fixed default teams)
+            else:
+                self.team_colors = self.team_assigner.team_colors # Assigner stores colors internally
+                print(f"Team colors assigned (HSV): {self.team_colors}")
+            self.is_first_frame = False
+        elif self.is_first_frame and len(players_detections) == 0:
+            print("Warning: No players detected in the first frame to assign teams.")
+            self.is_first_frame = False # Avoid infinite loop if first frame has no players
+
+        # 3. Assign Team ID to each player detection
+        if duplicate and len(self._previous_player_teams) == len(players_detections):
+            team_ids = self._previous_player_teams # Same boxes as the previous frame, same teams
+        else:
+            team_ids = self._assign_teams(frame, players_detections)
+        team1_indices = np.flatnonzero(team_ids == 0)
+        team2_indices = np.flatnonzero(team_ids == 1)
+        gk_indices = [] # Indices of players re-classified as goalkeepers
+        self.last_timings["team_assignment"] = time.perf_counter() - stage_start
+
+        # Create Detections objects for each team
+        team1_detections = players_detections[team1_indices]
+        team2_detections = players_detections[team2_indices]
+        # Combine explicitly detected GKs with re-classified players
+        gk_players = players_detections[gk_indices]
+        all_goalkeepers = sv.Detections.merge([goalkeepers_detections, gk_players])
+
+        # 4. Update Trackers
+        stage_start = time.perf_counter()
+        team1_detections_tracked = self.tracker_team1.update_with_detections(detections=team1_detections)
+        team2_detections_tracked = self.tracker_team2.update_with_detections(detections=team2_detections)
+        self.last_timings["tracking"] = time.perf_counter() - stage_start
+
+        # 5. Ball Possession
+        stage_start = time.perf_counter()
+        active_player_detection = sv.Detections.empty()
+
+        # --- Safely merge tracked detections ---
+        detections_to_merge = []
+        if len(team1_detections_tracked) > 0:
+            detections_to_merge.append(team1_detections_tracked)
+        if len(team2_detections_tracked) > 0:
+            detections_to_merge.append(team2_detections_tracked)
+
+        if not detections_to_merge: # If both were empty
+            all_tracked_players = sv.Detections.empty()
+        elif len(detections_to_merge) == 1: # If only one had detections
+            all_tracked_players = detections_to_merge[0]
+        else: # If both had detections, merge them
+            try:
+                all_tracked_players = sv.Detections.merge(detections_to_merge)
+            except ValueError as merge_error:
+                print(f"Warning: Error merging detections: {merge_error}. Skipping ball assignment for this frame.")
+                all_tracked_players = sv.Detections.empty() # Fallback to empty
+        # --- End of safe merge ---
+
+        # Use combined tracked teams for ball assignment check
+        player_idx_with_ball = assign_ball_to_player(all_tracked_players, ball_detections.xyxy)
+
+        current_player_team = None
+        player_tracker_id = None
+        credited_team = None # Team whose possession counter goes up this frame
+        if player_idx_with_ball != -1 and len(all_tracked_players) > player_idx_with_ball:
+            # Determine the team of the player with the ball based on tracker ID
+            player_tracker_id = all_tracked_players.tracker_id[player_idx_with_ball]
+            # Check which original tracked list contained this ID
+            if player_tracker_id in team1_detections_tracked.tracker_id:
+                current_player_team = MODEL_CLASSES["team1"]
+            elif player_tracker_id in team2_detections_tracked.tracker_id:
+                current_player_team = MODEL_CLASSES["team2"]
+
+            if current_player_team is not None:
+                credited_team = current_player_team
+                self.ball_possession_frames[current_player_team] += 1
+                self.last_player_with_ball_team = current_player_team
+                # Create detection for annotating the active player
+                active_player_detection = all_tracked_players[player_idx_with_ball]
+                # Pad the box for better visibility
+                active_player_detection.xyxy = sv.pad_boxes(xyxy=active_player_detection.xyxy, px=10)
+        elif self.last_player_with_ball_team is not None:
+            # If ball is not near anyone, assign possession to last team known to have it
+            credited_team = self.last_player_with_ball_team
+            self.ball_possession_frames[self.last_player_with_ball_team] += 1
+
+        self.possession_timeline.append({MODEL_CLASSES["team1"]: 0, MODEL_CLASSES["team2"]: 1}.get(credited_team, -1))
+        self.ball_timeline.append(1 if len(ball_detections) > 0 else 0)
+
+        # Tracking rows for export, before any boxes are padded for drawing
+        frame_index = self.frames_processed - 1
+        team_rows = [object_rows(frame_index, team1_detections_tracked, MODEL_CLASSES["player"], team=0, tracked=True),
+                     object_rows(frame_index, team2_detections_tracked, MODEL_CLASSES["player"], team=1, tracked=True)]
+        if current_player_team is not None:
+            holder = team_rows[0 if current_player_team == MODEL_CLASSES["team1"] else 1]
+            holder["has_ball"] = holder["tracker_id"] == player_tracker_id
+        self.last_objects = np.concatenate(team_rows + [
+            object_rows(frame_index, ball_detections, MODEL_CLASSES["ball"]),
+            object_rows(frame_index, referee_detections, MODEL_CLASSES["referee"]),
+            object_rows(frame_index, all_goalkeepers, MODEL_CLASSES["goalkepper"]),
+        ])
+
+        # Pad ball box
+        if len(ball_detections.xyxy) > 0:
+             ball_detections.xyxy = sv.pad_boxes(xyxy=ball_detections.xyxy, px=10)
+
+        self.last_timings["possession"] = time.perf_counter() - stage_start
+
+        # 6. Annotation
+        stage_start = time.perf_counter()
+        if duplicate:
+            self.last_timings["annotation"] = 0.0
+            return None
+        if not self.annotate:
+            # Cheapest output: raw frame with just the possession overlay
+            annotated_frame = draw_team_ball_control(frame, self.ball_possession_frames)
+            self.last_timings["annotation"] = time.perf_counter() - stage_start
+            return annotated_frame
+
+        labels = {
+            "labels_team1": [f"{tracker_id}" for tracker_id in team1_detections_tracked.tracker_id],
+            "labels_team2": [f"{tracker_id}" for tracker_id in team2_detections_tracked.tracker_id],
+            "labels_referee": ["ref"] * len(referee_detections),
+            "labels_gk": ["GK"] * len(all_goalkeepers)
+        }
+
+        all_detections_for_annotation = {
+            "goalkeepers": all_goalkeepers,
+            "ball": ball_detections,
+            # Pass tracked teams for consistent ID labeling
+            "team1": team1_detections_tracked,
+            "team2": team2_detections_tracked,
+            "referee": referee_detections,
+            "active_player": active_player_detection
+        }
+
+        annotated_frame = annotate_frames(
+            frame,
+            all_detections_for_annotation,
+            labels,
+            self.ball_possession_frames, # Pass frame counts
+            show_heatmap=self.show_heatmap # Heatmap disabled by default
+        )
+        self.last_timings["annotation"] = time.perf_counter() - stage_start
+        return annotated_frame
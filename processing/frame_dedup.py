@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+
+# Duplicate frame detection for frame-doubled uploads (50/60 fps exports of
+# 25/30 fps broadcasts, screen recordings that repeat frames). Each frame is
+# reduced to a small area-averaged thumbnail; a frame whose thumbnail differs
+# from the last analyzed frame's by at most DUPLICATE_MAX_DIFF at every pixel is
+# a duplicate. Area averaging removes most re-encoding noise, and using the max
+# rather than the mean keeps a single moving player from being averaged away.
+# Duplicates are compared against the last non-duplicate frame, so slow motion
+# can't creep through a chain of "almost equal" frames.
+
+THUMBNAIL_SIZE = (160, 90)
+DUPLICATE_MAX_DIFF = 8 # Grey levels, per thumbnail pixel and channel
+
+
+class DuplicateFrameDetector:
+    def __init__(self, max_diff=DUPLICATE_MAX_DIFF, size=THUMBNAIL_SIZE) -> None:
+        self.max_diff = max_diff
+        self.size = size
+        self.reference = None
+        self.duplicates = 0
+        self.frames = 0
+
+    def check(self, frame):
+        """True if `frame` repeats the last non-duplicate frame; otherwise it becomes the new reference."""
+        thumbnail = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        self.frames += 1
+        if self.reference is not None and np.abs(thumbnail - self.reference).max() <= self.max_diff:
+            self.duplicates += 1
+            return True
+        self.reference = thumbnail
+        return False
+
+    @property
+    def stats(self):
+        return {
+            "duplicate_frames": self.duplicates,
+            "frames_checked": self.frames,
+            "duplicate_percent": round(self.duplicates / self.frames * 100, 2) if self.frames else 0.0,
+        }
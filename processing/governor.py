@@ -0,0 +1,125 @@
+import time
+
+# Latency-budget governor: watches per-stage timings and trades quality for speed
+# (or back) so analyze_video meets a target processing rate or a deadline.
+# Every change is logged so the quality trade-offs end up in the stats JSON.
+
+# Quality ladders, best quality first. The governor moves one step at a time.
+KNOB_LADDERS = {
+    "imgsz": [640, 512, 416, 320],
+    "detection_stride": [1, 2, 3, 4],
+    "team_recheck_interval": [1, 5, 15, 30],
+    "show_heatmap": [True, False],
+    "annotate": [True, False],
+}
+
+# Which knobs relieve which stage, in the order they should be degraded
+STAGE_KNOBS = {
+    "inference": ["imgsz", "detection_stride"],
+    "team_assignment": ["team_recheck_interval"],
+    "annotation": ["show_heatmap", "annotate"],
+}
+
+
+class LatencyGovernor:
+    def __init__(self, target_fps=None, deadline_seconds=None, total_frames=None, show_heatmap=False,
+                 window_frames=30, degrade_margin=0.95, upgrade_margin=1.3) -> None:
+        if target_fps is None and deadline_seconds is None:
+            raise ValueError("LatencyGovernor needs a target_fps or a deadline_seconds")
+        self.target_fps = target_fps
+        self.deadline_seconds = deadline_seconds
+        self.total_frames = total_frames
+        self.window_frames = window_frames
+        self.degrade_margin = degrade_margin
+        self.upgrade_margin = upgrade_margin
+        self.started_at = time.time()
+
+        # Current position on each ladder; heatmap starts off unless the caller asked for it
+        self.levels = {knob: 0 for knob in KNOB_LADDERS}
+        if not show_heatmap:
+            self.levels["show_heatmap"] = 1
+        self.degraded = [] # Stack of knobs in the order they were degraded
+        self.adjustments = []
+
+        self._window_start = time.time()
+        self._window_frames = 0
+        self._stage_totals = {}
+
+    @property
+    def knobs(self):
+        return {knob: KNOB_LADDERS[knob][level] for knob, level in self.levels.items()}
+
+    def required_fps(self, frames_done):
+        if self.deadline_seconds is None:
+            return self.target_fps
+        remaining_frames = max((self.total_frames or 0) - frames_done, 0)
+        remaining_time = self.deadline_seconds - (time.time() - self.started_at)
+        if remaining_time <= 0:
+            return float('inf') # Already late: go as fast as possible
+        required = remaining_frames / remaining_time
+        return max(required, self.target_fps or 0)
+
+    def record_frame(self, stage_timings):
+        """Feed the seconds spent in each stage for one frame."""
+        self._window_frames += 1
+        for stage, seconds in stage_timings.items():
+            self._stage_totals[stage] = self._stage_totals.get(stage, 0.0) + seconds
+
+    def update(self, frames_done):
+        """Call once per frame; returns True if a knob changed."""
+        if self._window_frames < self.window_frames:
+            return False
+        elapsed = max(time.time() - self._window_start, 1e-6)
+        measured_fps = self._window_frames / elapsed
+        required = self.required_fps(frames_done)
+        stage_totals = self._stage_totals
+        self._window_start = time.time()
+        self._window_frames = 0
+        self._stage_totals = {}
+
+        if measured_fps < required * self.degrade_margin:
+            return self._degrade(frames_done, measured_fps, required, stage_totals)
+        if self.degraded and measured_fps > required * self.upgrade_margin:
+            return self._upgrade(frames_done, measured_fps, required)
+        return False
+
+    def _degrade(self, frames_done, measured_fps, required, stage_totals):
+        # Relieve the most expensive stage first, then anything that still has room
+        stages = sorted(STAGE_KNOBS, key=lambda stage: stage_totals.get(stage, 0.0), reverse=True)
+        for stage in stages:
+            for knob in STAGE_KNOBS[stage]:
+                if self.levels[knob] < len(KNOB_LADDERS[knob]) - 1:
+                    self._set(knob, self.levels[knob] + 1, frames_done, measured_fps, required, f"slow {stage}")
+                    self.degraded.append(knob)
+                    return True
+        return False
+
+    def _upgrade(self, frames_done, measured_fps, required):
+        # Undo the most recent degradation first
+        knob = self.degraded.pop()
+        self._set(knob, self.levels[knob] - 1, frames_done, measured_fps, required, "headroom")
+        return True
+
+    def _set(self, knob, level, frames_done, measured_fps, required, reason):
+        old_value = KNOB_LADDERS[knob][self.levels[knob]]
+        self.levels[knob] = level
+        adjustment = {
+            "frame": frames_done,
+            "elapsed_seconds": round(time.time() - self.started_at, 2),
+            "knob": knob,
+            "from": old_value,
+            "to": KNOB_LADDERS[knob][level],
+            "reason": reason,
+            "measured_fps": round(measured_fps, 2),
+            "required_fps": round(required, 2) if required != float('inf') else None,
+        }
+        self.adjustments.append(adjustment)
+        print(f"Governor: {knob} {old_value} -> {adjustment['to']} ({reason}, {measured_fps:.2f} fps)")
+
+    def summary(self):
+        return {
+            "target_fps": self.target_fps,
+            "deadline_seconds": self.deadline_seconds,
+            "final_knobs": self.knobs,
+            "adjustments": self.adjustments,
+        }
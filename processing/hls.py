@@ -0,0 +1,165 @@
+import glob
+import math
+import os
+import shutil
+import subprocess
+
+# Progressive HLS (fMP4 segments) output. Annotated frames are piped raw into an
+# ffmpeg process that encodes H.264 with a fixed GOP per segment. The stream is
+# written in runs: one ffmpeg process per checkpoint interval, each with its own
+# init segment, media segments and playlist (run000_init.mp4, run000_seg_00000.m4s,
+# run000.m3u8, ...). playlist.m3u8 is an EVENT playlist stitching the finished
+# segments of all runs together, separated by discontinuities; it is rewritten as
+# segments appear, and #EXT-X-ENDLIST is only added when the stream is closed at
+# the end of the job, so players can start watching while the analysis continues.
+#
+# A checkpoint ends the current run first, so everything before the checkpoint
+# frame is in finished runs. A resumed job starts again at the run after those:
+# whatever a killed run encoded past the checkpoint is dropped, not played twice.
+
+HLS_SEGMENT_SECONDS = 4
+PLAYLIST_NAME = "playlist.m3u8"
+
+
+def _read_segments(run_playlist_path):
+    """[(duration, uri)] of the finished segments listed in one run's playlist."""
+    if not os.path.exists(run_playlist_path):
+        return []
+    segments = []
+    duration = None
+    with open(run_playlist_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",")[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((duration, line))
+                duration = None
+    return segments
+
+
+class HlsWriter:
+    """
+    cv2.VideoWriter-like sink (write / release / isOpened) that produces an HLS stream in `hls_dir`.
+
+    Args:
+        hls_dir (str): Output folder for the playlist and segments.
+        fps (float): Frame rate of the written frames.
+        frame_size (tuple): (width, height) of the written frames.
+        first_run (int, optional): Runs kept from before a resume (see rotate()); later
+            runs left behind by a killed job are discarded. Defaults to 0.
+    """
+
+    def __init__(self, hls_dir, fps, frame_size, first_run=0) -> None:
+        self.ffmpeg = shutil.which('ffmpeg')
+        if self.ffmpeg is None:
+            raise IOError("ffmpeg is required for HLS output")
+        os.makedirs(hls_dir, exist_ok=True)
+        self.hls_dir = hls_dir
+        self.playlist_path = os.path.join(hls_dir, PLAYLIST_NAME)
+        self.fps = fps
+        self.frame_size = frame_size
+        self.gop = max(int(round(fps * HLS_SEGMENT_SECONDS)), 1)
+        self.refresh_interval = max(int(round(fps)), 1) # Frames between playlist refreshes
+        self.run = first_run
+        self.frames_in_run = 0
+        self.process = None
+        self._start_run()
+        self._write_playlist() # Drops what a killed run published after the checkpoint
+
+    def _run_prefix(self, run):
+        return f"run{run:03d}"
+
+    def _start_run(self):
+        prefix = self._run_prefix(self.run)
+        # Leftovers of a killed run with the same number
+        for path in glob.glob(os.path.join(self.hls_dir, f"{prefix}*")):
+            os.remove(path)
+        width, height = self.frame_size
+        command = [
+            self.ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-r', f"{self.fps}", '-i', '-',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            # One keyframe per segment so every segment starts cleanly
+            '-g', str(self.gop), '-keyint_min', str(self.gop), '-sc_threshold', '0',
+            '-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'event',
+            '-hls_segment_type', 'fmp4', '-hls_fmp4_init_filename', f"{prefix}_init.mp4",
+            '-hls_segment_filename', os.path.join(self.hls_dir, f"{prefix}_seg_%05d.m4s"),
+            '-hls_flags', 'independent_segments',
+            os.path.join(self.hls_dir, f"{prefix}.m3u8"),
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.frames_in_run = 0
+
+    def _finish_run(self):
+        if self.process.stdin and not self.process.stdin.closed:
+            self.process.stdin.close()
+        self.process.wait()
+
+    def _write_playlist(self, final=False):
+        lines = []
+        durations = []
+        for run in range(self.run + 1):
+            segments = _read_segments(os.path.join(self.hls_dir, f"{self._run_prefix(run)}.m3u8"))
+            if not segments:
+                continue
+            if durations:
+                # Timestamps restart with every run
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f'#EXT-X-MAP:URI="{self._run_prefix(run)}_init.mp4"')
+            for duration, uri in segments:
+                lines += [f"#EXTINF:{duration:.6f},", uri]
+                durations.append(duration)
+        if not durations:
+            if os.path.exists(self.playlist_path):
+                os.remove(self.playlist_path)
+            return
+        header = ["#EXTM3U", "#EXT-X-VERSION:7", f"#EXT-X-TARGETDURATION:{math.ceil(max(durations))}",
+                  "#EXT-X-MEDIA-SEQUENCE:0", "#EXT-X-PLAYLIST-TYPE:EVENT", "#EXT-X-INDEPENDENT-SEGMENTS"]
+        if final:
+            lines.append("#EXT-X-ENDLIST")
+        # Players polling the playlist must never see a half-written file
+        tmp_path = f"{self.playlist_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write("\n".join(header + lines) + "\n")
+        os.replace(tmp_path, self.playlist_path)
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(frame.tobytes())
+        except (BrokenPipeError, ValueError) as e:
+            raise IOError(f"HLS encoder exited (code {self.process.poll()})") from e
+        self.frames_in_run += 1
+        if self.frames_in_run % self.refresh_interval == 0:
+            self._write_playlist()
+
+    def has_segments(self):
+        """True once the first segment is finished and published in the playlist."""
+        return os.path.exists(self.playlist_path)
+
+    def rotate(self):
+        """
+        Finishes the current run, so every frame written so far is in a published segment,
+        and starts the next one. Call before saving a checkpoint.
+
+        Returns:
+            int: Number of finished runs, the `first_run` of a job resumed from that checkpoint.
+        """
+        self._finish_run()
+        self._write_playlist()
+        self.run += 1
+        self._start_run()
+        return self.run
+
+    def release(self):
+        """Flushes the last segment and finalizes the playlist (#EXT-X-ENDLIST)."""
+        self._finish_run()
+        self._write_playlist(final=True)
+
+    def abort(self):
+        """Stops without finalizing; a resumed run continues from its checkpoint's runs."""
+        self.process.kill()
+        self.process.wait()
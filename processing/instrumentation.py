@@ -0,0 +1,225 @@
+import json
+import os
+import socket
+import time
+from array import array
+
+import numpy as np
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+# Per-frame stage timing for analyze_video and worker-level counters that the
+# Flask app exports in Prometheus text format on /metrics.
+
+PIPELINE_STAGES = ("decode", "dedup", "inference", "ball_search", "nms_class_split", "team_assignment",
+                   "tracking", "possession", "annotation", "encode")
+
+# Histogram bucket upper bounds in milliseconds
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageTimer:
+    """Collects one duration sample per stage per frame (compact float arrays, ~8 bytes/sample)."""
+
+    def __init__(self) -> None:
+        self.samples = {}
+
+    def add(self, stage, seconds):
+        if stage not in self.samples:
+            self.samples[stage] = array('d')
+        self.samples[stage].append(seconds)
+
+    def add_all(self, timings):
+        for stage, seconds in timings.items():
+            self.add(stage, seconds)
+
+    def totals(self):
+        return {stage: float(sum(values)) for stage, values in self.samples.items()}
+
+    def summary(self):
+        """Per-stage totals, percentiles and a millisecond histogram, ready for the stats JSON."""
+        ordered = [stage for stage in PIPELINE_STAGES if stage in self.samples]
+        ordered += [stage for stage in self.samples if stage not in PIPELINE_STAGES]
+        summary = {}
+        for stage in ordered:
+            values_ms = np.frombuffer(self.samples[stage], dtype=np.float64) * 1000
+            if len(values_ms) == 0:
+                continue
+            p50, p90, p99 = np.percentile(values_ms, [50, 90, 99])
+            counts = np.histogram(values_ms, bins=(0,) + HISTOGRAM_BUCKETS_MS + (np.inf,))[0]
+            summary[stage] = {
+                "count": int(len(values_ms)),
+                "total_seconds": round(float(values_ms.sum()) / 1000, 3),
+                "mean_ms": round(float(values_ms.mean()), 3),
+                "p50_ms": round(float(p50), 3),
+                "p90_ms": round(float(p90), 3),
+                "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(values_ms.max()), 3),
+                # Bucket "le_X" counts samples in (previous bound, X] ms
+                "histogram_ms": {f"le_{bound}": int(count) for bound, count in
+                                 zip(HISTOGRAM_BUCKETS_MS + ("inf",), counts)},
+            }
+        return summary
+
+
+class WorkerMetrics:
+    """
+    Cumulative counters for one worker process, persisted as a small JSON file in
+    `metrics_dir` so the web process can export every worker's numbers.
+    """
+
+    def __init__(self, metrics_dir) -> None:
+        self.metrics_dir = metrics_dir
+        self.values = {
+            "jobs_started": 0,
+            "jobs_succeeded": 0,
+            "jobs_failed": 0,
+            "frames_processed": 0,
+            "processing_seconds": 0.0,
+            "last_job_fps": 0.0,
+            "queue_wait_seconds_sum": 0.0,
+            "queue_wait_seconds_count": 0,
+            "model_load_seconds": 0.0,
+            "peak_rss_bytes": 0,
+            "stage_seconds": {},
+        }
+
+    def stream_update(self, snapshot, live=True):
+        """Latest live-analysis metrics (StreamMetrics.snapshot() of processing.stream_analyzer)."""
+        self.values["stream"] = {
+            "live": live,
+            "frames_processed": snapshot["frames_processed"],
+            "frames_dropped": snapshot["frames_dropped"],
+            "drop_rate": snapshot["drop_rate"],
+            "processing_fps": snapshot["processing_fps"],
+            "latency_p50_seconds": snapshot["latency_ms"]["p50"] / 1000,
+            "latency_p95_seconds": snapshot["latency_ms"]["p95"] / 1000,
+            "latency_max_seconds": snapshot["latency_ms"]["max"] / 1000,
+        }
+        self.flush()
+
+    def job_started(self, queue_wait_seconds=None):
+        self.values["jobs_started"] += 1
+        if queue_wait_seconds is not None:
+            self.values["queue_wait_seconds_sum"] += queue_wait_seconds
+            self.values["queue_wait_seconds_count"] += 1
+        self.flush()
+
+    def job_finished(self, succeeded, result=None):
+        self.values["jobs_succeeded" if succeeded else "jobs_failed"] += 1
+        if result:
+            frames = result.get("frames_processed", 0)
+            seconds = result.get("processing_time_seconds", 0.0)
+            self.values["frames_processed"] += frames
+            self.values["processing_seconds"] += seconds
+            if seconds > 0:
+                self.values["last_job_fps"] = frames / seconds
+            if result.get("model_load_seconds"):
+                self.values["model_load_seconds"] = result["model_load_seconds"]
+            for stage, seconds in result.get("stage_seconds", {}).items():
+                self.values["stage_seconds"][stage] = self.values["stage_seconds"].get(stage, 0.0) + seconds
+        self.flush()
+
+    def flush(self):
+        rss = peak_rss_bytes()
+        if rss is not None:
+            self.values["peak_rss_bytes"] = rss
+        try:
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            # The pid is read at flush time: prefork children inherit this object from the parent
+            path = os.path.join(self.metrics_dir, f"{socket.gethostname()}-{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(self.values, updated_at=time.time()), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write worker metrics: {e}")
+
+
+def _format_metric(lines, name, metric_type, help_text, samples):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+
+def render_prometheus(metrics_dir, job_state_counts=None, stale_seconds=24 * 3600):
+    """Renders all worker metric files (plus optional job ledger counts) in Prometheus text format."""
+    workers = []
+    if os.path.isdir(metrics_dir):
+        now = time.time()
+        for name in sorted(os.listdir(metrics_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(metrics_dir, name)) as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - values.get("updated_at", 0) > stale_seconds:
+                continue # Long-dead worker process
+            workers.append((name[:-len('.json')], values))
+
+    lines = []
+    simple_metrics = [
+        ("smartcoach_jobs_started_total", "counter", "Video jobs started", "jobs_started"),
+        ("smartcoach_frames_processed_total", "counter", "Frames analyzed", "frames_processed"),
+        ("smartcoach_processing_seconds_total", "counter", "Wall-clock seconds spent analyzing", "processing_seconds"),
+        ("smartcoach_last_job_fps", "gauge", "Frames per second of the last finished job", "last_job_fps"),
+        ("smartcoach_model_load_seconds", "gauge", "Time taken by the last model load", "model_load_seconds"),
+        ("smartcoach_peak_rss_bytes", "gauge", "Peak resident set size of the worker process", "peak_rss_bytes"),
+    ]
+    for name, metric_type, help_text, key in simple_metrics:
+        _format_metric(lines, name, metric_type, help_text,
+                       [({"worker": worker}, values.get(key, 0)) for worker, values in workers])
+
+    _format_metric(lines, "smartcoach_jobs_finished_total", "counter", "Video jobs finished by outcome",
+                   [({"worker": worker, "outcome": outcome}, values.get(f"jobs_{outcome}", 0))
+                    for worker, values in workers for outcome in ("succeeded", "failed")])
+
+    lines.append("# HELP smartcoach_queue_wait_seconds Time jobs spent queued before starting")
+    lines.append("# TYPE smartcoach_queue_wait_seconds summary")
+    for worker, values in workers:
+        lines.append(f'smartcoach_queue_wait_seconds_sum{{worker="{worker}"}} {values.get("queue_wait_seconds_sum", 0)}')
+        lines.append(f'smartcoach_queue_wait_seconds_count{{worker="{worker}"}} {values.get("queue_wait_seconds_count", 0)}')
+
+    _format_metric(lines, "smartcoach_stage_seconds_total", "counter", "Seconds spent per pipeline stage",
+                   [({"worker": worker, "stage": stage}, seconds)
+                    for worker, values in workers for stage, seconds in values.get("stage_seconds", {}).items()])
+
+    # Live analysis sessions (processing.stream_analyzer), one per stream process
+    streams = [(worker, values["stream"]) for worker, values in workers if values.get("stream")]
+    if streams:
+        stream_metrics = [
+            ("smartcoach_stream_live", "gauge", "1 while the live session is running", "live"),
+            ("smartcoach_stream_frames_processed_total", "counter", "Live frames analyzed", "frames_processed"),
+            ("smartcoach_stream_frames_dropped_total", "counter", "Live frames dropped to keep up", "frames_dropped"),
+            ("smartcoach_stream_drop_rate", "gauge", "Share of live frames dropped", "drop_rate"),
+            ("smartcoach_stream_processing_fps", "gauge", "Live frames analyzed per second", "processing_fps"),
+        ]
+        for name, metric_type, help_text, key in stream_metrics:
+            _format_metric(lines, name, metric_type, help_text,
+                           [({"worker": worker}, int(stream[key]) if key == "live" else stream[key])
+                            for worker, stream in streams])
+        _format_metric(lines, "smartcoach_stream_latency_seconds", "gauge",
+                       "End-to-end live latency (capture to written frame) over the recent window",
+                       [({"worker": worker, "quantile": quantile}, stream[f"latency_{key}_seconds"])
+                        for worker, stream in streams
+                        for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("1", "max"))])
+
+    if job_state_counts is not None:
+        _format_metric(lines, "smartcoach_jobs", "gauge", "Jobs in the job ledger by queue and state",
+                       [({"queue": queue, "state": state}, count) for (queue, state), count in job_state_counts.items()])
+
+    return "\n".join(lines) + "\n"
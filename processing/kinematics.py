@@ -0,0 +1,143 @@
+import numpy as np
+
+from .config import MODEL_CLASSES
+
+# Physical stats (distance, speed, sprints, team shape) computed from the
+# exported tracking rows (see tracking_export.TRACK_DTYPE). Everything is done
+# with whole-array NumPy operations over all tracks at once: rows are sorted by
+# track, and per-track results come from segment boundaries, cumulative sums and
+# bincount, so a full match costs a few passes over the arrays rather than a
+# Python loop per frame.
+#
+# There is no pitch calibration, so pixels are converted to metres locally using
+# the player's own box height (an average player is ~1.8 m tall). This follows
+# the perspective: a player far from the camera has a smaller box and each pixel
+# covers more ground.
+
+PLAYER_HEIGHT_M = 1.8
+SMOOTHING_WINDOW_SECONDS = 0.4
+MAX_GAP_SECONDS = 0.5 # Longer tracking gaps are not counted as movement
+MAX_SPEED_MPS = 12.0 # Faster steps are tracking jumps (e.g. an ID switch), not running
+SPRINT_SPEED_MPS = 7.0 # 25.2 km/h
+MIN_SPRINT_SECONDS = 1.0
+MIN_TRACK_SECONDS = 1.0
+# Upper bounds (m/s) of the speed zones; the last zone is open-ended
+SPEED_ZONES = (("walking", 2.0), ("jogging", 4.0), ("running", 5.5), ("high_speed", SPRINT_SPEED_MPS), ("sprinting", np.inf))
+
+
+def _segment_smooth(values, starts, ends, half_window):
+    """Centred moving average that never crosses a track boundary (starts/ends per element)."""
+    index = np.arange(len(values))
+    lo = np.maximum(index - half_window, starts)
+    hi = np.minimum(index + half_window, ends)
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    return (cumulative[hi + 1] - cumulative[lo]) / (hi - lo + 1)
+
+
+def compute_kinematics(rows, fps):
+    """
+    Per-player physical stats and per-team shape from tracking rows.
+
+    Args:
+        rows (np.ndarray): TRACK_DTYPE rows (e.g. TrackingData(...).rows; memory-mapped is fine).
+        fps (float): Frame rate of the source video.
+
+    Returns:
+        dict: {"players": [...], "teams": {...}} ready for the stats JSON.
+    """
+    players = rows[(rows["tracker_id"] >= 0) & (rows["class_id"] == MODEL_CLASSES["player"])]
+    result = {"players": [], "teams": {}, "units": {"distance": "m", "speed": "m/s", "time": "s"}}
+    if len(players) == 0 or fps <= 0:
+        return result
+
+    # --- Group rows by track: (team, tracker_id), in frame order within each track ---
+    keys = players["team"].astype(np.int64) * (1 << 32) + players["tracker_id"]
+    order = np.argsort(keys, kind="stable") # Rows are already in frame order
+    keys = keys[order]
+    frame = players["frame"][order].astype(np.int64)
+    x1, y1, x2, y2 = (players[c][order].astype(np.float64) for c in ("x1", "y1", "x2", "y2"))
+
+    track_starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    track_of_row = np.cumsum(np.concatenate([[False], keys[1:] != keys[:-1]]))
+    n_tracks = len(track_starts)
+    track_ends = np.concatenate([track_starts[1:], [len(keys)]]) - 1
+    row_start, row_end = track_starts[track_of_row], track_ends[track_of_row]
+
+    # --- Smoothed feet positions and local metres-per-pixel ---
+    half_window = max(int(SMOOTHING_WINDOW_SECONDS * fps / 2), 0)
+    x = _segment_smooth((x1 + x2) / 2, row_start, row_end, half_window)
+    y = _segment_smooth(y2, row_start, row_end, half_window)
+    metres_per_px = _segment_smooth(PLAYER_HEIGHT_M / np.maximum(y2 - y1, 1.0), row_start, row_end, half_window)
+
+    # --- Steps between consecutive rows of the same track ---
+    same_track = track_of_row[1:] == track_of_row[:-1]
+    dt = (frame[1:] - frame[:-1]) / fps
+    step_m = np.hypot(np.diff(x), np.diff(y)) * (metres_per_px[1:] + metres_per_px[:-1]) / 2
+    speed = np.divide(step_m, dt, out=np.zeros_like(step_m), where=dt > 0)
+    valid = same_track & (dt > 0) & (dt <= MAX_GAP_SECONDS) & (speed <= MAX_SPEED_MPS)
+    step_m, speed, dt = np.where(valid, step_m, 0.0), np.where(valid, speed, 0.0), np.where(valid, dt, 0.0)
+    step_track = track_of_row[1:]
+
+    distance = np.bincount(step_track, weights=step_m, minlength=n_tracks)
+    moving_seconds = np.bincount(step_track, weights=dt, minlength=n_tracks)
+    max_speed = np.zeros(n_tracks)
+    np.maximum.at(max_speed, step_track, speed)
+
+    # Time in each speed zone
+    zone = np.searchsorted([upper for _, upper in SPEED_ZONES], speed, side="right")
+    zone_seconds = np.bincount(step_track * len(SPEED_ZONES) + zone, weights=dt,
+                               minlength=n_tracks * len(SPEED_ZONES)).reshape(n_tracks, len(SPEED_ZONES))
+
+    # Sprints: runs of consecutive valid steps above the sprint speed, lasting long enough
+    fast = valid & (speed >= SPRINT_SPEED_MPS)
+    run_starts = fast & ~np.concatenate([[False], fast[:-1]])
+    run_id = np.cumsum(run_starts) - 1
+    if run_starts.any():
+        run_seconds = np.bincount(run_id[fast], weights=dt[fast], minlength=int(run_starts.sum()))
+        run_track = step_track[run_starts]
+        sprints = np.bincount(run_track[run_seconds >= MIN_SPRINT_SECONDS], minlength=n_tracks)
+    else:
+        sprints = np.zeros(n_tracks, dtype=int)
+
+    # --- Per-player summary ---
+    team = players["team"][order].astype(np.int64)
+    tracker_id = players["tracker_id"][order]
+    track_seconds = (frame[track_ends] - frame[track_starts]) / fps
+    zone_names = [name for name, _ in SPEED_ZONES]
+    for t in np.flatnonzero(track_seconds >= MIN_TRACK_SECONDS):
+        result["players"].append({
+            "team": int(team[track_starts[t]]) + 1,
+            "tracker_id": int(tracker_id[track_starts[t]]),
+            "first_frame": int(frame[track_starts[t]]),
+            "last_frame": int(frame[track_ends[t]]),
+            "distance_m": round(float(distance[t]), 1),
+            "max_speed_mps": round(float(max_speed[t]), 2),
+            "mean_speed_mps": round(float(distance[t] / moving_seconds[t]), 2) if moving_seconds[t] > 0 else 0.0,
+            "sprints": int(sprints[t]),
+            "speed_zone_seconds": {name: round(float(s), 1) for name, s in zip(zone_names, zone_seconds[t])},
+        })
+
+    # --- Team shape per frame: centroid and spread (RMS distance to the centroid) ---
+    on_team = team >= 0
+    group = (frame - frame.min()) * 2 + team
+    group, gx, gy, gm = group[on_team], x[on_team], y[on_team], metres_per_px[on_team]
+    n_groups = int(group.max()) + 1 if len(group) else 0
+    counts = np.bincount(group, minlength=n_groups)
+    present = counts >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cx = np.bincount(group, weights=gx, minlength=n_groups) / counts
+        cy = np.bincount(group, weights=gy, minlength=n_groups) / counts
+        spread_m = np.sqrt(np.bincount(group, weights=((gx - cx[group]) ** 2 + (gy - cy[group]) ** 2) * gm ** 2,
+                                       minlength=n_groups) / counts)
+    for team_index in (0, 1):
+        frames_mask = present & (np.arange(n_groups) % 2 == team_index)
+        if not frames_mask.any():
+            continue
+        result["teams"][f"team{team_index + 1}"] = {
+            "frames": int(frames_mask.sum()),
+            "mean_centroid_px": [round(float(cx[frames_mask].mean()), 1), round(float(cy[frames_mask].mean()), 1)],
+            "mean_spread_m": round(float(spread_m[frames_mask].mean()), 2),
+            "max_spread_m": round(float(spread_m[frames_mask].max()), 2),
+            "distance_m": round(float(sum(p["distance_m"] for p in result["players"] if p["team"] == team_index + 1)), 1),
+        }
+    return result
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+
+# Catalog of detection models (models/catalog.json) and per-job model choice.
+#
+# Each entry registers one model file with the throughput and accuracy measured
+# on the benchmark clips (benchmarks.model_catalog fills in "fps"; "map50" comes
+# from the model's validation run):
+#
+#   {"name": "best", "path": "best.pt", "backend": "pytorch", "devices": ["cpu", "cuda"],
+#    "map50": 0.81, "fps": {"cpu": 6.2, "cuda": 48.0}}
+#
+# "path" is relative to the catalog's folder and may be anything ultralytics
+# loads (.pt, .onnx, an _openvino_model folder). Entries whose file is missing
+# are skipped, so one catalog can be shipped to workers with different models.
+#
+# Choice, on the worker that runs the job (its device decides which fps apply):
+#   - a model named by the job, if its file exists here and it runs on this device
+#   - with a deadline, the most accurate model whose estimated processing time
+#     fits in DEADLINE_HEADROOM of the deadline; if none fits, the fastest
+#   - otherwise the catalog's default
+# Estimated time = frames / fps, scaled by the video's megapixels relative to
+# the benchmark clips (decode, drawing and encoding grow with resolution,
+# inference much less, hence the floor on the scale) and by the worker's speed
+# factor. The LatencyGovernor still holds the deadline within the chosen model.
+#
+# Loaded detectors are kept per process, keyed by (name, device), so jobs that
+# run in the same worker process share one copy of each model.
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'catalog.json')
+DEADLINE_HEADROOM = 0.8 # Plan to finish in 80% of the deadline
+MIN_RESOLUTION_SCALE = 0.5
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+class ModelCatalog:
+    def __init__(self, path=CATALOG_PATH) -> None:
+        self.path = path
+        with open(path) as f:
+            catalog = json.load(f)
+        self.default = catalog["default"]
+        self.reference_megapixels = catalog.get("reference_megapixels", 1920 * 1080 / 1e6)
+        self.entries = {}
+        for entry in catalog["models"]:
+            entry = dict(entry, path=os.path.join(os.path.dirname(path), entry["path"]))
+            self.entries[entry["name"]] = entry
+        if self.default not in self.entries:
+            raise ValueError(f"Default model {self.default!r} is not in {path}")
+
+    def available(self, device=None):
+        """Entries whose model file exists (and that run on `device`, e.g. "cpu" or "cuda")."""
+        return [entry for entry in self.entries.values()
+                if os.path.exists(entry["path"]) and (device is None or device in entry.get("devices", [device]))]
+
+    def get(self, name):
+        if name not in self.entries:
+            raise ValueError(f"Unknown model {name!r}, expected one of {sorted(self.entries)}")
+        return self.entries[name]
+
+    def estimate_seconds(self, entry, device, total_frames, megapixels, speed_factor=1.0):
+        """Estimated processing time of a video with `entry` on `device`; None if its fps was never measured."""
+        fps = (entry.get("fps") or {}).get(device)
+        if not fps:
+            return None
+        scale = max(megapixels / self.reference_megapixels, MIN_RESOLUTION_SCALE) if megapixels else 1.0
+        return total_frames / (fps * speed_factor) * scale
+
+    def choose(self, device, name=None, deadline_seconds=None, total_frames=None, megapixels=None, speed_factor=1.0):
+        """
+        Picks the model for one job on this worker.
+
+        Args:
+            device (str): "cpu" or "cuda", the worker's inference device.
+            name (str, optional): Model requested by the job. Wins over the deadline when it is
+                available on this worker.
+            deadline_seconds (float, optional): Processing time the job asked for.
+            total_frames (int, optional): Frames in the video, for the time estimate.
+            megapixels (float, optional): Frame size of the video, for the time estimate.
+            speed_factor (float, optional): This worker's speed relative to the benchmark machine.
+
+        Returns:
+            tuple: (catalog entry, dict describing the choice for the job's stats).
+        """
+        candidates = self.available(device)
+        if name:
+            entry = self.get(name)
+            if entry in candidates:
+                return entry, {"model": name, "reason": "requested"}
+            print(f"Requested model {name} is not available on {device}, choosing automatically")
+
+        if deadline_seconds and total_frames and candidates:
+            estimates = [(entry, self.estimate_seconds(entry, device, total_frames, megapixels, speed_factor))
+                         for entry in candidates]
+            estimates = [(entry, seconds) for entry, seconds in estimates if seconds is not None]
+            budget = deadline_seconds * DEADLINE_HEADROOM
+            fitting = [(entry, seconds) for entry, seconds in estimates if seconds <= budget]
+            if fitting:
+                # Most accurate that fits; unknown accuracy ranks last
+                entry, seconds = max(fitting, key=lambda item: (item[0].get("map50") or 0.0, -item[1]))
+                reason = "most accurate within deadline"
+            elif estimates:
+                entry, seconds = min(estimates, key=lambda item: item[1])
+                reason = "fastest (none fits the deadline)"
+            else:
+                entry, seconds, reason = None, None, None
+            if entry is not None:
+                return entry, {"model": entry["name"], "reason": reason,
+                               "estimated_seconds": round(seconds, 1), "deadline_seconds": deadline_seconds}
+
+        entry = self.get(self.default)
+        return entry, {"model": entry["name"], "reason": "default"}
+
+
+def load_detector(entry, device=None):
+    """Detector for a catalog entry, loaded on first use and shared by later jobs in this process."""
+    from .detector import YoloDetector, get_device
+    device = device if device is not None else get_device()
+    key = (entry["name"], str(device))
+    with _detectors_lock:
+        if key not in _detectors:
+            print(f"Loading model {entry['name']} ({entry['path']}) on {device}")
+            _detectors[key] = YoloDetector(entry["path"], device=device)
+        return _detectors[key]
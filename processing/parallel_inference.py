@@ -0,0 +1,169 @@
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+import supervision as sv
+
+from .resources import split_cores, apply_thread_budget
+
+# In-job inference pool for many-core CPU workers.
+#
+#   decoder process ──(frame index, slot)──> N inference processes ──(index, slot, boxes)──> main process
+#        │                                         │                                          │
+#        └───────── writes frames into a shared-memory ring of slots, read in place ─────────┘
+#
+# Frames never go through a pipe: the decoder copies each decoded frame into a
+# free slot of one SharedMemory block, inference processes wrap the slot in a
+# NumPy view, and only the slot index and the (small) detection arrays are
+# queued. The main process reassembles results in frame order and keeps all
+# sequential state (tracking, team assignment, possession, encoding); a slot is
+# handed back to the decoder once the main process is done with its frame.
+#
+# Each inference process gets a thread budget of cores // (workers + 1) (the
+# main process keeps a share for its own stages) and the decoder runs OpenCV
+# single-threaded, so the pool doesn't oversubscribe the machine.
+
+SLOTS_PER_WORKER = 2
+RESULT_TIMEOUT_SECONDS = 600
+
+
+def _decoder_main(input_path, start_frame, shm_name, frame_shape, free_slots, tasks, results, workers):
+    from .utils import get_frames
+    import cv2
+    cv2.setNumThreads(1)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame_bytes = int(np.prod(frame_shape))
+    view = None
+    try:
+        for index, frame in enumerate(get_frames(input_path, start=start_frame), start=start_frame):
+            slot = free_slots.get()
+            view = np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf, offset=slot * frame_bytes)
+            view[...] = frame
+            tasks.put((index, slot))
+    except Exception as e:
+        # Reported like an inference failure; the exit code covers a lost message
+        results.put(("error", f"Decoder failed: {type(e).__name__}: {e}"))
+        raise
+    finally:
+        for _ in range(workers):
+            tasks.put(None)
+        view = None # Release the buffer export before closing
+        shm.close()
+
+
+def _inference_main(detector_factory, threads, shm_name, frame_shape, tasks, results):
+    apply_thread_budget(threads, label="inference")
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame_bytes = int(np.prod(frame_shape))
+    view = None
+    try:
+        detector = detector_factory()
+        while True:
+            item = tasks.get()
+            if item is None:
+                break
+            index, slot = item
+            view = np.ndarray(frame_shape, dtype=np.uint8, buffer=shm.buf, offset=slot * frame_bytes)
+            detections = detector.predict(view)
+            results.put((index, slot, detections.xyxy, detections.confidence, detections.class_id, detections.data))
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        results.put(None) # This worker is done
+        view = None
+        shm.close()
+
+
+class ParallelInference:
+    """
+    Iterates (frame, detections) in frame order, with decoding and inference
+    spread over processes. The yielded frame is a view into shared memory that is
+    only valid until the next iteration.
+
+    Args:
+        input_path (str): Video to analyze.
+        frame_shape (tuple): (height, width, 3) of the decoded frames.
+        detector_factory (callable): Picklable zero-argument callable returning a detector
+            (e.g. functools.partial(YoloDetector, model_path)); called once in each inference process.
+        workers (int): Number of inference processes.
+        start_frame (int, optional): First frame to decode (resume). Defaults to 0.
+    """
+
+    def __init__(self, input_path, frame_shape, detector_factory, workers, start_frame=0) -> None:
+        self.input_path = input_path
+        self.frame_shape = tuple(frame_shape)
+        self.detector_factory = detector_factory
+        self.workers = workers
+        self.start_frame = start_frame
+        # Inference processes plus the main process share the cores
+        self.threads_per_worker = split_cores(workers + 1)
+
+    def __iter__(self):
+        context = multiprocessing.get_context('spawn')
+        slots = self.workers * SLOTS_PER_WORKER + 2
+        frame_bytes = int(np.prod(self.frame_shape))
+        shm = shared_memory.SharedMemory(create=True, size=slots * frame_bytes)
+        free_slots, tasks, results = context.Queue(), context.Queue(), context.Queue()
+        for slot in range(slots):
+            free_slots.put(slot)
+
+        processes = [context.Process(target=_decoder_main, daemon=True,
+                                     args=(self.input_path, self.start_frame, shm.name, self.frame_shape,
+                                           free_slots, tasks, results, self.workers))]
+        processes += [context.Process(target=_inference_main, daemon=True,
+                                      args=(self.detector_factory, self.threads_per_worker, shm.name,
+                                            self.frame_shape, tasks, results))
+                      for _ in range(self.workers)]
+        print(f"Parallel inference: {self.workers} inference process(es) x {self.threads_per_worker} thread(s), "
+              f"{slots} shared frame slots ({slots * frame_bytes / 2**20:.0f} MB)")
+        for process in processes:
+            process.start()
+
+        try:
+            pending = {}
+            next_index = self.start_frame
+            running = self.workers
+            while running > 0 or pending:
+                if next_index in pending:
+                    slot, xyxy, confidence, class_id, data = pending.pop(next_index)
+                    frame = np.ndarray(self.frame_shape, dtype=np.uint8, buffer=shm.buf, offset=slot * frame_bytes)
+                    if len(xyxy) == 0:
+                        detections = sv.Detections.empty()
+                    else:
+                        detections = sv.Detections(xyxy=xyxy, confidence=confidence, class_id=class_id, data=data)
+                    yield frame, detections
+                    del frame
+                    free_slots.put(slot) # The main process is done with this frame
+                    next_index += 1
+                    continue
+                if running == 0:
+                    raise RuntimeError(f"Parallel inference lost frame {next_index}")
+                try:
+                    item = results.get(timeout=RESULT_TIMEOUT_SECONDS)
+                except queue.Empty:
+                    raise RuntimeError(f"Parallel inference timed out waiting for frame {next_index}")
+                if item is None:
+                    running -= 1
+                elif item[0] == "error":
+                    raise RuntimeError(f"Inference process failed: {item[1]}")
+                else:
+                    index, slot, xyxy, confidence, class_id, data = item
+                    pending[index] = (slot, xyxy, confidence, class_id, data)
+            # The end-of-stream sentinels are also sent when the decoder fails: don't pass a cut-short video off as complete
+            processes[0].join()
+            if processes[0].exitcode != 0:
+                raise RuntimeError(f"Parallel inference decoder exited with code {processes[0].exitcode}")
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            for q in (free_slots, tasks, results):
+                q.cancel_join_thread()
+                q.close()
+            try:
+                shm.close()
+            except BufferError:
+                pass # The caller still holds the last frame view; the block is freed with it
+            shm.unlink()
@@ -0,0 +1,148 @@
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+from .config import MODEL_CLASSES
+from .team_assigner import Assigner
+from .utils import assign_ball_to_player
+
+# Quick possession preview and its refinement during the full pass.
+#
+# Preview: detect on a sparse, evenly spread sample of frames (read by seeking,
+# so the cost does not grow with the match length). In each sampled frame the
+# player closest to the ball is the holder, and their team is read from the same
+# jersey-colour model the full pass builds (both fit on frame 0, so the team
+# labels agree). The share of samples held by team 1 estimates team 1's
+# possession, with a Wilson score interval.
+#
+# Refinement: once the full pass has processed frames [0, k), those frames are
+# known exactly and only the samples in [k, end) still estimate the rest:
+#
+#   share = (1 - f) * share_exact[0, k) + f * share_sampled[k, end),   f = (end - k) / end
+#
+# with the interval of the sampled part scaled by f, so it narrows to zero as
+# the full pass completes. Loose-ball frames, which the full pass credits to
+# the last team in possession, are not counted by the sample.
+
+DEFAULT_PREVIEW_SAMPLES = 60
+Z_95 = 1.96
+
+
+def wilson_interval(successes, n, z=Z_95):
+    """(low, high) Wilson score interval for a binomial proportion; (0, 1) when n is 0."""
+    if n <= 0:
+        return 0.0, 1.0
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+def sample_frames(input_path, total_frames, samples):
+    """Yields (frame_index, frame) for `samples` evenly spaced frames, starting with frame 0."""
+    indices = np.unique(np.linspace(0, max(total_frames - 1, 0), samples).astype(int))
+    cap = cv2.VideoCapture(input_path)
+    try:
+        for index in indices:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            ok, frame = cap.read()
+            if ok:
+                yield int(index), frame
+    finally:
+        cap.release()
+
+
+def quick_preview(input_path, detector, total_frames, samples=DEFAULT_PREVIEW_SAMPLES):
+    """
+    Possession estimate from a sparse sample of frames.
+
+    Returns:
+        dict: "sample_frames" / "sample_teams" (holder team per sample: 0, 1 or -1 for none) for
+              refine_estimate, the number of samples and the estimate itself (see refine_estimate).
+    """
+    assigner = Assigner()
+    kmeans = None
+    frames, teams = [], []
+    for index, frame in sample_frames(input_path, total_frames, samples):
+        detections = detector.predict(frame)
+        players = detections[detections.class_id == MODEL_CLASSES.get("player", -1)].with_nms(threshold=0.5)
+        ball = detections[detections.class_id == MODEL_CLASSES.get("ball", -1)]
+        if kmeans is None and len(players) > 0:
+            kmeans = assigner.assign_team_color(frame, players)
+        team = -1
+        holder = assign_ball_to_player(players, ball.xyxy)
+        if kmeans is not None and holder != -1:
+            team = int(assigner.get_player_team(frame, players.xyxy[holder], kmeans))
+        frames.append(index)
+        teams.append(team)
+
+    preview = {"samples": len(frames), "sample_frames": frames, "sample_teams": teams}
+    preview["estimate"] = refine_estimate(preview, total_frames, 0, 0, 0)
+    return preview
+
+
+def refine_estimate(preview, total_frames, frames_done, team1_frames, team2_frames):
+    """
+    Possession estimate combining the exact counts of the first `frames_done` frames
+    with the preview samples of the remaining frames.
+
+    Returns:
+        dict: {"team1": %, "team2": %, "team1_ci95": [low %, high %], "exact_fraction": 0-1,
+               "samples_used": n}; percentages are None until anything is known.
+    """
+    sampled_at = np.asarray(preview["sample_frames"], dtype=int)
+    sample_teams = np.asarray(preview["sample_teams"], dtype=int)
+    remaining = sampled_at >= frames_done
+    held = sample_teams[remaining] >= 0
+    n = int(held.sum())
+    team1_samples = int((sample_teams[remaining][held] == 0).sum())
+
+    f = max(total_frames - frames_done, 0) / total_frames if total_frames > 0 else 0.0
+    exact_held = team1_frames + team2_frames
+    if exact_held == 0 or frames_done == 0:
+        f = 1.0 # Nothing known exactly yet: the sample speaks for everything
+    if n == 0 and exact_held > 0:
+        f = 0.0 # No usable samples left: the processed part speaks for everything
+    if n == 0 and exact_held == 0:
+        return {"team1": None, "team2": None, "team1_ci95": None,
+                "exact_fraction": round(1 - f, 3), "samples_used": 0}
+
+    exact_share = team1_frames / exact_held if exact_held > 0 else 0.0
+    low, high = wilson_interval(team1_samples, n)
+    sampled_share = team1_samples / n if n > 0 else 0.0
+    share = (1 - f) * exact_share + f * sampled_share
+    return {
+        "team1": round(share * 100, 1),
+        "team2": round((1 - share) * 100, 1),
+        "team1_ci95": [round(((1 - f) * exact_share + f * low) * 100, 1),
+                       round(((1 - f) * exact_share + f * high) * 100, 1)],
+        "exact_fraction": round(1 - f, 3),
+        "samples_used": n,
+    }
+
+
+def write_preliminary_stats(path, source_video, fps, total_frames, frames_done, estimate, phase):
+    """Writes a provisional stats JSON (replaced by the final one when the job completes)."""
+    stats = {
+        "source_video": source_video,
+        "preliminary": True,
+        "phase": phase, # "preview" or "refining"
+        "total_frames": total_frames,
+        "frames_processed": frames_done,
+        "duration_seconds": total_frames / fps if fps > 0 else 0,
+        "ball_possession_percent": {"team1": estimate["team1"], "team2": estimate["team2"]},
+        "ball_possession_ci95": {
+            "team1": estimate["team1_ci95"],
+            "team2": [round(100 - estimate["team1_ci95"][1], 1), round(100 - estimate["team1_ci95"][0], 1)]
+                     if estimate["team1_ci95"] else None,
+        },
+        "estimate": estimate,
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, indent=4)
+    os.replace(tmp_path, path)
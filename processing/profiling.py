@@ -0,0 +1,179 @@
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from .instrumentation import peak_rss_bytes
+from .utils import result_sibling_path
+
+# On-demand profiling of one job, for jobs that are slow in production.
+#
+# A background thread samples the analysis thread's stack every `interval`
+# seconds through sys._current_frames() (no tracing hooks, so the analysis
+# runs at full speed apart from the GIL hand-offs) and counts identical stacks.
+# Allocation tracing is a separate opt-in, because tracemalloc hooks every
+# allocation and so distorts the timings being sampled. When enabled,
+# tracemalloc records where memory is allocated; the same thread snapshots the
+# allocation sites whenever traced memory reaches a new high (by PEAK_STEP), so
+# the reported hot spots are those of the job's peak rather than whatever is
+# still alive at the end. Current RSS is sampled alongside the stacks to get the
+# peak for this job only (ru_maxrss covers the whole life of a worker process).
+#
+# Artifacts, next to <id>_stats.json:
+#   <id>_profile_stacks.txt   collapsed stacks ("frame;frame;frame count" per line), the input
+#                             format of flamegraph.pl, speedscope and most flame graph viewers
+#   <id>_profile.json         top functions, peak RSS, and (with allocation tracing) top
+#                             allocation sites and traced memory
+#
+# Nothing here runs unless a job asks for a profile, so unprofiled jobs pay nothing.
+
+DEFAULT_INTERVAL_SECONDS = 0.01
+TRACEMALLOC_FRAMES = 8
+TOP_N = 30
+PEAK_STEP = 1.1 # Re-snapshot allocations when traced memory grows 10% past the last snapshot
+
+
+def _current_rss_bytes():
+    # /proc is Linux only; elsewhere only the lifetime peak is available
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _frame_label(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval from a daemon thread."""
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL_SECONDS) -> None:
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.peak_rss = None
+        # Allocation snapshot taken at the highest traced memory (when tracemalloc is running)
+        self.peak_snapshot = None
+        self._snapshot_traced = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+            rss = _current_rss_bytes()
+            if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+                self.peak_rss = rss
+            if tracemalloc.is_tracing():
+                traced, _ = tracemalloc.get_traced_memory()
+                if traced > self._snapshot_traced * PEAK_STEP:
+                    self.peak_snapshot = tracemalloc.take_snapshot()
+                    self._snapshot_traced = traced
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top_functions(self, n=TOP_N):
+        """Functions by self time (leaf of the stack) and total time (anywhere on the stack)."""
+        self_counts, total_counts = collections.Counter(), collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_counts[frames[-1]] += count
+            for label in set(frames):
+                total_counts[label] += count
+
+        def as_rows(counter):
+            return [{"function": label, "samples": count, "percent": round(count / max(self.samples, 1) * 100, 1)}
+                    for label, count in counter.most_common(n)]
+        return {"self": as_rows(self_counts), "total": as_rows(total_counts)}
+
+
+def _top_allocations(snapshot, n=TOP_N):
+    rows = []
+    for stat in snapshot.statistics('traceback')[:n]:
+        rows.append({
+            "size_mb": round(stat.size / 2**20, 3),
+            "count": stat.count,
+            # Innermost frame first
+            "traceback": [f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)],
+        })
+    return rows
+
+
+class JobProfile:
+    """
+    Context manager that profiles the code it wraps and writes the artifacts on exit
+    (also when the job fails, which is often when a profile is wanted).
+
+    Args:
+        stats_path (str): The job's stats path; artifacts are written next to it.
+        interval (float, optional): Seconds between stack samples.
+        trace_allocations (bool, optional): Record allocation sites with tracemalloc
+            (slows allocation-heavy code down noticeably). Defaults to False.
+    """
+
+    def __init__(self, stats_path, interval=DEFAULT_INTERVAL_SECONDS, trace_allocations=False) -> None:
+        self.stacks_path = result_sibling_path(stats_path, "profile_stacks", ".txt")
+        self.summary_path = result_sibling_path(stats_path, "profile", ".json")
+        self.trace_allocations = trace_allocations
+        self.profiler = SamplingProfiler(interval=interval)
+
+    def __enter__(self):
+        if self.trace_allocations:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.stop()
+        summary = {
+            "duration_seconds": round(self.profiler.duration, 3),
+            "interval_seconds": self.profiler.interval,
+            "samples": self.profiler.samples,
+            "failed": exc_type is not None,
+            "allocations_traced": self.trace_allocations, # If so, timings are inflated by tracemalloc
+            "peak_rss_mb": round(self.profiler.peak_rss / 2**20, 1) if self.profiler.peak_rss else None,
+            "process_peak_rss_mb": round(peak_rss_bytes() / 2**20, 1) if peak_rss_bytes() else None,
+            "functions": self.profiler.top_functions(),
+            "stacks_file": os.path.basename(self.stacks_path),
+        }
+        if self.trace_allocations:
+            _, traced_peak = tracemalloc.get_traced_memory()
+            snapshot = self.profiler.peak_snapshot or tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            summary["traced_peak_mb"] = round(traced_peak / 2**20, 1)
+            summary["top_allocations_at_peak"] = _top_allocations(snapshot)
+
+        try:
+            self.profiler.write_collapsed(self.stacks_path)
+            with open(self.summary_path, 'w') as f:
+                json.dump(summary, f, indent=4)
+            print(f"Profile written: {self.summary_path} ({self.profiler.samples} samples), stacks: {self.stacks_path}")
+        except OSError as e:
+            print(f"Warning: Could not write profile: {e}")
+        return False # Never swallow the job's exception
@@ -0,0 +1,136 @@
+import time
+
+# Progress reporting for long-running loops, throttled by wall-clock time.
+#
+# The loop calls update(current) on every item; that costs one clock read and
+# a comparison. A progress payload is published at most once per `interval`
+# seconds, however fast the loop runs, and only when progress was made since
+# the last one, so the number of updates a job store or broker sees depends on
+# the job's duration, not on its frame rate. Payloads are numbers only:
+#
+#   {"current": frames done, "total": frames or None, "rate": items/s,
+#    "eta_seconds": seconds or None, "status": fixed text}
+#
+# and clients format them (percent, "1:02:03", "8.4 fps"). The rate is an
+# exponential moving average over the publish intervals, like tqdm's smoothed
+# rate. A console line is printed every `log_interval` seconds in place of a
+# progress bar. Without a total (live streams) only the rate is reported.
+
+DEFAULT_INTERVAL_SECONDS = 2.0
+DEFAULT_LOG_INTERVAL_SECONDS = 10.0
+RATE_SMOOTHING = 0.3 # Weight of the newest interval in the moving average
+
+
+def format_seconds(seconds):
+    """'h:mm:ss', 'm:ss' or 'Ns', for console lines."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if seconds >= 60:
+        return f"{seconds // 60:d}:{seconds % 60:02d}"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """
+    Publishes throttled, numeric progress of a loop.
+
+    Args:
+        publish (callable, optional): Called with the payload dict (e.g. a Celery task's
+            update_state). None only logs to the console.
+        total (int, optional): Number of items, for the percentage and ETA.
+        initial (int, optional): Items already done (e.g. when resuming). Defaults to 0.
+        status (str, optional): Fixed status text sent with each payload.
+        interval (float, optional): Minimum seconds between payloads.
+        log_interval (float, optional): Seconds between console lines; None disables them.
+    """
+
+    def __init__(self, publish=None, total=None, initial=0, status="Processing", interval=DEFAULT_INTERVAL_SECONDS,
+                 log_interval=DEFAULT_LOG_INTERVAL_SECONDS) -> None:
+        self.publish = publish
+        self.total = total
+        self.status = status
+        self.interval = interval
+        self.log_interval = log_interval
+        self.current = initial
+        self.rate = None
+        self.published = 0
+        now = time.monotonic()
+        self._next_check = now + min(interval, log_interval or interval)
+        self._last_time = now
+        self._last_current = initial
+        self._last_publish = now
+        self._last_published_current = initial
+        self._last_log = now
+
+    def update(self, current, extra=None):
+        """
+        Records progress; publishes if the interval has passed.
+
+        Args:
+            current (int): Items done so far.
+            extra (dict or callable, optional): Extra payload keys, or a function returning
+                them, only evaluated when a payload is actually published.
+
+        Returns:
+            bool: True if a payload was published.
+        """
+        self.current = current
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._update_rate(now)
+        published = False
+        if self.publish is not None and now - self._last_publish >= self.interval \
+                and current != self._last_published_current:
+            self._send(extra)
+            self._last_publish = now
+            self._last_published_current = current
+            published = True
+        if self.log_interval is not None and now - self._last_log >= self.log_interval:
+            print(self.describe())
+            self._last_log = now
+        self._next_check = now + min(self.interval, self.log_interval or self.interval)
+        return published
+
+    def payload(self):
+        eta = None
+        if self.total and self.rate:
+            eta = round(max(self.total - self.current, 0) / self.rate, 1)
+        return {
+            "current": self.current,
+            "total": self.total,
+            "rate": round(self.rate, 2) if self.rate is not None else None,
+            "eta_seconds": eta,
+            "status": self.status,
+        }
+
+    def describe(self):
+        """One console line, e.g. 'Analyzing video: 1200/9000 (13%), 8.40 it/s, ETA 15:28'."""
+        payload = self.payload()
+        line = f"{self.status}: {self.current}"
+        if self.total:
+            line += f"/{self.total} ({self.current / self.total:.0%})"
+        if payload["rate"] is not None:
+            line += f", {payload['rate']:.2f} it/s"
+        if payload["eta_seconds"] is not None:
+            line += f", ETA {format_seconds(payload['eta_seconds'])}"
+        return line
+
+    def _update_rate(self, now):
+        elapsed = now - self._last_time
+        if elapsed <= 0:
+            return
+        instant = (self.current - self._last_current) / elapsed
+        self.rate = instant if self.rate is None else RATE_SMOOTHING * instant + (1 - RATE_SMOOTHING) * self.rate
+        self._last_time = now
+        self._last_current = self.current
+
+    def _send(self, extra):
+        payload = self.payload()
+        if callable(extra):
+            extra = extra()
+        if extra:
+            payload.update(extra)
+        self.publish(payload)
+        self.published += 1
@@ -0,0 +1,84 @@
+import os
+
+# CPU sizing for worker processes. Torch, OpenCV, OpenMP/BLAS (numpy, sklearn
+# KMeans in the team assigner) and onnxruntime (rembg) each size their thread
+# pool to every core by default, so N worker processes on one machine would run
+# N x (several pools x cores) threads. apply_thread_budget gives every pool of a
+# process the same share of the cores instead; Celery workers apply it at process
+# start (celery_worker.py), the batch CLI and the in-job inference pool per process.
+
+# Read by OpenMP/BLAS runtimes when they start. rembg's new_session() sizes its
+# onnxruntime session from OMP_NUM_THREADS too (it takes no session options).
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Layout applied in this process, see apply_thread_budget
+_thread_layout = None
+
+
+def available_cores():
+    # Respect CPU affinity / container limits where the platform exposes them
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def split_cores(processes, cores=None):
+    """Threads per process so `processes` processes together use about `cores` cores (at least 1 each)."""
+    cores = cores or available_cores()
+    return max(1, cores // max(processes, 1))
+
+
+def apply_thread_budget(threads, label="process"):
+    """
+    Limits every thread pool of this process to `threads` threads and logs the layout.
+
+    Env vars cover pools that start later (and child processes); already-running
+    OpenMP/BLAS pools are limited through threadpoolctl (installed with scikit-learn).
+
+    Returns:
+        dict: The effective layout (also available from thread_layout()).
+    """
+    global _thread_layout
+    threads = max(int(threads), 1)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    layout = {"label": label, "pid": os.getpid(), "cores": available_cores(), "threads": threads}
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            # Inter-op parallelism only helps models with parallel branches; keep it small
+            torch.set_num_interop_threads(min(threads, 2))
+        except RuntimeError:
+            pass # Can only be set before the first inter-op parallel work
+        layout["torch_intra_op"] = torch.get_num_threads()
+        layout["torch_inter_op"] = torch.get_num_interop_threads()
+    except ImportError:
+        pass
+
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+        layout["opencv"] = cv2.getNumThreads()
+    except ImportError:
+        pass
+
+    try:
+        from threadpoolctl import threadpool_limits, threadpool_info
+        threadpool_limits(limits=threads)
+        layout["native_pools"] = sorted({f"{pool['internal_api']}={pool['num_threads']}" for pool in threadpool_info()})
+    except ImportError:
+        pass
+
+    _thread_layout = layout
+    print(f"Thread budget ({label}, pid {layout['pid']}): {threads} of {layout['cores']} cores; "
+          + ", ".join(f"{key}={value}" for key, value in layout.items() if key not in ("label", "pid", "cores", "threads")))
+    return layout
+
+
+def thread_layout():
+    """The layout applied by apply_thread_budget in this process, or None."""
+    return _thread_layout
+
@@ -0,0 +1,322 @@
+"""
+Live analysis of a camera feed (RTSP/HTTP), a growing file or a looping local file.
+
+Usage:
+    python -m processing.stream_analyzer <source> --output-dir results/live [--loop] [--follow]
+
+A reader thread keeps only the newest frame, so when inference is slower than the
+feed the frames in between are dropped instead of building up latency. The output
+is written as short video segments plus a stats snapshot JSON that is rewritten
+every few seconds with possession, drop rate and end-to-end latency.
+"""
+import argparse
+import collections
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from .config import MODEL_CLASSES
+from .detector import YoloDetector
+from .frame_analyzer import FrameAnalyzer
+from .instrumentation import WorkerMetrics
+from .progress import ProgressReporter
+from .utils import create_video_writer
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'best.pt')
+# Same default as Config.METRICS_DIR, so /metrics picks live sessions up
+DEFAULT_METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'metrics'))
+
+
+def is_network_source(source):
+    return source.lower().startswith(('rtsp://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://'))
+
+
+class FrameGrabber(threading.Thread):
+    """
+    Reads frames as they arrive and keeps only the newest one.
+
+    Local files are paced at their native fps so they behave like a live feed;
+    `loop` restarts them at the end and `follow` waits for a growing file.
+    """
+
+    def __init__(self, source, loop=False, follow=False) -> None:
+        super().__init__(daemon=True)
+        self.source = source
+        self.loop = loop
+        self.follow = follow
+        self.paced = not is_network_source(source)
+        self.condition = threading.Condition()
+        self.latest = None # (sequence number, capture timestamp, frame)
+        self.frames_captured = 0
+        self.finished = False
+        self.stopped = threading.Event()
+        self.fps = 0.0
+
+    def _open(self, position=0):
+        cap = cv2.VideoCapture(self.source)
+        if cap.isOpened() and position > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        return cap
+
+    def run(self):
+        cap = self._open()
+        if not cap.isOpened():
+            print(f"Error: Cannot open stream source {self.source}")
+            self._finish()
+            return
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_interval = 1.0 / self.fps
+        position = 0 # Frames read from the current file (for follow/loop)
+        next_frame_time = time.time()
+        try:
+            while not self.stopped.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    if self.loop and self.paced:
+                        cap.release()
+                        cap = self._open()
+                        position = 0
+                        continue
+                    if self.follow and self.paced:
+                        # Growing file: wait for more data, then reopen where we stopped
+                        cap.release()
+                        time.sleep(0.5)
+                        cap = self._open(position)
+                        continue
+                    if not self.paced:
+                        # Network hiccup: reconnect instead of ending the session
+                        print("Warning: Stream read failed, reconnecting...")
+                        cap.release()
+                        time.sleep(1.0)
+                        cap = self._open()
+                        continue
+                    break
+                position += 1
+
+                if self.paced:
+                    # Emulate a live source: never deliver frames faster than real time
+                    next_frame_time += frame_interval
+                    delay = next_frame_time - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    else:
+                        next_frame_time = time.time()
+
+                with self.condition:
+                    self.frames_captured += 1
+                    self.latest = (self.frames_captured, time.time(), frame)
+                    self.condition.notify()
+        finally:
+            cap.release()
+            self._finish()
+
+    def _finish(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+
+    def next_frame(self, after_sequence, timeout=1.0):
+        """
+        Waits up to `timeout` seconds for a frame newer than `after_sequence`.
+
+        Returns None when none arrived in time or the source ended (see `finished`), so
+        the caller can check its own stop conditions before waiting again.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: (self.latest is not None and self.latest[0] > after_sequence)
+                                    or self.finished, timeout)
+            if self.latest is None or self.latest[0] <= after_sequence:
+                return None
+            return self.latest
+
+    def stop(self):
+        self.stopped.set()
+
+
+class StreamMetrics:
+    """Rolling end-to-end latency and frame drop accounting."""
+
+    def __init__(self, window=1000) -> None:
+        self.latencies = collections.deque(maxlen=window)
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.started_at = time.time()
+
+    def record(self, latency_seconds, dropped_before):
+        self.latencies.append(latency_seconds)
+        self.frames_processed += 1
+        self.frames_dropped += dropped_before
+
+    def snapshot(self):
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        seen = self.frames_processed + self.frames_dropped
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "frames_processed": self.frames_processed,
+            "frames_dropped": self.frames_dropped,
+            "drop_rate": round(self.frames_dropped / seen, 4) if seen else 0.0,
+            "processing_fps": round(self.frames_processed / elapsed, 2),
+            "latency_ms": {
+                "p50": round(float(np.percentile(latencies, 50)) * 1000, 1),
+                "p95": round(float(np.percentile(latencies, 95)) * 1000, 1),
+                "max": round(float(latencies.max()) * 1000, 1),
+            },
+            "uptime_seconds": round(elapsed, 1),
+        }
+
+
+def write_json_atomic(path, data):
+    # Readers polling the snapshot must never see a half-written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def analyze_stream(source, output_dir, model_path=DEFAULT_MODEL_PATH, detector=None, loop=False, follow=False,
+                   segment_seconds=10.0, snapshot_interval_seconds=2.0, max_duration_seconds=None, stop_event=None,
+                   on_progress=None, worker_metrics=None):
+    """
+    Analyzes a live source until it ends, `max_duration_seconds` passes or `stop_event` is set.
+
+    Args:
+        source (str): RTSP/HTTP URL or local file path.
+        output_dir (str): Folder for output segments and the stats snapshot.
+        model_path (str): Path to the YOLO model file (.pt), used if `detector` is None.
+        detector (YoloDetector, optional): An already loaded detector.
+        loop (bool): Restart a local file at its end (stand-in for a camera).
+        follow (bool): Treat a local file as growing and wait for new frames at its end.
+        segment_seconds (float): Wall-clock length of each output segment.
+        snapshot_interval_seconds (float): How often the stats snapshot is rewritten.
+        max_duration_seconds (float, optional): Stop after this many seconds.
+        stop_event (threading.Event, optional): Set it to stop the session.
+        on_progress (callable, optional): Receives throttled progress payloads (frames processed
+            and rate; a live source has no total or ETA), see processing.progress.
+        worker_metrics (WorkerMetrics, optional): Also publish drop rate and latency with every
+            snapshot, for the web app's /metrics.
+
+    Returns:
+        dict: The final stats snapshot.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    snapshot_path = os.path.join(output_dir, "live_stats.json")
+    if detector is None:
+        print("Loading YOLO model...")
+        detector = YoloDetector(model_path)
+
+    grabber = FrameGrabber(source, loop=loop, follow=follow)
+    grabber.start()
+
+    analyzer = FrameAnalyzer()
+    metrics = StreamMetrics()
+    segments = []
+    out = None
+    segment_started_at = 0.0
+    segment_path = None
+    last_snapshot_at = 0.0
+    last_sequence = 0
+    session_start = time.time()
+    progress = ProgressReporter(publish=on_progress, status="Live analysis")
+
+    def build_snapshot(final=False):
+        ball_possession_frames = analyzer.ball_possession_frames
+        total_possession = max(sum(ball_possession_frames.values()), 1)
+        return {
+            "source": source,
+            "live": not final,
+            "updated_at": time.time(),
+            "ball_possession_frames": ball_possession_frames,
+            "ball_possession_percent": {
+                "team1": round(ball_possession_frames[MODEL_CLASSES["team1"]] / total_possession * 100, 2),
+                "team2": round(ball_possession_frames[MODEL_CLASSES["team2"]] / total_possession * 100, 2)
+            },
+            "segments": [os.path.basename(path) for path in segments],
+            "metrics": metrics.snapshot(),
+        }
+
+    def close_segment():
+        nonlocal out
+        if out is not None:
+            out.release()
+            segments.append(segment_path)
+            out = None # Not again from `finally` if opening the next segment fails
+
+    print(f"--- Starting Live Analysis: {source} ---")
+    try:
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if max_duration_seconds is not None and time.time() - session_start >= max_duration_seconds:
+                break
+
+            latest = grabber.next_frame(last_sequence)
+            if latest is None:
+                if grabber.finished:
+                    break
+                continue
+            sequence, captured_at, frame = latest
+            dropped = sequence - last_sequence - 1
+            last_sequence = sequence
+
+            detections = detector.predict(frame)
+            annotated_frame = analyzer.process_frame(frame, detections)
+
+            now = time.time()
+            if out is None or now - segment_started_at >= segment_seconds:
+                close_segment()
+                # Segments play back at the rate frames were actually kept, not the source rate
+                segment_fps = metrics.snapshot()["processing_fps"] if metrics.frames_processed else grabber.fps
+                height, width = annotated_frame.shape[:2]
+                out, segment_path = create_video_writer(
+                    os.path.join(output_dir, f"live_seg{len(segments):05d}.mp4"),
+                    max(segment_fps, 1.0), (width, height))
+                segment_started_at = now
+            out.write(annotated_frame)
+            metrics.record(time.time() - captured_at, dropped)
+            progress.update(metrics.frames_processed)
+
+            if now - last_snapshot_at >= snapshot_interval_seconds:
+                snapshot = build_snapshot()
+                write_json_atomic(snapshot_path, snapshot)
+                if worker_metrics is not None:
+                    worker_metrics.stream_update(snapshot["metrics"])
+                last_snapshot_at = now
+    finally:
+        grabber.stop()
+        close_segment()
+        final_snapshot = build_snapshot(final=True)
+        write_json_atomic(snapshot_path, final_snapshot)
+        if worker_metrics is not None:
+            worker_metrics.stream_update(final_snapshot["metrics"], live=False)
+        print(f"--- Live Analysis Stopped: {metrics.frames_processed} frames, drop rate {final_snapshot['metrics']['drop_rate']:.1%} ---")
+    return final_snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a live feed, growing file or looping file.")
+    parser.add_argument("source", help="RTSP/HTTP URL or local video file")
+    parser.add_argument("--output-dir", default=os.path.join(os.environ.get('RESULT_FOLDER', 'results'), 'live'))
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Path to the YOLO model file (.pt)")
+    parser.add_argument("--loop", action="store_true", help="Loop a local file forever")
+    parser.add_argument("--follow", action="store_true", help="Wait for new frames at the end of a growing file")
+    parser.add_argument("--segment-seconds", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="Where to publish latency and drop rate for /metrics ('' to disable)")
+    args = parser.parse_args(argv)
+
+    try:
+        analyze_stream(args.source, args.output_dir, model_path=args.model, loop=args.loop, follow=args.follow,
+                       segment_seconds=args.segment_seconds, max_duration_seconds=args.duration,
+                       worker_metrics=WorkerMetrics(args.metrics_dir) if args.metrics_dir else None)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,130 @@
+import functools
+import os
+
+import numpy as np
+
+from .utils import result_sibling_path
+
+# Per-frame counters (possession, ball visibility, passes, turnovers) stored as
+# prefix sums, so the total of any counter over any frame window is
+# prefix[hi] - prefix[lo]: one subtraction per bucket, whatever the window size.
+#
+# File: <id>_timeline.npz (uncompressed) with
+#   names   str   [n_counters]
+#   prefix  int32 [n_counters, n_frames + 1]   prefix[:, 0] == 0
+#   fps     float64 scalar
+
+MAX_BUCKETS = 2000
+
+
+def timeline_path_for(stats_path):
+    """<id>_timeline.npz next to <id>_stats.json."""
+    return result_sibling_path(stats_path, "timeline", ".npz")
+
+
+def build_counters(possession_team, ball_detected, event_log=None):
+    """
+    Per-frame 0/1 counters from the FrameAnalyzer timelines and (optionally) the event log.
+
+    Args:
+        possession_team (array-like): Per frame 0 / 1 for the team credited with possession, -1 for none.
+        ball_detected (array-like): Per frame 1 if the ball was detected.
+        event_log (dict, optional): Output of events.detect_events.
+    """
+    possession_team = np.asarray(possession_team, dtype=np.int8)
+    n_frames = len(possession_team)
+    counters = {
+        "possession_team1": possession_team == 0,
+        "possession_team2": possession_team == 1,
+        "ball_detected": np.asarray(ball_detected, dtype=bool),
+    }
+    if event_log is not None:
+        columns = event_log["events"]["columns"]
+        rows = event_log["events"]["rows"]
+        kinds = np.array([row[columns.index("type")] for row in rows], dtype=object)
+        frames = np.array([row[columns.index("frame")] for row in rows], dtype=np.int64)
+        teams = np.array([row[columns.index("team")] for row in rows], dtype=np.int64)
+        for kind, name in (("pass", "passes"), ("turnover", "turnovers_won")):
+            for team in (1, 2):
+                mask = (kinds == kind) & (teams == team) & (frames < n_frames)
+                counters[f"{name}_team{team}"] = np.bincount(frames[mask], minlength=n_frames)
+    return counters
+
+
+def save_timeline(path, counters, fps):
+    names = list(counters)
+    prefix = np.zeros((len(names), len(next(iter(counters.values()))) + 1), dtype=np.int32)
+    for i, name in enumerate(names):
+        np.cumsum(counters[name], out=prefix[i, 1:])
+    tmp_path = f"{path[:-len('.npz')]}.tmp.npz"
+    np.savez(tmp_path, names=np.array(names), prefix=prefix, fps=np.float64(fps))
+    os.replace(tmp_path, path)
+    print(f"Timeline written: {path} ({len(names)} counters, {prefix.shape[1] - 1} frames)")
+    return path
+
+
+class Timeline:
+    def __init__(self, path) -> None:
+        with np.load(path) as data:
+            self.names = [str(name) for name in data["names"]]
+            self.prefix = data["prefix"]
+            self.fps = float(data["fps"])
+
+    @property
+    def frames(self):
+        return self.prefix.shape[1] - 1
+
+    @property
+    def duration_seconds(self):
+        return self.frames / self.fps if self.fps > 0 else 0.0
+
+    def query(self, from_seconds=None, to_seconds=None, bucket_seconds=None):
+        """
+        Counter totals over [from, to), either as one window or split into buckets.
+
+        Raises:
+            ValueError: For an empty/inverted window or too many buckets.
+        """
+        start = 0 if from_seconds is None else int(round(max(from_seconds, 0) * self.fps))
+        stop = self.frames if to_seconds is None else int(round(min(to_seconds * self.fps, self.frames)))
+        if stop <= start:
+            raise ValueError("Empty time window")
+        if bucket_seconds:
+            step = max(int(round(bucket_seconds * self.fps)), 1)
+            if (stop - start) / step > MAX_BUCKETS:
+                raise ValueError(f"Too many buckets (max {MAX_BUCKETS})")
+            edges = np.append(np.arange(start, stop, step), stop)
+        else:
+            edges = np.array([start, stop])
+
+        totals = self.prefix[:, edges[1:]] - self.prefix[:, edges[:-1]]
+        counts = dict(zip(self.names, totals))
+        held = counts["possession_team1"] + counts["possession_team2"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            percent = {team: np.where(held > 0, np.round(counts[f"possession_{team}"] / held * 100, 1), 0.0)
+                       for team in ("team1", "team2")}
+        return {
+            "fps": self.fps,
+            "duration_seconds": round(self.duration_seconds, 2),
+            "from": round(start / self.fps, 2),
+            "to": round(stop / self.fps, 2),
+            "bucket_seconds": bucket_seconds,
+            "bucket_starts": [round(edge / self.fps, 2) for edge in edges[:-1]],
+            "counters": {name: values.tolist() for name, values in counts.items()},
+            "possession_percent": {team: values.tolist() for team, values in percent.items()},
+        }
+
+
+@functools.lru_cache(maxsize=32)
+def _load_timeline(path, mtime):
+    return Timeline(path)
+
+
+@functools.lru_cache(maxsize=1024)
+def _cached_query(path, mtime, from_seconds, to_seconds, bucket_seconds):
+    return _load_timeline(path, mtime).query(from_seconds, to_seconds, bucket_seconds)
+
+
+def query_timeline(path, from_seconds=None, to_seconds=None, bucket_seconds=None):
+    """Cached Timeline.query; the file's mtime is part of the key so a rewritten file is never served stale."""
+    return _cached_query(path, os.path.getmtime(path), from_seconds, to_seconds, bucket_seconds)
@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from .config import MODEL_CLASSES
+
+# Per-frame, per-object tracking data for downstream analytics.
+#
+# One row per tracked player, referee, goalkeeper and ball per frame, sorted by
+# frame, stored as a plain structured .npy so it can be opened with
+# np.load(mmap_mode='r') and sliced without reading the whole match. A small
+# JSON sidecar (<name>.json) holds fps, column docs and a per-track index
+# (first/last frame) so a single track is found without scanning every row.
+# <name>.frames.npy holds per-frame row offsets (rows of frame i are
+# offsets[i]:offsets[i+1], as frame_offsets in detection_cache), so a frame or
+# time range maps to a row slice without touching the rows. (Searching the
+# "frame" field of the memmap instead would copy that strided column, i.e.
+# read every page of the file, on each lookup.)
+#
+# While the analysis runs, rows are appended to a headerless <name>.part file;
+# finalize() prepends the .npy header once the row count is known. The number
+# of rows written is stored in checkpoints, so a resumed job truncates the part
+# file back to the last checkpoint and carries on.
+
+TRACKS_FORMAT_VERSION = 2 # 2: per-frame offsets file
+
+TRACK_DTYPE = np.dtype([
+    ("frame", "<i4"),
+    ("tracker_id", "<i4"), # -1 for untracked objects (ball, referees, goalkeepers)
+    ("team", "i1"),        # 0 / 1, or -1
+    ("class_id", "u1"),    # MODEL_CLASSES id of the detected class
+    ("has_ball", "?"),
+    ("x1", "<f4"), ("y1", "<f4"), ("x2", "<f4"), ("y2", "<f4"),
+    ("confidence", "<f4"),
+])
+
+
+def object_rows(frame_index, detections, class_id, team=-1, tracked=False):
+    """TRACK_DTYPE rows for one group of detections in one frame."""
+    rows = np.zeros(len(detections), dtype=TRACK_DTYPE)
+    if len(detections) == 0:
+        return rows
+    rows["frame"] = frame_index
+    rows["tracker_id"] = detections.tracker_id if tracked and detections.tracker_id is not None else -1
+    rows["team"] = team
+    rows["class_id"] = class_id
+    rows["x1"], rows["y1"], rows["x2"], rows["y2"] = detections.xyxy.T
+    rows["confidence"] = detections.confidence if detections.confidence is not None else 1.0
+    return rows
+
+
+def meta_path(tracks_path):
+    return f"{os.path.splitext(tracks_path)[0]}.json"
+
+
+def frame_offsets_path(tracks_path):
+    return f"{os.path.splitext(tracks_path)[0]}.frames.npy"
+
+
+class TrackWriter:
+    """Appends per-frame rows to `<tracks_path>.part` and turns it into the final .npy."""
+
+    def __init__(self, tracks_path, rows_written=0) -> None:
+        self.tracks_path = tracks_path
+        self.part_path = f"{tracks_path}.part"
+        os.makedirs(os.path.dirname(os.path.abspath(tracks_path)), exist_ok=True)
+        mode = 'r+b' if rows_written and os.path.exists(self.part_path) else 'w+b'
+        self.file = open(self.part_path, mode)
+        # Drop anything written after the checkpoint we are resuming from
+        self.file.truncate(rows_written * TRACK_DTYPE.itemsize if mode == 'r+b' else 0)
+        self.file.seek(0, os.SEEK_END)
+        self.rows_written = self.file.tell() // TRACK_DTYPE.itemsize
+
+    def append(self, rows):
+        if len(rows) > 0:
+            self.file.write(rows.tobytes())
+            self.rows_written += len(rows)
+
+    def flush(self):
+        """Makes everything appended so far durable (call before saving a checkpoint)."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        """Closes the part file without finalizing (it is kept for a resumed run)."""
+        self.file.close()
+
+    def finalize(self, meta):
+        """Writes the .npy and its JSON sidecar. Returns the .npy path."""
+        self.file.close()
+        rows = np.memmap(self.part_path, dtype=TRACK_DTYPE, mode='r') if self.rows_written else np.zeros(0, TRACK_DTYPE)
+        tracks = _track_index(rows)
+        # One pass over the frame column here saves every reader from making it
+        frame_column = np.array(rows["frame"])
+        frame_count = max(meta.get("total_frames") or 0, int(frame_column[-1]) + 1 if len(frame_column) else 0)
+        offsets = np.searchsorted(frame_column, np.arange(frame_count + 1), side="left").astype(np.int64)
+        del rows, frame_column
+        np.save(frame_offsets_path(self.tracks_path), offsets)
+
+        tmp_path = f"{self.tracks_path}.tmp"
+        with open(tmp_path, 'wb') as out, open(self.part_path, 'rb') as part:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(TRACK_DTYPE),
+                "fortran_order": False,
+                "shape": (self.rows_written,),
+            })
+            shutil.copyfileobj(part, out, 1 << 20)
+        os.replace(tmp_path, self.tracks_path)
+        os.remove(self.part_path)
+
+        with open(meta_path(self.tracks_path), 'w') as f:
+            json.dump(dict(meta, version=TRACKS_FORMAT_VERSION, rows=self.rows_written,
+                           columns=list(TRACK_DTYPE.names), class_ids=MODEL_CLASSES, tracks=tracks), f)
+        print(f"Tracking data written: {self.tracks_path} ({self.rows_written} rows, {len(tracks)} tracks)")
+        return self.tracks_path
+
+
+def _track_index(rows):
+    """First/last frame and row count of every (team, tracker_id) track."""
+    tracked = rows[rows["tracker_id"] >= 0]
+    if len(tracked) == 0:
+        return []
+    # ByteTrack ids are per team tracker, so a track is identified by (team, tracker_id)
+    keys = tracked["team"].astype(np.int64) * (1 << 32) + tracked["tracker_id"]
+    _, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    _, first_reversed = np.unique(keys[::-1], return_index=True)
+    last = len(keys) - 1 - first_reversed
+    return [{"team": int(tracked["team"][f]), "tracker_id": int(tracked["tracker_id"][f]),
+             "first_frame": int(tracked["frame"][f]), "last_frame": int(tracked["frame"][l]), "rows": int(n)}
+            for f, l, n in zip(first, last, counts)]
+
+
+class TrackingData:
+    """
+    Read API for an exported tracking file. Rows are memory-mapped; each query
+    returns a (small) in-memory structured array.
+
+    Example:
+        data = TrackingData("results/<id>_tracks.npy")
+        first_minute = data.time_range(0, 60)
+        player = data.track(7, team=0)
+    """
+
+    def __init__(self, tracks_path) -> None:
+        self.rows = np.load(tracks_path, mmap_mode='r')
+        # Absent for files written before format version 2
+        self.frame_offsets = None
+        if os.path.exists(frame_offsets_path(tracks_path)):
+            self.frame_offsets = np.load(frame_offsets_path(tracks_path))
+        self.meta = {}
+        if os.path.exists(meta_path(tracks_path)):
+            with open(meta_path(tracks_path)) as f:
+                self.meta = json.load(f)
+        self.fps = self.meta.get("fps") or 0.0
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def tracks(self):
+        return self.meta.get("tracks", [])
+
+    def _frame_bounds(self, start_frame, stop_frame):
+        # Row slice from the per-frame offsets; frames past the end map to the last row
+        if self.frame_offsets is not None:
+            last = len(self.frame_offsets) - 1
+            return (int(self.frame_offsets[min(max(start_frame, 0), last)]),
+                    int(self.frame_offsets[min(max(stop_frame, 0), last)]))
+        # Older files: binary search over the frame column (which copies the whole column)
+        frames = self.rows["frame"]
+        return (int(np.searchsorted(frames, start_frame, side="left")),
+                int(np.searchsorted(frames, stop_frame, side="left")))
+
+    def frames(self, start_frame, stop_frame):
+        """All rows with start_frame <= frame < stop_frame."""
+        lo, hi = self._frame_bounds(start_frame, stop_frame)
+        return np.array(self.rows[lo:hi])
+
+    def time_range(self, start_seconds, end_seconds):
+        """All rows between two timestamps (seconds from the start of the video)."""
+        if not self.fps:
+            raise ValueError("Tracking data has no fps; use frames() instead")
+        return self.frames(int(np.floor(start_seconds * self.fps)), int(np.ceil(end_seconds * self.fps)))
+
+    def track(self, tracker_id, team=None):
+        """Rows of one tracker id (optionally of one team), in frame order."""
+        spans = [t for t in self.tracks if t["tracker_id"] == tracker_id and (team is None or t["team"] == team)]
+        if spans:
+            lo, hi = self._frame_bounds(min(t["first_frame"] for t in spans), max(t["last_frame"] for t in spans) + 1)
+        else:
+            lo, hi = (0, len(self.rows)) if not self.meta else (0, 0)
+        window = self.rows[lo:hi]
+        mask = window["tracker_id"] == tracker_id
+        if team is not None:
+            mask &= window["team"] == team
+        return np.array(window[mask])
@@ -1,6 +1,7 @@
 # This file makes the utils directory a Python package
-from .video import get_number_of_frames,get_frames
+from .video import get_number_of_frames,get_frames,get_video_properties,create_video_writer,concat_videos
 from .annotation import annotate_frames
 from .ball_to_player_assinger import assign_ball_to_player
-from .get_player_color import get_player_color
-from .graphics import draw_team_ball_control 
\ No newline at end of file
+from .get_player_color import get_player_color, player_colors
+from .graphics import draw_team_ball_control
+from .paths import result_sibling_path 
\ No newline at end of file
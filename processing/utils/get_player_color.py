@@ -1,81 +1,138 @@
-from rembg import remove
-from PIL import Image
+import cv2
 import numpy as np
-from sklearn.cluster import KMeans
-
-
-
-def get_player_color(frame,bbox):
-    # Ensure bbox coordinates are integers and valid
-    y1, x1, y2, x2 = map(int, [bbox[1], bbox[0], bbox[3], bbox[2]])
-    
-    # Check for valid bbox dimensions
-    if y1 >= y2 or x1 >= x2:
-        # Return a default color or raise an error if the bbox is invalid
-        print(f"Warning: Invalid bounding box detected: {bbox}")
-        return np.array([0, 0, 0]) # Default to black
-        
-    image_roi = frame[y1:y2, x1:x2]
-    
-    # Check if ROI is empty
-    if image_roi.size == 0:
-        print(f"Warning: Empty ROI from bounding box: {bbox}")
-        return np.array([0, 0, 0]) # Default to black
-
-    # Use rembg to remove background
-    # Note: rembg might require specific input format (PIL Image)
-    try:
-        pil_image = Image.fromarray(cv2.cvtColor(image_roi, cv2.COLOR_BGR2RGB))
-        output_image = remove(pil_image)
-        output_array = np.array(output_image)
-    except Exception as e:
-        print(f"Error during background removal with rembg: {e}")
-        # Fallback: Use original ROI if rembg fails
-        output_array = cv2.cvtColor(image_roi, cv2.COLOR_BGR2RGBA) # Need RGBA
-
-    # Check if output array is valid
-    if output_array.shape[0] == 0 or output_array.shape[1] == 0:
-         print(f"Warning: Empty image after background removal for bbox: {bbox}")
-         return np.array([0, 0, 0]) # Default to black
-
-    pixels = output_array.reshape(-1, 4) 
-    # Keep only non-transparent pixels
-    pixels = pixels[pixels[:, 3] > 10] # Use a threshold for transparency
-
-    # Check if any foreground pixels remain
+
+# Jersey colour of player boxes, for team assignment.
+#
+# "fast" (default): for all boxes of a frame at once, the torso region of each
+# box (below the head, above the shorts, away from the arms) is resized to a
+# small patch, the patches are stacked and converted to HSV in one call, and
+# grass (green, saturated) and dark pixels (shadows, hair, socks) are masked
+# out. The jersey colour is the mean BGR of what remains; the mean is taken in
+# BGR because hue wraps around at red. A green kit is mostly masked as grass,
+# so patches with too few kept pixels fall back to their plain mean.
+#
+# "kmeans": the previous per-crop method, a 2-cluster KMeans on the top half of
+# the box where the cluster that owns the corners is background.
+#
+# "rembg": neural background removal plus a 3-cluster KMeans. Highest quality
+# and by far the slowest; rembg (and its onnx model) is only imported on first
+# use, so processes that never ask for it never load it.
+
+COLOR_MODES = ("fast", "kmeans", "rembg")
+TORSO_ROWS = (0.15, 0.5) # Fraction of the box height
+TORSO_COLS = (0.25, 0.75) # Fraction of the box width
+TORSO_PATCH_SIZE = (12, 16) # (width, height) every torso is resized to
+GRASS_HUE = (35, 85) # OpenCV hue, 0-179
+GRASS_MIN_SATURATION = 40
+MIN_VALUE = 40
+MIN_KEPT_FRACTION = 0.1
+
+_rembg_session = None
+
+
+def _torso_patches(frame, bboxes):
+    height, width = frame.shape[:2]
+    patches = np.zeros((len(bboxes), TORSO_PATCH_SIZE[1], TORSO_PATCH_SIZE[0], 3), dtype=np.uint8)
+    valid = np.zeros(len(bboxes), dtype=bool)
+    for i, (x1, y1, x2, y2) in enumerate(bboxes):
+        box_width, box_height = x2 - x1, y2 - y1
+        tx1, tx2 = int(max(x1 + box_width * TORSO_COLS[0], 0)), int(min(x1 + box_width * TORSO_COLS[1], width))
+        ty1, ty2 = int(max(y1 + box_height * TORSO_ROWS[0], 0)), int(min(y1 + box_height * TORSO_ROWS[1], height))
+        if tx2 <= tx1 or ty2 <= ty1:
+            continue
+        patches[i] = cv2.resize(frame[ty1:ty2, tx1:tx2], TORSO_PATCH_SIZE, interpolation=cv2.INTER_AREA)
+        valid[i] = True
+    return patches, valid
+
+
+def _fast_colors(frame, bboxes):
+    patches, valid = _torso_patches(frame, bboxes)
+    # One HSV conversion for all patches, stacked vertically into a single image
+    hsv = cv2.cvtColor(patches.reshape(-1, TORSO_PATCH_SIZE[0], 3), cv2.COLOR_BGR2HSV).reshape(patches.shape)
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    grass = (hue >= GRASS_HUE[0]) & (hue <= GRASS_HUE[1]) & (saturation >= GRASS_MIN_SATURATION)
+    keep = ~grass & (value >= MIN_VALUE)
+    kept = keep.sum(axis=(1, 2))
+    sums = (patches * keep[..., None]).sum(axis=(1, 2), dtype=np.float64)
+    enough = kept >= MIN_KEPT_FRACTION * TORSO_PATCH_SIZE[0] * TORSO_PATCH_SIZE[1]
+    colors = np.where(enough[:, None], sums / np.maximum(kept, 1)[:, None], patches.mean(axis=(1, 2)))
+    return colors, valid
+
+
+def _kmeans_color(crop):
+    from sklearn.cluster import KMeans
+    top_half = crop[:max(crop.shape[0] // 2, 1)]
+    hsv = cv2.cvtColor(top_half, cv2.COLOR_BGR2HSV)
+    kmeans = KMeans(n_clusters=2, n_init='auto', random_state=42).fit(hsv.reshape(-1, 3))
+    if len(np.unique(kmeans.labels_)) < 2:
+        return np.mean(top_half.reshape(-1, 3), axis=0)
+    labels = kmeans.labels_.reshape(hsv.shape[:2])
+    corners = [labels[0, 0], labels[0, -1], labels[-1, 0], labels[-1, -1]]
+    player_cluster = 1 - max(set(corners), key=corners.count)
+    player_hsv = np.uint8([[np.clip(kmeans.cluster_centers_[player_cluster], 0, 255)]])
+    return cv2.cvtColor(player_hsv, cv2.COLOR_HSV2BGR)[0, 0].astype(np.float64)
+
+
+def _rembg_color(crop):
+    global _rembg_session
+    from rembg import new_session, remove
+    from sklearn.cluster import KMeans
+    if _rembg_session is None:
+        # Sized by OMP_NUM_THREADS, see processing.resources
+        _rembg_session = new_session()
+    rgba = np.array(remove(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB), session=_rembg_session))
+    pixels = rgba.reshape(-1, 4)
+    pixels = pixels[pixels[:, 3] > 10][:, :3] # Non-transparent foreground
     if len(pixels) == 0:
-        print(f"Warning: No foreground pixels found after background removal for bbox: {bbox}. Analyzing original ROI.")
-        # Fallback: Analyze the original ROI without transparency check
-        output_array = cv2.cvtColor(image_roi, cv2.COLOR_BGR2RGB)
-        pixels = output_array.reshape(-1, 3)
-        if len(pixels) == 0:
-             print(f"Error: Original ROI is also empty for bbox: {bbox}")
-             return np.array([0, 0, 0]) # Default to black
-
-    # Use KMeans for color clustering
-    n_clusters = 3  
-    # Handle case with fewer pixels than clusters
-    actual_clusters = min(n_clusters, len(pixels))
-    if actual_clusters < 1:
-        print(f"Error: No pixels to cluster for bbox: {bbox}")
-        return np.array([0, 0, 0]) # Default to black
-
-    kmeans = KMeans(n_clusters=actual_clusters, n_init=10) # Use n_init explicitly
-    try:
-        kmeans.fit(pixels[:, :3])  # Use RGB channels
-    except Exception as e:
-        print(f"Error during KMeans fitting: {e}")
-        return np.array([0, 0, 0]) # Default to black
-
-    cluster_centers = kmeans.cluster_centers_
+        pixels = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB).reshape(-1, 3)
+    kmeans = KMeans(n_clusters=min(3, len(pixels)), n_init=10).fit(pixels)
     _, counts = np.unique(kmeans.labels_, return_counts=True)
+    dominant_rgb = kmeans.cluster_centers_[np.argmax(counts)]
+    return dominant_rgb[::-1].astype(np.float64)
+
+
+def player_colors(frame, bboxes, mode="fast"):
+    """
+    Jersey colours of many player boxes of one frame.
+
+    Args:
+        frame (np.ndarray): BGR frame.
+        bboxes (array-like): (N, 4) xyxy boxes.
+        mode (str, optional): "fast", "kmeans" or "rembg" (see module comment). Defaults to "fast".
 
-    # Get the dominant color (most frequent cluster)
-    sorted_indices = np.argsort(counts)[::-1]
-    dominant_color = cluster_centers[sorted_indices[0]]
+    Returns:
+        tuple: ((N, 3) float HSV colours, (N,) bool mask of boxes that yielded a colour).
+    """
+    if mode not in COLOR_MODES:
+        raise ValueError(f"Unknown colour mode {mode!r}, expected one of {COLOR_MODES}")
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    if len(bboxes) == 0:
+        return np.empty((0, 3)), np.empty(0, dtype=bool)
+    if mode == "fast":
+        colors_bgr, valid = _fast_colors(frame, bboxes)
+    else:
+        extract = _kmeans_color if mode == "kmeans" else _rembg_color
+        colors_bgr = np.zeros((len(bboxes), 3))
+        valid = np.zeros(len(bboxes), dtype=bool)
+        for i, (x1, y1, x2, y2) in enumerate(bboxes.astype(int)):
+            crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+            if crop.size == 0:
+                continue
+            try:
+                colors_bgr[i] = extract(crop)
+                valid[i] = True
+            except ImportError:
+                raise # Missing optional dependency: not a per-box problem
+            except Exception as e:
+                print(f"Warning: {mode} colour extraction failed for bbox {bboxes[i]}: {e}")
+    colors_hsv = cv2.cvtColor(np.clip(colors_bgr, 0, 255).astype(np.uint8)[:, None, :], cv2.COLOR_BGR2HSV)[:, 0]
+    return colors_hsv.astype(np.float64), valid
 
-    # Return dominant color as BGR (OpenCV standard)
-    return dominant_color[::-1] # Convert RGB to BGR
 
-# Need cv2 for color conversion if rembg fails or for PIL conversion
-import cv2 
\ No newline at end of file
+def get_player_color(frame, bbox, mode="fast"):
+    """Jersey colour (BGR) of one player box; black if the box is empty or invalid."""
+    colors_hsv, valid = player_colors(frame, [bbox], mode=mode)
+    if not valid[0]:
+        print(f"Warning: No jersey colour for bounding box: {bbox}")
+        return np.array([0, 0, 0])
+    return cv2.cvtColor(colors_hsv.astype(np.uint8)[:, None, :], cv2.COLOR_HSV2BGR)[0, 0]
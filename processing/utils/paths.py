@@ -0,0 +1,8 @@
+import os
+
+
+def result_sibling_path(stats_path, kind, ext):
+    """Path of another per-job artifact next to the stats file: <id>_stats.json -> <id>_<kind><ext>."""
+    base = os.path.splitext(stats_path)[0]
+    base = base[:-len("_stats")] if base.endswith("_stats") else base
+    return f"{base}_{kind}{ext}"
@@ -1,3 +1,6 @@
+import os
+import shutil
+import subprocess
 import supervision as sv
 import cv2
 
@@ -12,6 +15,20 @@ def get_number_of_frames(VIDEO_SRC):
         cap.release() # Release the capture object
         return total_frames,fps
 
+# get frame count, fps and resolution without decoding any frames
+def get_video_properties(VIDEO_SRC):
+    cap = cv2.VideoCapture(VIDEO_SRC)
+    if not cap.isOpened():
+        return None
+    properties = {
+        "total_frames": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    cap.release()
+    return properties
+
 def get_frames(video_src,stride=1,start=0,end=None):
     # Using sv.process_video for potentially better memory management
     # Note: This returns a generator, which is good
@@ -21,4 +38,103 @@ def get_frames(video_src,stride=1,start=0,end=None):
     #     source_path=video_src,
     #     target_path=None, # We don't write output here
     #     callback=lambda frame, index: frame_processor(frame, index) # Define frame_processor
-    # ) 
\ No newline at end of file
+    # ) 
+
+# --- Initialize video writer with Windows-friendly codecs ---
+def create_video_writer(output_video_path, fps, frame_size):
+    """
+    Tries each codec in order until one opens. The extension of the returned
+    path may differ from `output_video_path` if only an AVI codec works.
+
+    Returns:
+        tuple: (cv2.VideoWriter, actual_output_path)
+    """
+    out = None
+    codec_attempts = [
+        ('H264', 'mp4'),  # H.264 codec with MP4 container
+        ('avc1', 'mp4'),  # Alternative name for H.264
+        ('mp4v', 'mp4'),  # MPEG-4 codec
+        ('DIVX', 'avi'),  # DIVX codec with AVI container
+        ('XVID', 'avi')   # XVID codec with AVI container
+    ]
+
+    # Try each codec in order until one works
+    for codec, extension in codec_attempts:
+        try:
+            print(f"Trying codec: {codec}")
+            codec_path = output_video_path
+            if not codec_path.lower().endswith(f".{extension}"):
+                codec_path = f"{os.path.splitext(output_video_path)[0]}.{extension}"
+
+            fourcc = cv2.VideoWriter_fourcc(*codec)
+            test_out = cv2.VideoWriter(codec_path, fourcc, fps, frame_size)
+
+            if test_out.isOpened():
+                out = test_out
+                output_video_path = codec_path
+                print(f"Successfully initialized VideoWriter with {codec} codec")
+                break
+            else:
+                test_out.release()
+        except Exception as e:
+            print(f"Failed to initialize with {codec} codec: {e}")
+
+    if out is None or not out.isOpened():
+        # Last resort - try Microsoft Video 1 codec which is very widely supported
+        try:
+            print("Trying Microsoft Video 1 codec as last resort")
+            codec_path = f"{os.path.splitext(output_video_path)[0]}.avi"
+            fourcc = cv2.VideoWriter_fourcc('M', 'S', 'V', 'C')
+            out = cv2.VideoWriter(codec_path, fourcc, fps, frame_size)
+            output_video_path = codec_path
+        except Exception as e:
+            print(f"Failed to initialize MSVC codec: {e}")
+            raise IOError(f"Failed to initialize any video writer. OpenCV may not have codec support on this system.")
+
+    if not out.isOpened():
+        raise IOError(f"Failed to open video writer for path: {output_video_path}")
+
+    return out, output_video_path
+
+
+# join finished video segments into one file
+def concat_videos(segment_paths, output_video_path, fps, frame_size):
+    """
+    Concatenates segments with ffmpeg stream copy when available (no re-encode),
+    otherwise re-encodes them with OpenCV.
+
+    Returns:
+        str: The actual output path (extension may differ, see create_video_writer).
+    """
+    if len(segment_paths) == 1:
+        output_video_path = f"{os.path.splitext(output_video_path)[0]}{os.path.splitext(segment_paths[0])[1]}"
+        os.replace(segment_paths[0], output_video_path)
+        return output_video_path
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        output_video_path = f"{os.path.splitext(output_video_path)[0]}{os.path.splitext(segment_paths[0])[1]}"
+        list_path = f"{output_video_path}.segments.txt"
+        with open(list_path, 'w') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        try:
+            subprocess.run(
+                [ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                 '-i', list_path, '-c', 'copy', output_video_path],
+                check=True
+            )
+            return output_video_path
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg concat failed ({e}), falling back to OpenCV re-encode")
+        finally:
+            os.remove(list_path)
+
+    out, output_video_path = create_video_writer(output_video_path, fps, frame_size)
+    try:
+        for path in segment_paths:
+            for frame in get_frames(path):
+                out.write(frame)
+    finally:
+        out.release()
+    return output_video_path
@@ -1,20 +1,43 @@
+import functools
+import multiprocessing
 import time
 import json
 import os
-import cv2
-import numpy as np
-import supervision as sv
-from ultralytics import YOLO
-from tqdm import tqdm
 import torch
 
 # Use relative imports for local modules within the 'processing' package
-from .utils import get_number_of_frames, get_frames, annotate_frames, assign_ball_to_player, get_player_color
-from .team_assigner import Assigner
+from .utils import get_number_of_frames, get_frames, create_video_writer, concat_videos
 from .config import MODEL_CLASSES # Assuming MODEL_CLASSES is defined here
+from .detector import YoloDetector, get_device, DEFAULT_CONFIDENCE
+from .detection_cache import cache_path, CachedDetector, DetectionRecorder
+from .frame_analyzer import FrameAnalyzer
+from .ball_tracker import BallTracker
+from .tracking_export import TrackWriter, TrackingData
+from .kinematics import compute_kinematics
+from .events import detect_events, events_path_for, write_event_log
+from .timeline import build_counters, save_timeline, timeline_path_for
+from .hls import HlsWriter, PLAYLIST_NAME
+from .parallel_inference import ParallelInference
+from .preview import quick_preview, refine_estimate, write_preliminary_stats
+from .frame_dedup import DuplicateFrameDetector
+from .governor import LatencyGovernor
+from .instrumentation import StageTimer, peak_rss_bytes
+from .progress import DEFAULT_INTERVAL_SECONDS as DEFAULT_PROGRESS_INTERVAL_SECONDS, ProgressReporter
+from .checkpoint import (DEFAULT_CHECKPOINT_INTERVAL_SECONDS, input_signature, load_checkpoint,
+                         save_checkpoint, remove_checkpoint)
+
+# Minimum wall-clock seconds between rewrites of the preliminary stats JSON
+PRELIMINARY_STATS_INTERVAL_SECONDS = 10
+
 
 # Define the main analysis function
-def analyze_video(input_path: str, output_video_path: str, output_stats_path: str, model_path: str, task=None):
+def analyze_video(input_path: str, output_video_path: str, output_stats_path: str, model_path: str, task=None, detector=None,
+                  checkpoint_path: str = None, checkpoint_interval_seconds: float = DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+                  target_fps: float = None, deadline_seconds: float = None, show_heatmap: bool = False,
+                  detection_cache_dir: str = None, ball_search: bool = True, output_tracks_path: str = None,
+                  hls_dir: str = None, inference_workers: int = 1, preview_samples: int = 0,
+                  skip_duplicate_frames: bool = False,
+                  progress_interval_seconds: float = DEFAULT_PROGRESS_INTERVAL_SECONDS):
     """
     Processes the input video using YOLO, ByteTrack, team assignment, and generates
     an annotated video and a statistics JSON file.
@@ -25,6 +48,45 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
         output_stats_path (str): Path where the statistics JSON should be saved.
         model_path (str): Path to the YOLO model file (.pt).
         task (celery.Task, optional): The Celery task instance for progress updates. Defaults to None.
+        detector (YoloDetector, optional): An already loaded detector to reuse across videos.
+            If None, the model at `model_path` is loaded for this call. Defaults to None.
+        checkpoint_path (str, optional): Where to periodically save resumable state. If a
+            matching checkpoint already exists there, processing resumes from it. Defaults to None.
+        checkpoint_interval_seconds (float, optional): Wall-clock seconds between checkpoints.
+        target_fps (float, optional): Processing rate to hold. Enables the LatencyGovernor, which
+            lowers inference size, detection rate, team re-checks and annotation as needed.
+        deadline_seconds (float, optional): Finish within this many seconds (also enables the governor).
+        show_heatmap (bool, optional): Overlay a player position heatmap. Defaults to False.
+        detection_cache_dir (str, optional): Folder of detection caches (model output plus ball search
+            hits) keyed by video, model and confidence. A matching cache is replayed instead of running
+            the model; otherwise one is written for the next run. Defaults to None (no cache).
+        ball_search (bool, optional): When the ball is missed, search a high-resolution crop around
+            its predicted position (and tiles of the whole frame once it has been lost for a while).
+            Ignored when replaying a detection cache. Defaults to True.
+        output_tracks_path (str, optional): Where to export per-frame, per-object tracking data
+            (.npy plus a .json sidecar, see processing.tracking_export). Also enables the per-player
+            distance/speed/sprint stats (processing.kinematics) and the possession event log
+            (processing.events, <id>_events.json next to the stats). Defaults to None (no export).
+        hls_dir (str, optional): Also stream the annotated output as HLS (fMP4 segments + playlist.m3u8)
+            into this folder while processing, so it can be watched before the job ends. Progress
+            updates carry the playlist path once the first segment exists. Requires ffmpeg.
+            Defaults to None (MP4 only).
+        inference_workers (int, optional): Run decoding plus this many YOLO inference processes
+            over shared memory (processing.parallel_inference) while this process does tracking,
+            possession and encoding. For many-core CPU machines; ignored on GPU, with the governor,
+            when replaying a detection cache, or inside a daemonic process. Defaults to 1 (in-process).
+        preview_samples (int, optional): Before the full pass, estimate possession (with a 95%
+            confidence interval) from this many frames spread over the video, and write it as a
+            preliminary stats JSON. The estimate is refined with the exact counts as the full pass
+            advances (progress updates carry it under 'estimate'). See processing.preview.
+            Defaults to 0 (no preview).
+        skip_duplicate_frames (bool, optional): Detect exact or near-duplicate frames (frame-doubled
+            exports, repeated frames in screen recordings) with a thumbnail fingerprint and reuse the
+            previous detections, team assignment and annotated output for them; tracking and
+            possession still advance every frame. Near-static play can pass for a repeat, so this is
+            for sources known to repeat frames. Defaults to False.
+        progress_interval_seconds (float, optional): Minimum wall-clock seconds between progress
+            updates sent to `task` (numeric frames, total, rate and eta_seconds; see processing.progress).
 
     Returns:
         dict: A dictionary containing relative paths to the results.
@@ -42,25 +104,42 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
     print(f"Output stats: {output_stats_path}")
     print(f"Using model: {model_path}")
     
-    # Check for GPU availability
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    if device.type == 'cuda':
-        gpu_name = torch.cuda.get_device_name(0)
-        print(f"GPU detected: {gpu_name}")
-        print(f"Using GPU acceleration for video processing")
-    else:
-        print("No GPU detected. Using CPU for processing (this will be slower)")
-    
     # --- Input Validation ---
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"Input video not found: {input_path}")
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model file not found: {model_path}")
-    
+
+    # --- Detection cache: replay stored detections instead of running the model ---
+    detection_cache_file = None
+    if detection_cache_dir:
+        cache_model_path = getattr(detector, "model_path", None) or model_path
+        if os.path.exists(cache_model_path):
+            conf = detector.conf if detector is not None else DEFAULT_CONFIDENCE
+            detection_cache_file = cache_path(detection_cache_dir, input_path, cache_model_path, conf)
+            if os.path.exists(detection_cache_file):
+                print(f"Replaying detections from cache: {detection_cache_file}")
+                detector = CachedDetector(detection_cache_file)
+
     # --- Initialization ---
-    print("Loading YOLO model...")
-    # Initialize model with GPU support if available, force device selection
-    model = YOLO(model_path).to(device)
+    model_load_seconds = 0.0
+    if detector is None:
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model file not found: {model_path}")
+
+        # Check for GPU availability
+        device = get_device()
+        if device.type == 'cuda':
+            gpu_name = torch.cuda.get_device_name(0)
+            print(f"GPU detected: {gpu_name}")
+            print(f"Using GPU acceleration for video processing")
+        else:
+            print("No GPU detected. Using CPU for processing (this will be slower)")
+
+        print("Loading YOLO model...")
+        # Initialize model with GPU support if available, force device selection
+        load_start = time.perf_counter()
+        detector = YoloDetector(model_path, device=device)
+        model_load_seconds = time.perf_counter() - load_start
+        print(f"Model loaded in {model_load_seconds:.2f}s")
     
     print("Getting video info...")
     total_frames, fps = get_number_of_frames(input_path)
@@ -81,256 +160,269 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
     original_height, original_width, _ = first_frame.shape
     print(f"Video dimensions: {original_width}x{original_height}")
 
+    # --- Resume from checkpoint if one exists ---
+    signature = input_signature(input_path, model_path) if checkpoint_path else None
+    checkpoint = load_checkpoint(checkpoint_path, signature) if checkpoint_path else None
+    if checkpoint is not None:
+        analyzer = checkpoint["analyzer"]
+        start_frame = checkpoint["frame_index"]
+        segments = checkpoint["segments"]
+        previous_processing_time = checkpoint["processing_time_seconds"]
+        governor = checkpoint.get("governor")
+        ball_tracker = checkpoint.get("ball_tracker", BallTracker() if ball_search else None)
+        print(f"Resuming from checkpoint at frame {start_frame} ({len(segments)} segment(s) already written)")
+        frame_generator = get_frames(input_path, start=start_frame)
+        if isinstance(detector, CachedDetector):
+            detector.seek(start_frame)
+    else:
+        analyzer = FrameAnalyzer()
+        start_frame = 0
+        segments = []
+        previous_processing_time = 0.0
+        governor = None
+        ball_tracker = BallTracker() if ball_search else None
+        analyzer.show_heatmap = show_heatmap
+        if target_fps is not None or deadline_seconds is not None:
+            governor = LatencyGovernor(target_fps=target_fps, deadline_seconds=deadline_seconds,
+                                       total_frames=total_frames, show_heatmap=show_heatmap)
+
+    if not getattr(detector, "supports_crops", True):
+        ball_tracker = None
+
+    # --- Optional in-job inference pool ---
+    parallel = None
+    if inference_workers > 1:
+        if not isinstance(detector, YoloDetector) or str(detector.device) != 'cpu':
+            print("Parallel inference skipped: only used for YOLO inference on CPU")
+        elif governor is not None:
+            print("Parallel inference skipped: the governor adapts inference frame by frame")
+        elif multiprocessing.current_process().daemon:
+            print("Parallel inference skipped: daemonic processes (e.g. Celery prefork children) can't start processes")
+        else:
+            parallel = ParallelInference(input_path, first_frame.shape,
+                                         functools.partial(YoloDetector, detector.model_path, device='cpu', conf=detector.conf),
+                                         inference_workers, start_frame=start_frame)
+
     # --- Create output directory ---
     output_dir = os.path.dirname(output_video_path)
     os.makedirs(output_dir, exist_ok=True) # Ensure output directory exists
-    
-    # --- Initialize video writer with Windows-friendly codecs ---
-    out = None
-    codec_attempts = [
-        ('H264', 'mp4'),  # H.264 codec with MP4 container
-        ('avc1', 'mp4'),  # Alternative name for H.264
-        ('mp4v', 'mp4'),  # MPEG-4 codec
-        ('DIVX', 'avi'),  # DIVX codec with AVI container
-        ('XVID', 'avi')   # XVID codec with AVI container
-    ]
-    
-    # Try each codec in order until one works
-    for codec, extension in codec_attempts:
-        try:
-            print(f"Trying codec: {codec}")
-            codec_path = output_video_path
-            if not codec_path.lower().endswith(f".{extension}"):
-                codec_path = f"{os.path.splitext(output_video_path)[0]}.{extension}"
-            
-            fourcc = cv2.VideoWriter_fourcc(*codec)
-            test_out = cv2.VideoWriter(codec_path, fourcc, fps, (original_width, original_height))
-            
-            if test_out.isOpened():
-                out = test_out
-                output_video_path = codec_path
-                print(f"Successfully initialized VideoWriter with {codec} codec")
-                break
-            else:
-                test_out.release()
-        except Exception as e:
-            print(f"Failed to initialize with {codec} codec: {e}")
-    
-    if out is None or not out.isOpened():
-        # Last resort - try Microsoft Video 1 codec which is very widely supported
+
+    # --- Quick preview: possession estimate from a sparse frame sample, before the full pass ---
+    preview = checkpoint.get("preview") if checkpoint is not None else None
+    if preview is None and preview_samples > 0:
+        if isinstance(detector, CachedDetector):
+            print("Quick preview skipped: cached detections can only be replayed in order")
+        else:
+            preview_start = time.perf_counter()
+            preview = quick_preview(input_path, detector, total_frames, preview_samples)
+            print(f"Quick preview from {preview['samples']} frames in {time.perf_counter() - preview_start:.2f}s: "
+                  f"{preview['estimate']}")
+            write_preliminary_stats(output_stats_path, os.path.basename(input_path), fps, total_frames, 0,
+                                    preview["estimate"], phase="preview")
+            if task is not None:
+                task.update_state(state='PROGRESS', meta={
+                    'current': start_frame, 'total': total_frames,
+                    'status': 'Preview ready, refining...', 'estimate': preview["estimate"]})
+    last_preliminary_write = time.time()
+
+    # With checkpointing the output is written as segments that are closed at every
+    # checkpoint, so everything a checkpoint refers to is already safely on disk.
+    frame_size = (original_width, original_height)
+    output_base, output_ext = os.path.splitext(output_video_path)
+
+    def open_writer():
+        if checkpoint_path:
+            return create_video_writer(f"{output_base}.part{len(segments):03d}{output_ext}", fps, frame_size)
+        return create_video_writer(output_video_path, fps, frame_size)
+
+    out, current_output_path = open_writer()
+    frames_in_segment = 0
+    last_detections = None
+    last_annotated = None
+    dedup = DuplicateFrameDetector() if skip_duplicate_frames else None
+    hls_writer = None
+    # Finished HLS runs at the last checkpoint (see processing.hls)
+    hls_runs = checkpoint.get("hls_runs", 0) if checkpoint is not None else 0
+    if hls_dir:
         try:
-            print("Trying Microsoft Video 1 codec as last resort")
-            codec_path = f"{os.path.splitext(output_video_path)[0]}.avi"
-            fourcc = cv2.VideoWriter_fourcc('M', 'S', 'V', 'C')
-            out = cv2.VideoWriter(codec_path, fourcc, fps, (original_width, original_height))
-            output_video_path = codec_path
-        except Exception as e:
-            print(f"Failed to initialize MSVC codec: {e}")
-            raise IOError(f"Failed to initialize any video writer. OpenCV may not have codec support on this system.")
-    
-    if not out.isOpened():
-        raise IOError(f"Failed to open video writer for path: {output_video_path}")
-
-    # Initialize tracker and team assigner
-    tracker_team1 = sv.ByteTrack()
-    tracker_team2 = sv.ByteTrack() # Separate tracker for each team
-    team_assigner = Assigner()
-
-    # --- State Variables ---
-    is_first_frame = True
-    kmeans_teams = None # KMeans model for team assignment
-    team_colors = {} # Store average team colors (used by Assigner)
-    ball_possession_frames = {MODEL_CLASSES["team1"]: 0, MODEL_CLASSES["team2"]: 0} # Frame counts
-    last_player_with_ball_team = None
-    total_frames_processed = 0
-    # Define progress update frequency (update roughly every second of video)
-    update_interval_frames = max(1, int(fps)) if fps > 0 else 1
+            hls_writer = HlsWriter(hls_dir, fps, frame_size, first_run=hls_runs)
+        except IOError as e:
+            print(f"Warning: HLS output disabled: {e}")
+    track_writer = None
+    if output_tracks_path:
+        expected_rows = checkpoint.get("track_rows", 0) if checkpoint is not None else 0
+        track_writer = TrackWriter(output_tracks_path, rows_written=expected_rows)
+        if track_writer.rows_written != expected_rows:
+            print(f"Warning: Tracking data before frame {start_frame} is missing; the export will be incomplete.")
+    timer = StageTimer()
+    # Only a complete, full-quality pass is worth caching (no resume, no governor)
+    recorder = None
+    if detection_cache_file and not isinstance(detector, CachedDetector) and start_frame == 0 and governor is None:
+        recorder = DetectionRecorder()
+    last_checkpoint_time = time.time()
+
+    # --- Progress: at most one update per interval, whatever the processing rate ---
+    progress = ProgressReporter(
+        publish=(lambda meta: task.update_state(state='PROGRESS', meta=meta)) if task is not None else None,
+        total=total_frames, initial=start_frame, status="Analyzing video", interval=progress_interval_seconds)
+
+    def current_estimate():
+        # Preview estimate refined with the exact counts so far
+        return refine_estimate(preview, total_frames, total_frames_processed,
+                               analyzer.ball_possession_frames[MODEL_CLASSES["team1"]],
+                               analyzer.ball_possession_frames[MODEL_CLASSES["team2"]])
+
+    def progress_extra():
+        # Only evaluated when an update is actually sent
+        extra = {}
+        if preview is not None:
+            extra['estimate'] = current_estimate()
+        if hls_writer is not None and hls_writer.has_segments():
+            extra['hls_playlist'] = os.path.join(os.path.basename(hls_dir), PLAYLIST_NAME)
+        return extra
 
     # --- Processing Loop ---
     print("Starting frame processing loop...")
     try:
-        # Create tqdm progress bar and capture it to extract ETA info later
-        progress_bar = tqdm(frame_generator, total=total_frames, desc="Analyzing video")
-        
-        for frame in progress_bar:
-            total_frames_processed += 1
-            
+        # (frame, detections) pairs from the inference pool, or (frame, None) to run the detector here
+        frame_source = parallel if parallel is not None else ((frame, None) for frame in frame_generator)
+        # Decode time = gap between the end of one iteration and the start of the next
+        iteration_end = time.perf_counter()
+        for frame, pooled_detections in frame_source:
+            timer.add("decode", time.perf_counter() - iteration_end)
+
+            # 0. Apply the governor's current quality knobs
+            run_detection = True
+            imgsz = None
+            if governor is not None:
+                knobs = governor.knobs
+                analyzer.team_recheck_interval = knobs["team_recheck_interval"]
+                analyzer.annotate = knobs["annotate"]
+                analyzer.show_heatmap = knobs["show_heatmap"]
+                imgsz = knobs["imgsz"]
+                run_detection = last_detections is None or analyzer.frames_processed % knobs["detection_stride"] == 0
+
+            # 0b. Repeated frame: everything derived from the pixels can be reused
+            duplicate = False
+            if dedup is not None:
+                stage_start = time.perf_counter()
+                duplicate = dedup.check(frame) and last_annotated is not None
+                timer.add("dedup", time.perf_counter() - stage_start)
+
             # 1. Object Detection - use GPU acceleration with device parameter
-            result = model.predict(frame, conf=0.3, verbose=False, device=device)[0]
-            detections = sv.Detections.from_ultralytics(result)
-            
-            # Separate detections by initial class (Player, Ball, Referee, Goalkeeper)
-            # Use .get() with default 0 to handle cases where a class might not be in MODEL_CLASSES
-            ball_detections = detections[detections.class_id == MODEL_CLASSES.get("ball", -1)]
-            players_detections = detections[detections.class_id == MODEL_CLASSES.get("player", -1)]
-            referee_detections = detections[detections.class_id == MODEL_CLASSES.get("referee", -1)]
-            # Initial goalkeeper detections (if model distinguishes them)
-            goalkeepers_detections = detections[detections.class_id == MODEL_CLASSES.get("goalkepper", -1)] # Watch for typo
-
-            # Apply NMS specifically to players to avoid overlapping boxes
-            players_detections = players_detections.with_nms(threshold=0.5)
-
-            # 2. Team Assignment (on first frame or if needed)
-            if is_first_frame and len(players_detections) > 0:
-                print("Assigning team colors...")
-                kmeans_teams = team_assigner.assign_team_color(frame, players_detections)
-                if kmeans_teams is None:
-                     print("Warning: Failed to assign team colors, proceeding with defaults.")
-                     # Handle case where assigner failed (e.g., assign fixed default teams)
-                else:
-                    team_colors = team_assigner.team_colors # Assigner stores colors internally
-                    print(f"Team colors assigned (HSV): {team_colors}")
-                is_first_frame = False
-            elif is_first_frame and len(players_detections) == 0:
-                print("Warning: No players detected in the first frame to assign teams.")
-                is_first_frame = False # Avoid infinite loop if first frame has no players
-
-            # 3. Assign Team ID to each player detection
-            team1_indices = []
-            team2_indices = []
-            gk_indices = [] # Indices of players re-classified as goalkeepers
-
-            if kmeans_teams is not None and len(players_detections) > 0:
-                for i, bbox in enumerate(players_detections.xyxy):
-                    team_id = team_assigner.get_player_team(frame, bbox, kmeans_teams)
-                    
-                    if team_id == 0:
-                        team1_indices.append(i)
-                    elif team_id == 1:
-                        team2_indices.append(i)
-            
-            # Create Detections objects for each team
-            team1_detections = players_detections[team1_indices]
-            team2_detections = players_detections[team2_indices]
-            # Combine explicitly detected GKs with re-classified players
-            gk_players = players_detections[gk_indices]
-            all_goalkeepers = sv.Detections.merge([goalkeepers_detections, gk_players])
-            
-            # 4. Update Trackers
-            team1_detections_tracked = tracker_team1.update_with_detections(detections=team1_detections)
-            team2_detections_tracked = tracker_team2.update_with_detections(detections=team2_detections)
-            
-            # 5. Ball Possession
-            active_player_detection = sv.Detections.empty()
-            
-            # --- Safely merge tracked detections --- 
-            detections_to_merge = []
-            if len(team1_detections_tracked) > 0:
-                detections_to_merge.append(team1_detections_tracked)
-            if len(team2_detections_tracked) > 0:
-                detections_to_merge.append(team2_detections_tracked)
-
-            if not detections_to_merge: # If both were empty
-                all_tracked_players = sv.Detections.empty()
-            elif len(detections_to_merge) == 1: # If only one had detections
-                all_tracked_players = detections_to_merge[0]
-            else: # If both had detections, merge them
-                try:
-                    all_tracked_players = sv.Detections.merge(detections_to_merge)
-                except ValueError as merge_error:
-                    print(f"Warning: Error merging detections: {merge_error}. Skipping ball assignment for this frame.")
-                    all_tracked_players = sv.Detections.empty() # Fallback to empty
-            # --- End of safe merge --- 
-                    
-            # Use combined tracked teams for ball assignment check
-            player_idx_with_ball = assign_ball_to_player(all_tracked_players, ball_detections.xyxy)
-            
-            current_player_team = None
-            if player_idx_with_ball != -1 and len(all_tracked_players) > player_idx_with_ball:
-                # Determine the team of the player with the ball based on tracker ID
-                player_tracker_id = all_tracked_players.tracker_id[player_idx_with_ball]
-                # Check which original tracked list contained this ID
-                if player_tracker_id in team1_detections_tracked.tracker_id:
-                    current_player_team = MODEL_CLASSES["team1"]
-                elif player_tracker_id in team2_detections_tracked.tracker_id:
-                    current_player_team = MODEL_CLASSES["team2"]
-                
-                if current_player_team is not None:
-                    ball_possession_frames[current_player_team] += 1
-                    last_player_with_ball_team = current_player_team
-                    # Create detection for annotating the active player
-                    active_player_detection = all_tracked_players[player_idx_with_ball]
-                    # Pad the box for better visibility
-                    active_player_detection.xyxy = sv.pad_boxes(xyxy=active_player_detection.xyxy, px=10)
-            elif last_player_with_ball_team is not None:
-                # If ball is not near anyone, assign possession to last team known to have it
-                ball_possession_frames[last_player_with_ball_team] += 1
-
-            # Pad ball box
-            if len(ball_detections.xyxy) > 0:
-                 ball_detections.xyxy = sv.pad_boxes(xyxy=ball_detections.xyxy, px=10)
-
-            # 6. Annotation
-            labels = {
-                "labels_team1": [f"{tracker_id}" for tracker_id in team1_detections_tracked.tracker_id],
-                "labels_team2": [f"{tracker_id}" for tracker_id in team2_detections_tracked.tracker_id],
-                "labels_referee": ["ref"] * len(referee_detections),
-                "labels_gk": ["GK"] * len(all_goalkeepers)
-            }
-            
-            all_detections_for_annotation = {
-                "goalkeepers": all_goalkeepers,
-                "ball": ball_detections,
-                # Pass tracked teams for consistent ID labeling
-                "team1": team1_detections_tracked, 
-                "team2": team2_detections_tracked, 
-                "referee": referee_detections,
-                "active_player": active_player_detection
-            }
-
-            annotated_frame = annotate_frames(
-                frame, 
-                all_detections_for_annotation, 
-                labels, 
-                ball_possession_frames, # Pass frame counts
-                show_heatmap=False # Heatmap disabled by default
-            )
+            stage_start = time.perf_counter()
+            if duplicate:
+                if isinstance(detector, CachedDetector):
+                    detector.predict(frame) # Keep the replay in step with the frames
+                detections = last_detections
+                if recorder is not None:
+                    recorder.append(detections)
+                timer.add("inference", time.perf_counter() - stage_start)
+            elif run_detection:
+                detections = pooled_detections if pooled_detections is not None else detector.predict(frame, imgsz=imgsz)
+                timer.add("inference", time.perf_counter() - stage_start)
+
+                # 1b. Ball missed: look again in a magnified crop around where it should be
+                if ball_tracker is not None:
+                    stage_start = time.perf_counter()
+                    detections = ball_tracker.update(frame, detections, detector, analyzer.frames_processed)
+                    timer.add("ball_search", time.perf_counter() - stage_start)
+                if recorder is not None:
+                    recorder.append(detections)
+            else:
+                if isinstance(detector, CachedDetector):
+                    detector.predict(frame) # Keep the replay in step with the frames
+                detections = last_detections # Strided: reuse the last detections
+                timer.add("inference", time.perf_counter() - stage_start)
+            last_detections = detections
+
+            # 2-6. Team assignment, tracking, possession and annotation
+            annotated_frame = analyzer.process_frame(frame, detections, duplicate=duplicate)
+            if duplicate:
+                annotated_frame = last_annotated
+            elif dedup is not None:
+                # Without annotation the overlay is drawn on the frame itself, which may be reused memory
+                last_annotated = annotated_frame.copy() if annotated_frame is frame else annotated_frame
+            total_frames_processed = analyzer.frames_processed
+            timer.add_all(analyzer.last_timings)
+            if track_writer is not None:
+                track_writer.append(analyzer.last_objects)
+
+            # A reused frame's timings say nothing about the current quality knobs
+            if governor is not None and not duplicate:
+                inference_seconds = timer.samples["inference"][-1]
+                if run_detection and ball_tracker is not None:
+                    inference_seconds += timer.samples["ball_search"][-1]
+                governor.record_frame(dict(analyzer.last_timings, inference=inference_seconds))
+                governor.update(total_frames_processed)
             
             # 7. Write Frame
+            stage_start = time.perf_counter()
             out.write(annotated_frame)
+            if hls_writer is not None:
+                try:
+                    hls_writer.write(annotated_frame)
+                except IOError as e:
+                    # The live preview is optional: lose it, not the job
+                    print(f"Warning: HLS output disabled: {e}")
+                    hls_writer.abort()
+                    hls_writer = None
+            frames_in_segment += 1
+            timer.add("encode", time.perf_counter() - stage_start)
+
+            # 8. Periodic checkpoint: close the segment, persist state, start a new segment
+            if checkpoint_path and time.time() - last_checkpoint_time >= checkpoint_interval_seconds:
+                out.release()
+                segments.append(current_output_path)
+                if track_writer is not None:
+                    track_writer.flush()
+                if hls_writer is not None:
+                    # Frames up to here go into finished segments, so a resumed job never replays them
+                    try:
+                        hls_runs = hls_writer.rotate()
+                    except OSError as e:
+                        print(f"Warning: HLS output disabled: {e}")
+                        hls_writer.abort()
+                        hls_writer = None
+                save_checkpoint(checkpoint_path, {
+                    "signature": signature,
+                    "frame_index": total_frames_processed,
+                    "analyzer": analyzer,
+                    "segments": segments,
+                    "processing_time_seconds": previous_processing_time + time.time() - start_time,
+                    "governor": governor,
+                    "ball_tracker": ball_tracker,
+                    "track_rows": track_writer.rows_written if track_writer is not None else 0,
+                    "preview": preview,
+                    "hls_runs": hls_runs,
+                })
+                print(f"Checkpoint saved at frame {total_frames_processed}")
+                out, current_output_path = open_writer()
+                frames_in_segment = 0
+                last_checkpoint_time = time.time()
+
+            # 9. Rewrite the preliminary stats with the refined preview estimate
+            if preview is not None and time.time() - last_preliminary_write >= PRELIMINARY_STATS_INTERVAL_SECONDS:
+                write_preliminary_stats(output_stats_path, os.path.basename(input_path), fps, total_frames,
+                                        total_frames_processed, current_estimate(), phase="refining")
+                last_preliminary_write = time.time()
+
+            # 10. Report progress (throttled by wall-clock time, see processing.progress)
+            progress.update(total_frames_processed, extra=progress_extra)
 
-            # 8. Update Celery Task Progress with tqdm's ETA info
-            if task is not None and total_frames_processed % update_interval_frames == 0:
-                progress_percent = int((total_frames_processed / total_frames) * 100)
-                
-                # Extract ETA from tqdm format string
-                remaining_time = ""
-                if hasattr(progress_bar, "format_dict"):
-                    # Get remaining time in seconds from tqdm
-                    remaining_seconds = progress_bar.format_dict.get("remaining", 0)
-                    
-                    # Format remaining time in the same format as tqdm displays
-                    if remaining_seconds >= 3600:
-                        hours = int(remaining_seconds // 3600)
-                        minutes = int((remaining_seconds % 3600) // 60)
-                        remaining_time = f"{hours:d}:{minutes:02d}:{int(remaining_seconds % 60):02d}"
-                    elif remaining_seconds >= 60:
-                        minutes = int(remaining_seconds // 60)
-                        remaining_time = f"{minutes:d}:{int(remaining_seconds % 60):02d}"
-                    else:
-                        remaining_time = f"{remaining_seconds:.2f}s"
-                        
-                    # Calculate frames/second rate from tqdm
-                    rate = progress_bar.format_dict.get("rate", 0)
-                
-                task.update_state(
-                    state='PROGRESS',
-                    meta={
-                        'current': total_frames_processed,
-                        'total': total_frames,
-                        'status': f'Analyzing video: {progress_percent}%',
-                        'eta': remaining_time,
-                        'rate': f"{rate:.2f}it/s" if rate else ""
-                    }
-                )
+            iteration_end = time.perf_counter()
 
         # --- End of Loop --- 
         print("Finished processing frames.")
 
     except Exception as e:
         print(f"Error during frame processing loop: {e}")
-        # Clean up resources
+        # Clean up resources (segments and checkpoint are kept so a retry can resume)
         out.release()
+        if track_writer is not None:
+            track_writer.close()
+        if hls_writer is not None:
+            hls_writer.abort() # Playlist stays open; a resumed run continues from the checkpoint's runs
         raise # Re-raise the exception to signal failure
     finally:
         # Ensure video writer is always released
@@ -338,16 +430,76 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
             out.release()
             print("Video writer released.")
 
+    # --- Finalize the HLS playlist ---
+    if hls_writer is not None:
+        hls_writer.release()
+        print(f"HLS playlist finalized: {hls_writer.playlist_path}")
+
+    # --- Join output segments ---
+    if checkpoint_path:
+        if frames_in_segment > 0:
+            segments.append(current_output_path)
+        elif os.path.exists(current_output_path):
+            os.remove(current_output_path) # Empty segment opened right after the last checkpoint
+        print(f"Joining {len(segments)} output segment(s)...")
+        output_video_path = concat_videos(segments, output_video_path, fps, frame_size)
+        for path in segments:
+            if path != output_video_path and os.path.exists(path):
+                os.remove(path)
+    else:
+        output_video_path = current_output_path
+
+    # --- Persist detections (after the ball search) for cheap re-analysis ---
+    cache_written = False
+    if recorder is not None:
+        try:
+            recorder.save(detection_cache_file, {
+                "video": os.path.basename(input_path),
+                "model": getattr(detector, "model_path", model_path),
+                "conf": detector.conf,
+            })
+            cache_written = True
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not write detection cache: {e}")
+
+    # --- Export tracking data ---
+    event_log = None
+    if track_writer is not None:
+        output_tracks_path = track_writer.finalize({
+            "source_video": os.path.basename(input_path),
+            "fps": fps,
+            "total_frames": total_frames,
+            "frames": analyzer.frames_processed,
+            "frame_size": list(frame_size),
+        })
+        # Physical stats per player, computed over the whole match in one vectorized pass
+        stage_start = time.perf_counter()
+        kinematics = compute_kinematics(TrackingData(output_tracks_path).rows, fps)
+        print(f"Kinematics for {len(kinematics['players'])} players computed in {time.perf_counter() - stage_start:.2f}s")
+        # Possession spells, passes and turnovers, written as an event log next to the stats
+        event_log = detect_events(TrackingData(output_tracks_path).rows, fps, analyzer.frames_processed)
+        output_events_path = events_path_for(output_stats_path)
+        write_event_log(output_events_path, event_log)
+
+    # --- Per-frame counters with prefix sums, for time-windowed queries ---
+    output_timeline_path = save_timeline(
+        timeline_path_for(output_stats_path),
+        build_counters(analyzer.possession_timeline, analyzer.ball_timeline, event_log),
+        fps,
+    )
+
     # --- Final Statistics Calculation ---
     print("Calculating final statistics...")
+    ball_possession_frames = analyzer.ball_possession_frames
     total_possession = sum(ball_possession_frames.values())
     stats = {
         "source_video": os.path.basename(input_path),
         "model_used": os.path.basename(model_path),
         "total_frames": total_frames,
-        "frames_processed": total_frames_processed,
+        "frames_processed": analyzer.frames_processed,
         "duration_seconds": total_frames / fps if fps > 0 else 0,
-        "processing_time_seconds": time.time() - start_time,
+        "processing_time_seconds": previous_processing_time + time.time() - start_time,
+        "resumed_from_frame": start_frame,
         "ball_possession_frames": ball_possession_frames,
         "ball_possession_percent": {
             "team1": round((ball_possession_frames[MODEL_CLASSES["team1"]] / max(total_possession, 1)) * 100, 2),
@@ -357,16 +509,49 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
         "offsides_calculated": False, # Placeholder
         "total_offsides": 0 # Placeholder
     }
+    if governor is not None:
+        # Every quality trade-off made to hit the target, for auditing
+        stats["governor"] = governor.summary()
+    if track_writer is not None:
+        stats["tracks_file"] = os.path.basename(output_tracks_path)
+        stats["kinematics"] = kinematics
+        stats["events_file"] = os.path.basename(output_events_path)
+        stats["events_summary"] = event_log["summary"]
+    stats["timeline_file"] = os.path.basename(output_timeline_path)
+    if ball_tracker is not None:
+        stats["ball_search"] = ball_tracker.stats
+    if dedup is not None:
+        stats["duplicate_frames"] = dedup.stats
+    stats["progress_updates"] = progress.published
+    if preview is not None:
+        # What the preview estimated before the full pass, for comparison with the exact figures
+        stats["possession_preview"] = {"samples": preview["samples"], "estimate": preview["estimate"]}
+    if detection_cache_file:
+        stats["detection_cache"] = {
+            "file": os.path.basename(detection_cache_file),
+            "replayed": isinstance(detector, CachedDetector),
+            "written": cache_written,
+        }
+    # Per-stage timings for this run (a resumed job only reports the frames since the resume)
+    stats["stage_timings"] = timer.summary()
+    stats["model_load_seconds"] = round(model_load_seconds, 3)
+    rss = peak_rss_bytes()
+    stats["peak_rss_mb"] = round(rss / 2**20, 1) if rss is not None else None
 
     # --- Save Statistics ---
     print(f"Saving statistics to: {output_stats_path}")
     try:
-        with open(output_stats_path, 'w') as f:
+        # Atomic, since clients may be reading the preliminary stats file
+        with open(f"{output_stats_path}.tmp", 'w') as f:
             json.dump(stats, f, indent=4)
+        os.replace(f"{output_stats_path}.tmp", output_stats_path)
     except IOError as e:
         print(f"Error saving statistics file: {e}")
         # Decide if this is a critical error - maybe just log it?
 
+    # The job is complete, a retry must not resume from the old state
+    remove_checkpoint(checkpoint_path)
+
     print(f"--- Video Analysis Complete --- ")
     
     # Return relative paths for the Flask app
@@ -375,4 +560,31 @@ def analyze_video(input_path: str, output_video_path: str, output_stats_path: st
     relative_video_path = os.path.join(result_folder_name, os.path.basename(output_video_path))
     relative_stats_path = os.path.join(result_folder_name, os.path.basename(output_stats_path))
     
-    return {"video_path": relative_video_path, "stats_path": relative_stats_path}
\ No newline at end of file
+    return {
+        "video_path": relative_video_path,
+        "stats_path": relative_stats_path,
+        "tracks_path": os.path.join(result_folder_name, os.path.basename(output_tracks_path)) if track_writer else None,
+        "events_path": os.path.join(result_folder_name, os.path.basename(output_events_path)) if track_writer else None,
+        "timeline_path": os.path.join(result_folder_name, os.path.basename(output_timeline_path)),
+        "hls_playlist": os.path.join(os.path.basename(hls_dir), PLAYLIST_NAME) if hls_writer else None,
+        # Numbers for worker-level metrics
+        "frames_processed": analyzer.frames_processed - start_frame,
+        "processing_time_seconds": time.time() - start_time,
+        "model_load_seconds": model_load_seconds,
+        "stage_seconds": timer.totals(),
+    }
+
+def reanalyze_video(input_path: str, output_video_path: str, output_stats_path: str, model_path: str,
+                    detection_cache_dir: str, **kwargs):
+    """
+    Re-runs team assignment, tracking, possession and rendering from cached detections,
+    without loading or running the model.
+
+    Raises:
+        FileNotFoundError: If no detection cache exists for this video, model and confidence.
+    """
+    detection_cache_file = cache_path(detection_cache_dir, input_path, model_path, DEFAULT_CONFIDENCE)
+    if not os.path.exists(detection_cache_file):
+        raise FileNotFoundError(f"No detection cache for {input_path}: {detection_cache_file}")
+    return analyze_video(input_path, output_video_path, output_stats_path, model_path,
+                         detector=CachedDetector(detection_cache_file), **kwargs)
@@ -14,6 +14,17 @@ if [ ! -f "models/best.pt" ]; then
   echo "Model download complete!"
 fi
 
+# hls.js for the live preview, served from static/js/vendor rather than a CDN at page load.
+# Pinned to an exact release; bump HLS_JS_VERSION deliberately.
+HLS_JS_VERSION="1.5.17"
+if [ ! -f "static/js/vendor/hls-${HLS_JS_VERSION}.min.js" ]; then
+  echo "Downloading hls.js ${HLS_JS_VERSION}..."
+  mkdir -p static/js/vendor
+  curl -fL "https://cdn.jsdelivr.net/npm/hls.js@${HLS_JS_VERSION}/dist/hls.min.js" -o "static/js/vendor/hls-${HLS_JS_VERSION}.min.js.tmp" \
+    && mv "static/js/vendor/hls-${HLS_JS_VERSION}.min.js.tmp" "static/js/vendor/hls-${HLS_JS_VERSION}.min.js"
+fi
+ln -sf "hls-${HLS_JS_VERSION}.min.js" static/js/vendor/hls.min.js
+
 # Set the PORT environment variable for Render if not already set
 export PORT=${PORT:-5000}
 echo "Application will listen on port: $PORT"
@@ -12,9 +12,38 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultVideoLink = document.getElementById('result-video-link');
     const resultStatsData = document.getElementById('result-stats-data');
     const resultStatsLink = document.getElementById('result-stats-link');
+    const timelineResultDiv = document.getElementById('timeline-result');
+    const timelineBucket = document.getElementById('timeline-bucket');
+    const timelineChart = document.getElementById('timeline-chart');
+    const livePreview = document.getElementById('live-preview');
+    const livePreviewPlayer = document.getElementById('live-preview-player');
 
     let currentTaskId = null;
     let pollInterval = null;
+    let statsQueryUrl = null;
+    let livePreviewUrl = null;
+    let livePreviewHls = null;
+
+    // Models from the catalog; "Automatic" (empty) lets the worker choose
+    const modelSelect = document.getElementById('model-select');
+    fetch('/models')
+        .then(response => response.ok ? response.json() : null)
+        .then(data => {
+            if (!data) return;
+            data.models.forEach(model => {
+                const option = document.createElement('option');
+                option.value = model.name;
+                option.textContent = model.description ? `${model.name} - ${model.description}` : model.name;
+                modelSelect.appendChild(option);
+            });
+        })
+        .catch(() => {});
+
+    timelineBucket.addEventListener('change', function() {
+        if (statsQueryUrl) {
+            loadTimeline(statsQueryUrl);
+        }
+    });
 
     // Drag and drop functionality
     ['dragenter', 'dragover', 'dragleave', 'drop'].forEach(eventName => {
@@ -71,6 +100,9 @@ document.addEventListener('DOMContentLoaded', function() {
         resetUI();
 
         const formData = new FormData(form);
+        // Unchecked boxes are left out of the form data, which the server reads as "use the default"
+        formData.set('hls', form.elements.hls.checked ? '1' : '0');
+        formData.set('preview', form.elements.preview.checked ? '1' : '0');
         const videoFile = fileInput.files[0];
 
         if (!videoFile) {
@@ -201,6 +233,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
 
                 const data = await response.json();
+
+                if (data.hls_playlist) {
+                    attachLivePreview(data.hls_playlist);
+                }
+                showPossessionEstimate(data.estimate);
                 
                 // Ensure progress bar is visible during processing stages
                 if (data.state === 'PENDING' || data.state === 'STARTED' || data.state === 'PROGRESS') {
@@ -287,14 +324,14 @@ document.addEventListener('DOMContentLoaded', function() {
                     progressBar.value = percent;
                     
                     // Check if we have direct ETA from the server
-                    if (data.info.eta) {
-                        // Use the direct ETA from Celery/tqdm instead of calculating ourselves
-                        etaDisplay.textContent = `ETA: ${data.info.eta}`;
+                    if (data.info.eta_seconds != null) {
+                        // The server sends numbers (seconds, frames/s); format them here
+                        etaDisplay.textContent = `ETA: ${formatEta(data.info.eta_seconds)}`;
                         etaDisplay.style.display = 'inline-block';
                         
                         // Add the rate data if available
                         const statusText = data.info.rate ? 
-                            `${data.info.status} (${Math.round(percent)}%) [${data.info.rate}]` : 
+                            `${data.info.status} (${Math.round(percent)}%) [${data.info.rate.toFixed(1)} fps]` : 
                             `${data.info.status} (${Math.round(percent)}%)`;
                         document.getElementById('status-message').textContent = statusText;
                     } else {
@@ -498,6 +535,99 @@ document.addEventListener('DOMContentLoaded', function() {
         } else {
             statsResultDiv.style.display = 'none';
         }
+
+        if (data.stats_query) {
+            statsQueryUrl = data.stats_query;
+            loadTimeline(statsQueryUrl);
+        }
+    }
+
+    // Progressive HLS output: watch the annotated video while the rest is still processing
+    function attachLivePreview(url) {
+        if (livePreviewUrl === url) {
+            return;
+        }
+        livePreviewUrl = url;
+        if (livePreviewPlayer.canPlayType('application/vnd.apple.mpegurl')) {
+            livePreviewPlayer.src = url; // Native HLS (Safari)
+        } else if (window.Hls && Hls.isSupported()) {
+            livePreviewHls = new Hls();
+            livePreviewHls.loadSource(url);
+            livePreviewHls.attachMedia(livePreviewPlayer);
+        } else {
+            return;
+        }
+        livePreview.style.display = 'block';
+    }
+
+    // "1:02:03", "2:05" or "42s", like the server's console output
+    function formatEta(seconds) {
+        const total = Math.max(0, Math.round(seconds));
+        const hours = Math.floor(total / 3600);
+        const minutes = Math.floor((total % 3600) / 60);
+        const secs = String(total % 60).padStart(2, '0');
+        if (hours > 0) {
+            return `${hours}:${String(minutes).padStart(2, '0')}:${secs}`;
+        }
+        if (minutes > 0) {
+            return `${minutes}:${secs}`;
+        }
+        return `${total}s`;
+    }
+
+    // Preliminary possession from the quick preview, refined while the full pass runs
+    function showPossessionEstimate(estimate) {
+        const estimateDisplay = document.getElementById('possession-estimate');
+        if (!estimate || estimate.team1 === null) {
+            estimateDisplay.style.display = 'none';
+            return;
+        }
+        const [low, high] = estimate.team1_ci95;
+        estimateDisplay.textContent = `Possession estimate: Team 1 ${estimate.team1}% (95% CI ${low}-${high}%), ` +
+            `Team 2 ${estimate.team2}% - ${Math.round(estimate.exact_fraction * 100)}% of the match counted exactly`;
+        estimateDisplay.style.display = 'block';
+    }
+
+    function formatMinutes(seconds) {
+        const minutes = Math.floor(seconds / 60);
+        const secs = Math.floor(seconds % 60);
+        return `${minutes}:${secs.toString().padStart(2, '0')}`;
+    }
+
+    // Possession per time bucket, answered server-side from prefix sums (no full data download)
+    async function loadTimeline(url) {
+        try {
+            const response = await fetch(`${url}?bucket=${timelineBucket.value}`);
+            if (!response.ok) throw new Error(`HTTP error! Status: ${response.status}`);
+            const timeline = await response.json();
+
+            timelineChart.innerHTML = '';
+            timeline.bucket_starts.forEach((start, i) => {
+                const team1 = timeline.possession_percent.team1[i];
+                const team2 = timeline.possession_percent.team2[i];
+                const end = i + 1 < timeline.bucket_starts.length ? timeline.bucket_starts[i + 1] : timeline.to;
+
+                const bar = document.createElement('div');
+                bar.className = 'timeline-bar';
+                bar.title = `${formatMinutes(start)}–${formatMinutes(end)}: Team 1 ${team1}% / Team 2 ${team2}%`;
+                [['team2', team2], ['team1', team1]].forEach(([team, percent]) => {
+                    const segment = document.createElement('div');
+                    segment.className = `timeline-segment ${team}`;
+                    segment.style.height = `${percent}%`;
+                    bar.appendChild(segment);
+                });
+
+                const label = document.createElement('span');
+                label.className = 'timeline-label';
+                label.textContent = formatMinutes(start);
+                bar.appendChild(label);
+                timelineChart.appendChild(bar);
+            });
+            timelineResultDiv.style.display = 'block';
+        } catch (error) {
+            console.error('Error loading timeline:', error);
+            timelineResultDiv.style.display = 'none';
+        }
     }
 
     function resetUI() {
@@ -509,6 +639,17 @@ document.addEventListener('DOMContentLoaded', function() {
         resultsArea.style.display = 'none';
         videoResultDiv.style.display = 'none';
         statsResultDiv.style.display = 'none';
+        timelineResultDiv.style.display = 'none';
+        timelineChart.innerHTML = '';
+        statsQueryUrl = null;
+        if (livePreviewHls) {
+            livePreviewHls.destroy();
+            livePreviewHls = null;
+        }
+        livePreviewPlayer.removeAttribute('src');
+        livePreview.style.display = 'none';
+        livePreviewUrl = null;
+        showPossessionEstimate(null);
         resultVideoPlayer.style.display = 'none';
         resultVideoLink.style.display = 'none';
         resultStatsLink.style.display = 'none';